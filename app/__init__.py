@@ -0,0 +1,8 @@
+# app/__init__.py
+
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Carrega o .env uma vez, antes de qualquer módulo do pacote ler as configurações do ambiente
+load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env")
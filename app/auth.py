@@ -1,12 +1,89 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 
+# Custo do bcrypt (2^rounds iterações). Ao mudar, as senhas são refeitas no próximo login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Processos dedicados ao bcrypt e quantos pedidos podem esperar na fila além deles
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", "2"))
+PASSWORD_QUEUE_SIZE = int(os.getenv("PASSWORD_QUEUE_SIZE", "16"))
+
 # Configuração do algoritmo de hashing de senha
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasherBusy(Exception):
+    """A fila do bcrypt está cheia; o pedido deve ser recusado (503) em vez de esperar."""
+
 
 # Função para gerar hash da senha
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
-# Função para verificar senha durante login
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+def _hash_rounds(hashed: str) -> Optional[int]:
+    """Extrai o custo de um hash bcrypt ($2b$12$...)."""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+def verify_and_update(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica a senha e, se o hash estiver com outro custo (ou esquema obsoleto),
+    devolve também um hash novo para ser gravado. Retorna (senha_ok, novo_hash_ou_None).
+    """
+    if not pwd_context.verify(password, hashed):
+        return False, None
+    if _hash_rounds(hashed) != BCRYPT_ROUNDS or pwd_context.needs_update(hashed):
+        return True, pwd_context.hash(password)
+    return True, None
+
+
+# ---------- Pool de processos do bcrypt ----------
+# Cada hash leva ~250 ms de CPU; fora do processo principal, não prende o
+# threadpool do Starlette nem o GIL. A fila é limitada: acima dela, recusa na hora.
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_WORKERS + PASSWORD_QUEUE_SIZE)
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PASSWORD_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+def _submit(fn, *args) -> Future:
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        future = _get_pool().submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+async def hash_password_async(password: str) -> str:
+    """Gera o hash no pool de processos. Levanta PasswordHasherBusy se a fila estiver cheia."""
+    return await asyncio.wrap_future(_submit(hash_password, password))
+
+async def verify_and_update_async(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """`verify_and_update` no pool de processos. Levanta PasswordHasherBusy se a fila estiver cheia."""
+    return await asyncio.wrap_future(_submit(verify_and_update, password, hashed))
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
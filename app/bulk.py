@@ -0,0 +1,224 @@
+# app/bulk.py
+
+"""
+Importação e exportação em massa da estante, sempre em streaming.
+
+Importação: CSV (formato da exportação da RedLibrary ou exportação do Goodreads)
+ou JSONL. O arquivo é lido linha a linha e os livros são resolvidos em lotes
+(`crud.bulk_shelve`), com uma transação por lote. O progresso é devolvido como
+NDJSON, uma linha por lote.
+
+Exportação: CSV ou JSONL gerado enquanto os itens são lidos do banco em blocos,
+sem carregar a estante inteira na memória.
+"""
+
+import csv
+import io
+import json
+import logging
+from typing import IO, Iterable, Iterator, List, Optional
+
+from . import crud, database, models
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_BATCH_SIZE = 500
+
+# Colunas da exportação (e do CSV de importação no formato da RedLibrary)
+EXPORT_COLUMNS = ["title", "authors", "isbn", "publisher", "pageCount", "publishedDate", "status", "rating"]
+
+# Estantes do Goodreads e nomes aceitos para cada status
+STATUS_ALIASES = {
+    "lido": models.BookStatus.lido,
+    "read": models.BookStatus.lido,
+    "lendo": models.BookStatus.lendo,
+    "currently-reading": models.BookStatus.lendo,
+    "quero ler": models.BookStatus.quero_ler,
+    "quero_ler": models.BookStatus.quero_ler,
+    "to-read": models.BookStatus.quero_ler,
+}
+
+
+# ---------- Normalização das linhas ----------
+
+def _clean(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    # O Goodreads exporta ISBNs como ="0439023483"
+    if value.startswith('="') and value.endswith('"'):
+        value = value[2:-1]
+    return value or None
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def _status(value) -> models.BookStatus:
+    return STATUS_ALIASES.get((_clean(value) or "").lower(), models.BookStatus.quero_ler)
+
+def _rating(value) -> Optional[int]:
+    rating = _int_or_none(value)
+    return rating if rating and 1 <= rating <= 5 else None
+
+def _authors(value) -> str:
+    if isinstance(value, list):
+        value = ", ".join(str(a).strip() for a in value if str(a).strip())
+    return _clean(value) or "Desconhecido"
+
+def from_redlibrary(row: dict) -> Optional[dict]:
+    """Linha do CSV/JSONL no formato da exportação da RedLibrary."""
+    title = _clean(row.get("title"))
+    if not title:
+        return None
+    return {
+        "title": title,
+        "authors": _authors(row.get("authors")),
+        "isbn": _clean(row.get("isbn")),
+        "publisher": _clean(row.get("publisher")) or "—",
+        "pageCount": _int_or_none(row.get("pageCount")),
+        "publishedDate": _clean(row.get("publishedDate")) or "—",
+        "status": _status(row.get("status")),
+        "rating": _rating(row.get("rating")),
+    }
+
+def from_goodreads(row: dict) -> Optional[dict]:
+    """Linha do CSV exportado pelo Goodreads (My Books > Export Library)."""
+    title = _clean(row.get("Title"))
+    if not title:
+        return None
+    authors = [a for a in [_clean(row.get("Author"))] + (_clean(row.get("Additional Authors")) or "").split(",") if a and a.strip()]
+    return {
+        "title": title,
+        "authors": _authors(authors),
+        "isbn": _clean(row.get("ISBN13")) or _clean(row.get("ISBN")),
+        "publisher": _clean(row.get("Publisher")) or "—",
+        "pageCount": _int_or_none(row.get("Number of Pages")),
+        "publishedDate": _clean(row.get("Year Published")) or _clean(row.get("Original Publication Year")) or "—",
+        "status": _status(row.get("Exclusive Shelf")),
+        "rating": _rating(row.get("My Rating")),
+    }
+
+
+# ---------- Leitura incremental ----------
+
+def parse_upload(raw: IO[bytes], fmt: str = "auto") -> Iterator[Optional[dict]]:
+    """
+    Lê o arquivo enviado sob demanda e gera uma entrada normalizada por linha
+    (None para linhas inválidas). `fmt`: "auto", "csv", "goodreads" ou "jsonl".
+    """
+    text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+    if fmt == "auto":
+        first = text.readline()
+        fmt = "jsonl" if first.lstrip().startswith("{") else "csv"
+        text = _chain_first_line(first, text)
+
+    if fmt == "jsonl":
+        for line in text:
+            if not line.strip():
+                continue
+            try:
+                yield from_redlibrary(json.loads(line))
+            except (ValueError, AttributeError):
+                yield None
+        return
+
+    reader = csv.DictReader(text)
+    fields = set(reader.fieldnames or [])
+    convert = from_goodreads if fmt == "goodreads" or "Exclusive Shelf" in fields else from_redlibrary
+    for row in reader:
+        yield convert(row)
+
+def _chain_first_line(first: str, rest: Iterable[str]) -> Iterator[str]:
+    yield first
+    yield from rest
+
+def _batches(entries: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ---------- Importação ----------
+
+def import_entries(user_id: int, entries: Iterable[Optional[dict]], batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[str]:
+    """Importa as entradas em lotes e gera uma linha NDJSON de progresso por lote."""
+    totals = {"processed": 0, "skipped": 0, "books_created": 0, "added": 0, "updated": 0}
+    db = database.SessionLocal()
+    try:
+        for batch in _batches(entries, batch_size):
+            valid = [e for e in batch if e is not None]
+            totals["processed"] += len(batch)
+            totals["skipped"] += len(batch) - len(valid)
+            if valid:
+                result = crud.bulk_shelve(db, user_id, valid)
+                for key, value in result.items():
+                    totals[key] += value
+            yield json.dumps(totals) + "\n"
+        yield json.dumps({**totals, "done": True}) + "\n"
+    except Exception as exc:
+        logger.exception("Falha na importação da estante do usuário %s", user_id)
+        db.rollback()
+        yield json.dumps({**totals, "done": False, "error": str(exc)}) + "\n"
+    finally:
+        db.close()
+
+
+def import_file(user_id: int, raw: IO[bytes], fmt: str = "auto") -> Iterator[str]:
+    """`import_entries` sobre um arquivo, que é fechado ao final da importação."""
+    try:
+        yield from import_entries(user_id, parse_upload(raw, fmt))
+    finally:
+        raw.close()
+
+
+# ---------- Exportação ----------
+
+def _export_rows(user_id: int) -> Iterator[dict]:
+    db = database.ReadSessionLocal()
+    try:
+        query = (
+            db.query(models.UserBook, models.Book)
+            .join(models.Book, models.UserBook.book_id == models.Book.id)
+            .filter(models.UserBook.user_id == user_id)
+            .order_by(models.UserBook.id)
+            .yield_per(EXPORT_BATCH_SIZE)
+        )
+        for item, book in query:
+            yield {
+                "title": book.title,
+                "authors": book.authors,
+                "isbn": book.isbn,
+                "publisher": book.publisher,
+                "pageCount": book.pageCount,
+                "publishedDate": book.publishedDate,
+                "status": item.status.value,
+                "rating": item.rating,
+            }
+    finally:
+        db.close()
+
+def export_csv(user_id: int) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for count, row in enumerate(_export_rows(user_id), start=1):
+        writer.writerow(row)
+        # Envia em blocos para não gerar um pedaço de resposta por linha
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def export_jsonl(user_id: int) -> Iterator[str]:
+    for row in _export_rows(user_id):
+        yield json.dumps(row, ensure_ascii=False) + "\n"
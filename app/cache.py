@@ -0,0 +1,570 @@
+# app/cache.py
+
+import asyncio
+import logging
+import os
+import pickle
+import queue
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# "memory": um TTLCache por processo; "shared": arquivo SQLite lido por todos os workers
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+SHARED_CACHE_PATH = Path(os.getenv("SHARED_CACHE_PATH", "./cache/shared.db"))
+
+_MISSING = object()
+
+
+class _Flight:
+    """Uma carga em andamento para uma chave (usada no single-flight)."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """
+    Cache em memória, limitado em tamanho (LRU) e com validade por entrada (TTL).
+
+    - `negative_ttl`: validade usada para resultados "vazios" (segundo `is_negative`),
+      normalmente menor que a validade normal.
+    - `get_or_load` faz coalescência (single-flight): N pedidos simultâneos pela
+      mesma chave ausente disparam uma única chamada ao `loader` (`get_or_load_async`
+      faz o mesmo para corrotinas).
+    - Cada valor gravado recebe um carimbo de versão (`version(key)`), usado para
+      derivar ETags sem recalcular o conteúdo.
+    - Contadores de acertos, faltas, expirações e despejos ficam em `stats()`.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 600,
+        negative_ttl: Optional[float] = None,
+        is_negative: Optional[Callable[[Any], bool]] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._is_negative = is_negative
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, _Flight] = {}
+        self._async_inflight: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._last_version = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable):
+        """Busca sem contabilizar; deve ser chamada com o lock adquirido."""
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default=None):
+        """Retorna o valor em cache, contabilizando apenas acertos."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                return default
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value, ttl: Optional[float] = None):
+        if ttl is None:
+            negative = self._is_negative is not None and self._is_negative(value)
+            ttl = self.negative_ttl if negative else self.ttl
+        with self._lock:
+            # Carimbo baseado no relógio: diferente entre gravações e entre processos
+            self._last_version = max(time.time_ns(), self._last_version + 1)
+            self._data[key] = (time.monotonic() + ttl, value, self._last_version)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def version(self, key: Hashable) -> Optional[int]:
+        """Carimbo de versão do valor em cache para `key`, ou None se não estiver em cache."""
+        with self._lock:
+            if self._lookup(key) is _MISSING:
+                return None
+            return self._data[key][2]
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]):
+        """
+        Retorna o valor em cache ou chama `loader()` para obtê-lo.
+        Exceções do `loader` são repassadas a todos os que esperavam e não são cacheadas.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            flight.value = value
+            self.set(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    async def get_or_load_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        """
+        `get_or_load` para rotas async: `loader` é uma corrotina e os pedidos simultâneos
+        pela mesma chave (no mesmo event loop) aguardam a mesma carga, sem bloquear threads.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        future = self._async_inflight.get(key)
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            # shield: quem desiste de esperar não cancela a carga dos demais
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._async_inflight[key] = future
+        with self._lock:
+            self.misses += 1
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # evita o aviso de exceção não lida quando ninguém esperava
+            raise
+        else:
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            self._async_inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
+
+
+class _WriteBehind:
+    """
+    Fila de gravações do cache compartilhado, feitas em ordem por uma thread própria:
+    quem grava (inclusive o event loop) não espera pela trava do arquivo SQLite.
+    Com a fila cheia, a gravação é descartada (é cache).
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._pid = None
+
+    def submit(self, fn: Callable, *args):
+        with self._lock:
+            # Depois de um fork, a thread do processo pai não existe no filho
+            if self._queue is None or self._pid != os.getpid():
+                self._queue = queue.Queue(self.maxsize)
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, args=(self._queue,), name="shared-cache-writer", daemon=True).start()
+            pending = self._queue
+        try:
+            pending.put_nowait((fn, args))
+        except queue.Full:
+            logger.debug("Fila de gravação do cache compartilhado cheia; gravação descartada")
+
+    @staticmethod
+    def _run(pending: queue.Queue):
+        while True:
+            fn, args = pending.get()
+            try:
+                fn(*args)
+            except Exception:
+                logger.debug("Falha ao gravar no cache compartilhado", exc_info=True)
+            finally:
+                pending.task_done()
+
+    def flush(self):
+        """Espera as gravações pendentes (testes e desligamento)."""
+        with self._lock:
+            pending = self._queue if self._pid == os.getpid() else None
+        if pending is not None:
+            pending.join()
+
+
+_writer = _WriteBehind()
+
+
+class SharedCache(TTLCache):
+    """
+    Cache com a mesma interface do `TTLCache`, guardado em um arquivo SQLite (WAL)
+    compartilhado por todos os workers da máquina: o que um worker carrega, os outros
+    já encontram, e a taxa de acertos não cai com mais workers.
+
+    - Cada cache usa um `namespace` dentro do arquivo; chaves são gravadas como `repr`
+      e valores com pickle. Validade e versão usam o relógio de parede (entre processos).
+    - `get_or_load` coalesce dentro do processo (como o TTLCache) e também entre
+      processos: quem perde a disputa pela "concessão" da chave espera o valor aparecer
+      no arquivo (até `lease_seconds`) em vez de repetir a chamada. `get_or_load_async`
+      coalesce só dentro do processo.
+    - O tamanho é limitado de forma aproximada: a cada `prune_every` gravações, as
+      entradas vencidas e, se preciso, as que vencem primeiro são removidas.
+    - Erros do SQLite contam como falta (leitura) ou são ignorados (gravação): o
+      cache nunca derruba a requisição.
+    - O event loop não espera pelo arquivo: as leituras passam antes por uma cópia em
+      memória (até `local_ttl` segundos) e esperam a trava no máximo `read_timeout`
+      (depois disso, contam como falta); as gravações vão para uma thread própria.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        maxsize: int = 1024,
+        ttl: float = 600,
+        negative_ttl: Optional[float] = None,
+        is_negative: Optional[Callable[[Any], bool]] = None,
+        path: Path = SHARED_CACHE_PATH,
+        lease_seconds: float = 10,
+        prune_every: int = 256,
+        local_ttl: float = 2,
+        read_timeout: float = 0.05,
+        write_timeout: float = 5,
+    ):
+        super().__init__(maxsize, ttl, negative_ttl, is_negative)
+        self.namespace = namespace
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.prune_every = prune_every
+        self.local_ttl = local_ttl
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self._writes = 0
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._create_tables()
+
+    def _create_tables(self):
+        # Conexão própria, fechada em seguida: a thread que cria o cache (a do event
+        # loop, na importação) não fica com uma conexão de espera longa
+        conn = sqlite3.connect(self.path, timeout=self.write_timeout, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT, key TEXT, value BLOB, expires_at REAL, version INTEGER,
+                    PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_expires ON entries (namespace, expires_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    namespace TEXT, key TEXT, expires_at REAL, PRIMARY KEY (namespace, key)
+                ) WITHOUT ROWID
+            """)
+        finally:
+            conn.close()
+
+    def _connect(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """
+        Uma conexão por thread (o módulo sqlite3 não compartilha conexões entre threads)
+        e por processo (conexões herdadas de um fork não podem ser usadas). A thread de
+        gravação espera a trava por até `write_timeout`; as demais, `read_timeout`.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            timeout = self.read_timeout if timeout is None else timeout
+            conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=OFF")  # é cache: perder a última gravação não faz mal
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _remember(self, key: Hashable, value, version: int, expires_at: float):
+        """Guarda a entrada na cópia em memória por até `local_ttl` (sem passar da validade)."""
+        ttl = min(self.local_ttl, expires_at - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value, version)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def _read_local(self, key: Hashable):
+        """(valor, versão) da cópia em memória ou _MISSING; não contabiliza."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return entry[1], entry[2]
+
+    def _entry(self, key: Hashable):
+        """(valor, versão) da cópia em memória ou do arquivo, ou _MISSING; não contabiliza."""
+        entry = self._read_local(key)
+        if entry is _MISSING:
+            entry = self._read(key)
+        return entry
+
+    def _read(self, key: Hashable):
+        """(valor, versão) do arquivo ou _MISSING (e guarda na cópia em memória); não contabiliza."""
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires_at, version FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, repr(key)),
+            ).fetchone()
+        except sqlite3.Error:
+            logger.debug("Falha ao ler o cache compartilhado %s", self.namespace, exc_info=True)
+            return _MISSING
+        if row is None:
+            return _MISSING
+        value, expires_at, version = row
+        if expires_at <= time.time():
+            with self._lock:
+                self.expirations += 1
+            return _MISSING
+        value = pickle.loads(value)
+        self._remember(key, value, version, expires_at)
+        return value, version
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entry(key)
+        if entry is _MISSING:
+            return default
+        with self._lock:
+            self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value, ttl: Optional[float] = None):
+        if ttl is None:
+            negative = self._is_negative is not None and self._is_negative(value)
+            ttl = self.negative_ttl if negative else self.ttl
+        with self._lock:
+            self._last_version = max(time.time_ns(), self._last_version + 1)
+            version = self._last_version
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        expires_at = time.time() + ttl
+        self._remember(key, value, version, expires_at)
+        # Serializa já: o valor pode mudar depois de gravado, antes de a fila chegar nele
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        _writer.submit(self._write, repr(key), blob, expires_at, version, prune)
+
+    def _write(self, key: str, blob: bytes, expires_at: float, version: int, prune: bool):
+        try:
+            conn = self._connect(self.write_timeout)
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, version) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, blob, expires_at, version),
+            )
+            if prune:
+                self._prune(conn)
+        except sqlite3.Error:
+            logger.debug("Falha ao gravar no cache compartilhado %s", self.namespace, exc_info=True)
+
+    def _prune(self, conn: sqlite3.Connection):
+        now = time.time()
+        removed = conn.execute(
+            "DELETE FROM entries WHERE namespace = ? AND expires_at <= ?", (self.namespace, now)
+        ).rowcount
+        conn.execute("DELETE FROM leases WHERE namespace = ? AND expires_at <= ?", (self.namespace, now))
+        size = conn.execute("SELECT count(*) FROM entries WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+        if size > self.maxsize:
+            evicted = conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key IN ("
+                " SELECT key FROM entries WHERE namespace = ? ORDER BY expires_at LIMIT ?)",
+                (self.namespace, self.namespace, size - self.maxsize),
+            ).rowcount
+            with self._lock:
+                self.evictions += evicted
+        with self._lock:
+            self.expirations += removed
+
+    def version(self, key: Hashable) -> Optional[int]:
+        entry = self._entry(key)
+        return None if entry is _MISSING else entry[1]
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+        _writer.submit(self._execute, "DELETE FROM entries WHERE namespace = ? AND key = ?", (self.namespace, repr(key)))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        _writer.submit(self._execute, "DELETE FROM entries WHERE namespace = ?", (self.namespace,))
+
+    def _execute(self, sql: str, params: tuple):
+        try:
+            self._connect(self.write_timeout).execute(sql, params)
+        except sqlite3.Error:
+            logger.debug("Falha ao gravar no cache compartilhado %s", self.namespace, exc_info=True)
+
+    def flush(self):
+        """Espera as gravações pendentes chegarem ao arquivo."""
+        _writer.flush()
+
+    def _acquire_lease(self, key: Hashable) -> bool:
+        """Reserva a carga da chave para este processo; False se outro processo já a reservou."""
+        now = time.time()
+        try:
+            cursor = self._connect().execute(
+                "INSERT INTO leases (namespace, key, expires_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (namespace, key) DO UPDATE SET expires_at = excluded.expires_at"
+                " WHERE leases.expires_at <= ?",
+                (self.namespace, repr(key), now + self.lease_seconds, now),
+            )
+        except sqlite3.Error:
+            return True  # sem coordenação, cada processo carrega por conta própria
+        return cursor.rowcount > 0
+
+    def _release_lease(self, key: Hashable):
+        # Pela fila de gravação: a concessão só é liberada depois de o valor ser gravado
+        _writer.submit(self._execute, "DELETE FROM leases WHERE namespace = ? AND key = ?", (self.namespace, repr(key)))
+
+    def _load_shared(self, key: Hashable, loader: Callable[[], Any]):
+        """Carga de uma chave ausente, coordenada entre processos pela concessão."""
+        deadline = time.monotonic() + self.lease_seconds
+        delay = 0.005
+        while not self._acquire_lease(key):
+            # Outro worker está carregando: espera o valor aparecer no arquivo
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 0.1)
+            entry = self._read(key)
+            if entry is not _MISSING:
+                with self._lock:
+                    self.coalesced += 1
+                return entry[0]
+            if time.monotonic() >= deadline:
+                break
+        try:
+            value = loader()
+            self.set(key, value)
+            return value
+        finally:
+            self._release_lease(key)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]):
+        entry = self._entry(key)
+        if entry is not _MISSING:
+            with self._lock:
+                self.hits += 1
+            return entry[0]
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self._load_shared(key, loader)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def stats(self) -> dict:
+        try:
+            size = self._connect().execute(
+                "SELECT count(*) FROM entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+        except sqlite3.Error:
+            size = -1
+        with self._lock:
+            return {
+                "size": size,
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+            }
+
+
+def make_cache(
+    namespace: str,
+    maxsize: int = 1024,
+    ttl: float = 600,
+    negative_ttl: Optional[float] = None,
+    is_negative: Optional[Callable[[Any], bool]] = None,
+) -> TTLCache:
+    """Cria o cache conforme `CACHE_BACKEND`: em memória do processo ou compartilhado entre workers."""
+    if CACHE_BACKEND == "shared":
+        return SharedCache(namespace, maxsize, ttl, negative_ttl, is_negative)
+    return TTLCache(maxsize, ttl, negative_ttl, is_negative)
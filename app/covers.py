@@ -0,0 +1,312 @@
+# app/covers.py
+
+"""
+Proxy de capas com cache em disco endereçado por conteúdo.
+
+Cada capa é baixada uma única vez; o arquivo original fica em
+`<COVER_CACHE_DIR>/blobs/<hash[:2]>/<hash>` (hash = sha256 do conteúdo) e as
+variantes redimensionadas ao lado dele (`<hash>.grid`, `<hash>.modal`).
+O diretório tem tamanho máximo: ao passar do limite, os arquivos usados há mais
+tempo são removidos (LRU pelo mtime, que é atualizado a cada acesso). A relação
+URL de origem -> hash fica só em um cache limitado (`make_cache`, compartilhado
+entre workers com CACHE_BACKEND=shared), não em disco.
+
+Só são baixadas imagens de hosts permitidos (`COVER_ALLOWED_HOSTS`, por padrão os
+do Google), até `COVER_MAX_BYTES`: o servidor nunca busca URLs arbitrárias vindas
+do banco ou de formulários.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+from . import crud, metrics, models
+from .cache import make_cache
+from .google_books import VOLUME_ID_RE, quota, session, volume_cache
+from .normalize import clean_isbn, is_isbn
+
+try:  # Pillow é opcional: sem ele, todas as variantes servem a imagem original
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+COVER_CACHE_DIR = Path(os.getenv("COVER_CACHE_DIR", "./cache/covers"))
+COVER_CACHE_MAX_BYTES = int(os.getenv("COVER_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+COVER_FETCH_TIMEOUT = float(os.getenv("COVER_FETCH_TIMEOUT", "5"))
+# Tamanho máximo de uma capa baixada
+COVER_MAX_BYTES = int(os.getenv("COVER_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# Imagem usada quando o livro não tem capa (ou ela não pode ser obtida)
+PLACEHOLDER_COVER = "/static/images/logo.png"
+
+# Larguras fixas das variantes usadas pelo grid/lista e pelo modal
+VARIANTS = {"grid": 256, "modal": 512}
+
+GOOGLE_HOSTS = ("google.com", "googleapis.com", "googleusercontent.com")
+
+# Domínios de onde as capas podem ser baixadas (inclui os subdomínios), separados por vírgula
+COVER_ALLOWED_HOSTS = tuple(
+    h.strip().lower() for h in os.getenv("COVER_ALLOWED_HOSTS", ",".join(GOOGLE_HOSTS)).split(",") if h.strip()
+)
+
+
+class CoverSourceRefused(ValueError):
+    """A URL de origem não é de um host permitido (ou a resposta não é uma imagem aceitável)."""
+
+
+def _host_in(host: str, domains: Tuple[str, ...]) -> bool:
+    host = host.lower()
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+def is_allowed_source(url: Optional[str]) -> bool:
+    """Se a capa pode ser baixada de `url`: http(s) em um dos COVER_ALLOWED_HOSTS."""
+    if not url:
+        return False
+    parts = urlsplit(url)
+    return parts.scheme in ("http", "https") and _host_in(parts.hostname or "", COVER_ALLOWED_HOSTS)
+
+def secure_url(url: str) -> str:
+    """As capas do Google vêm em http://; busca sempre por https nos domínios do Google."""
+    host = urlsplit(url).hostname or ""
+    if url.startswith("http://") and _host_in(host, GOOGLE_HOSTS):
+        return "https://" + url[len("http://"):]
+    return url
+
+def source_version(url: str) -> str:
+    """Versão da capa na URL pública (`?v=`): muda quando a URL de origem muda."""
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+def sniff_content_type(data: bytes) -> str:
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith(b"GIF8"):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+class CoverStore:
+    def __init__(self, root: Path = COVER_CACHE_DIR, max_bytes: int = COVER_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        # URL de origem -> hash do conteúdo (também faz coalescência de downloads)
+        self.refs = make_cache("cover_refs", maxsize=8192, ttl=7 * 24 * 3600)
+        # ISBN (ou "g:<id do volume>", para resultados do Google sem ISBN) -> URL da capa,
+        # registrada quando uma página é renderizada (compartilhada entre workers: o
+        # pedido da capa pode cair em outro worker que não a página)
+        self.sources = make_cache("cover_sources", maxsize=8192, ttl=24 * 3600)
+
+    # ---------- caminhos ----------
+    def _blob_path(self, digest: str, variant: Optional[str] = None) -> Path:
+        name = digest if variant is None else f"{digest}.{variant}"
+        return self.root / "blobs" / digest[:2] / name
+
+    # ---------- tamanho e despejo (LRU) ----------
+    def _scan_total(self) -> int:
+        blobs = self.root / "blobs"
+        if not blobs.exists():
+            return 0
+        return sum(p.stat().st_size for p in blobs.rglob("*") if p.is_file())
+
+    def _account(self, added: int):
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total()
+            else:
+                self._total_bytes += added
+            if self._total_bytes <= self.max_bytes:
+                return
+            files = [p for p in (self.root / "blobs").rglob("*") if p.is_file()]
+            files.sort(key=lambda p: p.stat().st_mtime)
+            # Remove até ficar com 90% do limite, para não despejar a cada escrita
+            target = int(self.max_bytes * 0.9)
+            for path in files:
+                if self._total_bytes <= target:
+                    break
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                    self._total_bytes -= size
+                except FileNotFoundError:
+                    pass
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._account(len(data))
+
+    @staticmethod
+    def _touch(path: Path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    # ---------- download e variantes ----------
+    def _download(self, url: str) -> str:
+        """Baixa a capa e retorna o hash do conteúdo (o arquivo só é gravado se ainda não existir)."""
+        if not is_allowed_source(url):
+            raise CoverSourceRefused(f"host de capa não permitido: {urlsplit(url).hostname!r}")
+        # Capas hospedadas no Google contam na mesma cota das buscas
+        if _host_in(urlsplit(url).hostname or "", GOOGLE_HOSTS):
+            quota.acquire()
+        start = time.perf_counter()
+        try:
+            # Sem seguir redirects: um redirect poderia levar para fora dos hosts permitidos
+            r = session.get(secure_url(url), timeout=COVER_FETCH_TIMEOUT, stream=True, allow_redirects=False)
+        except Exception as exc:
+            metrics.observe_upstream("covers", "download", time.perf_counter() - start, "error", type(exc).__name__)
+            raise
+        with r:
+            metrics.observe_upstream("covers", "download", time.perf_counter() - start, str(r.status_code), "" if r.ok else "HTTPError")
+            r.raise_for_status()
+            if r.is_redirect:
+                raise CoverSourceRefused(f"capa redirecionada para {r.headers.get('Location')!r}")
+            data = self._read_image(r)
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self._blob_path(digest)
+        if not blob.exists():
+            self._write(blob, data)
+        return digest
+
+    @staticmethod
+    def _read_image(r) -> bytes:
+        """Lê o corpo da resposta, exigindo image/* e no máximo COVER_MAX_BYTES."""
+        content_type = r.headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+        if not content_type.startswith("image/"):
+            raise CoverSourceRefused(f"capa com content-type {content_type!r}")
+        length = r.headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > COVER_MAX_BYTES:
+            raise CoverSourceRefused(f"capa maior que {COVER_MAX_BYTES} bytes")
+        chunks, total = [], 0
+        for chunk in r.iter_content(64 * 1024):
+            total += len(chunk)
+            if total > COVER_MAX_BYTES:
+                raise CoverSourceRefused(f"capa maior que {COVER_MAX_BYTES} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def _resize(self, data: bytes, width: int) -> bytes:
+        with Image.open(io.BytesIO(data)) as img:
+            img = img.convert("RGB")
+            if img.width > width:
+                height = round(img.height * width / img.width)
+                img = img.resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, format="JPEG", quality=85, optimize=True, progressive=True)
+            return out.getvalue()
+
+    def get(self, url: str, variant: str) -> Tuple[bytes, str, str]:
+        """
+        Retorna (conteúdo, content-type, etag) da capa de `url` na variante pedida.
+        Levanta exceção se a capa não puder ser baixada.
+        """
+        digest = self.refs.get_or_load(url, lambda: self._download(url))
+        original = self._blob_path(digest)
+        if not original.exists():
+            # Despejada do disco: baixa de novo
+            digest = self._download(url)
+            self.refs.set(url, digest)
+            original = self._blob_path(digest)
+
+        if Image is None or variant not in VARIANTS:
+            self._touch(original)
+            data = original.read_bytes()
+            return data, sniff_content_type(data), f'"{digest}"'
+
+        path = self._blob_path(digest, variant)
+        if path.exists():
+            self._touch(path)
+            data = path.read_bytes()
+        else:
+            try:
+                data = self._resize(original.read_bytes(), VARIANTS[variant])
+            except Exception:
+                logger.warning("Não foi possível redimensionar a capa %s", digest, exc_info=True)
+                data = original.read_bytes()
+                return data, sniff_content_type(data), f'"{digest}"'
+            self._write(path, data)
+        return data, "image/jpeg", f'"{digest}-{variant}"'
+
+
+cover_store = CoverStore()
+
+
+def cover_url(book, variant: str = "grid") -> str:
+    """
+    URL da capa de um livro para os templates. Aceita um livro do banco (usa o id)
+    ou um dicionário de resultado do Google (usa o ISBN ou, sem ele, o id do volume,
+    e registra a URL de origem). O navegador nunca recebe a URL de origem; `v`
+    identifica a origem, e só com ele a resposta pode ser guardada como imutável.
+    """
+    volume_id = None
+    if isinstance(book, dict):
+        thumbnail = book.get("thumbnail")
+        isbn = clean_isbn(book.get("isbn") or "")
+        book_id = book.get("id") if isinstance(book.get("id"), int) else None
+        if isinstance(book.get("id"), str) and VOLUME_ID_RE.match(book["id"]):
+            volume_id = book["id"]
+    else:
+        thumbnail, isbn, book_id = book.thumbnail, clean_isbn(book.isbn or ""), book.id
+
+    if not thumbnail:
+        return PLACEHOLDER_COVER
+    if book_id is not None:
+        return f"/covers/{book_id}?size={variant}&v={source_version(thumbnail)}"
+    if not is_allowed_source(thumbnail):
+        # Origem fora dos hosts permitidos (ex.: URL antiga enviada por formulário): não passa pelo proxy
+        return PLACEHOLDER_COVER
+    if isbn and is_isbn(isbn):
+        key = isbn
+    elif volume_id:
+        key = f"g:{volume_id}"
+    else:
+        return PLACEHOLDER_COVER
+    # Só grava se mudou: com o cache compartilhado, cada gravação é uma escrita no arquivo
+    if cover_store.sources.get(key) != thumbnail:
+        cover_store.sources.set(key, thumbnail)
+    return f"/covers/{key}?size={variant}&v={source_version(thumbnail)}"
+
+
+def resolve_source(db, key: str) -> Optional[str]:
+    """
+    Descobre a URL de origem da capa a partir do id do livro, de um ISBN ou de
+    "g:<id do volume>". Só servem ISBNs e volumes registrados por `cover_url`
+    (resultados exibidos recentemente), volumes já em cache ou livros do catálogo: uma
+    chave qualquer não gera chamada ao Google. Retorna None se não houver origem permitida.
+    """
+    if key.isdigit() and not is_isbn(key):
+        book = db.get(models.Book, int(key))
+        source = book.thumbnail if book else None
+    elif key.startswith("g:"):
+        volume_id = key[2:]
+        if not VOLUME_ID_RE.match(volume_id):
+            return None
+        source = cover_store.sources.get(key)
+        if not source:
+            volume = volume_cache.get(volume_id)
+            source = volume.get("thumbnail") if volume else None
+    else:
+        isbn = clean_isbn(key)
+        if not is_isbn(isbn):
+            return None
+        source = cover_store.sources.get(isbn)
+        if not source:
+            book = crud.get_book_by_isbn(db, isbn)
+            source = book.thumbnail if book else None
+    return source if is_allowed_source(source) else None
@@ -1,11 +1,22 @@
 # app/crud.py
 
-from sqlalchemy.orm import Session
+import functools
+import logging
+import re
+import time
+from sqlalchemy import bindparam, collate, or_, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, contains_eager, joinedload
 from . import models
+from .database import async_retry_on_locked, retry_on_locked
+from .normalize import canonical_isbn, normalize_authors, normalize_text
+
+logger = logging.getLogger(__name__)
 
 # -------------------------------
 # CRUD de Usuários (Existente)
 # -------------------------------
+@retry_on_locked
 def create_user(db: Session, full_name: str, email: str, password_hash: str):
     db_user = models.User(full_name=full_name, email=email, password_hash=password_hash)
     db.add(db_user)
@@ -16,101 +27,552 @@ def create_user(db: Session, full_name: str, email: str, password_hash: str):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
+@retry_on_locked
+def update_user_password_hash(db: Session, user_id: int, password_hash: str):
+    """Grava um novo hash de senha (ex.: refeito com outro custo do bcrypt)."""
+    db.query(models.User).filter(models.User.id == user_id).update({"password_hash": password_hash})
+    db.commit()
+
 # -------------------------------
 # CRUD de Livros (LÓGICA CORRIGIDA)
 # -------------------------------
 
 def get_book_by_isbn(db: Session, isbn: str):
-    """Busca um livro pelo ISBN."""
+    """Busca um livro pelo ISBN (ISBN-10 ou ISBN-13 do mesmo livro dão o mesmo resultado)."""
+    isbn = canonical_isbn(isbn)
     # Retorna o livro se o ISBN for uma string não vazia
     return db.query(models.Book).filter(models.Book.isbn == isbn).first() if isbn else None
 
-def get_book_by_title_and_author(db: Session, title: str, authors: str):
-    """NOVO: Busca um livro por título e autor como um plano B."""
-    return db.query(models.Book).filter(models.Book.title == title, models.Book.authors == authors).first()
-
-def create_book(db: Session, book_data: dict):
-    """Cria um novo livro no banco de dados com todos os campos."""
-    db_book = models.Book(
-        title=book_data.get("title"),
-        authors=", ".join(book_data.get("authors", [])),
-        description=book_data.get("description"),
-        thumbnail=book_data.get("thumbnail"),
-        isbn=book_data.get("isbn"),
-        publisher=book_data.get("publisher"),
-        pageCount=book_data.get("pageCount"),
-        publishedDate=book_data.get("publishedDate")
-    )
-    db.add(db_book)
-    db.commit()
-    db.refresh(db_book)
-    return db_book
+# Um único INSERT resolve o livro: com ISBN, usa a linha desse ISBN (ou cria); sem
+# ISBN, usa a linha sem ISBN com os mesmos título+autores normalizados (ou cria).
+# Um livro com ISBN nunca é fundido com outra edição do mesmo título. Os DO UPDATE só
+# completam capa/sinopse ausentes (e não mexem em colunas únicas), e o RETURNING
+# devolve o id da linha final. Sem janela entre "procurar" e "inserir".
+UPSERT_BOOK_SQL = text("""
+    INSERT INTO books (title, authors, description, thumbnail, isbn, publisher,
+                       "pageCount", "publishedDate", title_norm, authors_norm)
+    VALUES (:title, :authors, :description, :thumbnail, :isbn, :publisher,
+            :pageCount, :publishedDate, :title_norm, :authors_norm)
+    ON CONFLICT (isbn) DO UPDATE SET
+        thumbnail = coalesce(nullif(books.thumbnail, ''), excluded.thumbnail),
+        description = coalesce(books.description, excluded.description)
+    ON CONFLICT (title_norm, authors_norm) WHERE isbn IS NULL DO UPDATE SET
+        thumbnail = coalesce(nullif(books.thumbnail, ''), excluded.thumbnail),
+        description = coalesce(books.description, excluded.description)
+    RETURNING id
+""")
 
-def get_or_create_book(db: Session, book_data: dict):
+def upsert_book(db: Session, book_data: dict) -> int:
     """
-    Função aprimorada:
-    1. Tenta encontrar o livro pelo ISBN (se houver).
-    2. Se não encontrar (ou se não houver ISBN), tenta pelo título e autor.
-    3. Se ainda assim não encontrar, cria um novo livro.
+    Resolve (ou cria) o livro em uma única instrução e retorna o id.
+    Não faz commit: a transação é concluída por quem chamou (ex.: add_book_to_shelf).
     """
-    isbn = book_data.get("isbn")
-    # Passo 1: Tenta pelo ISBN, que é o mais confiável
-    if isbn:
-        db_book = get_book_by_isbn(db, isbn)
-        if db_book:
-            return db_book
-    
-    # Passo 2: Plano B, tenta por título e autor
+    authors = ", ".join(a.strip() for a in book_data.get("authors", []) if a.strip()) or "Desconhecido"
     title = book_data.get("title")
-    authors_str = ", ".join(book_data.get("authors", []))
-    db_book = get_book_by_title_and_author(db, title, authors_str)
-    if db_book:
-        return db_book
+    return db.execute(UPSERT_BOOK_SQL, {
+        "title": title,
+        "authors": authors,
+        "description": book_data.get("description"),
+        "thumbnail": book_data.get("thumbnail"),
+        "isbn": canonical_isbn(book_data.get("isbn")),
+        "publisher": book_data.get("publisher"),
+        "pageCount": book_data.get("pageCount"),
+        "publishedDate": book_data.get("publishedDate"),
+        "title_norm": normalize_text(title),
+        "authors_norm": normalize_authors(authors),
+    }).scalar_one()
+
+# -------------------------------
+# Busca local (índice FTS5 `books_fts`)
+# -------------------------------
+
+# Coluna do índice usada para cada tipo de busca da página /search
+FTS_COLUMNS = {"title": "title", "author": "authors"}
+
+def build_fts_query(keyword: str, search_by: str = "title"):
+    """
+    Monta uma expressão MATCH segura a partir do texto digitado.
+    Cada palavra vira um termo entre aspas; a última aceita prefixo.
+    Retorna None se não houver nenhuma palavra pesquisável.
+    """
+    tokens = re.findall(r"\w+", keyword or "")
+    if not tokens:
+        return None
+    terms = [f'"{t}"' for t in tokens]
+    terms[-1] += "*"
+    column = FTS_COLUMNS.get(search_by, "title")
+    return f"{{{column}}} : ({' '.join(terms)})"
+
+def search_local_books(db: Session, keyword: str, search_by: str = "title", limit: int = 20, offset: int = 0):
+    """
+    Busca livros do catálogo local pelo índice FTS5, ordenados por relevância.
+    Retorna uma tupla: (lista de livros da página, total de livros encontrados).
+    """
+    match = build_fts_query(keyword, search_by)
+    if match is None:
+        return ([], 0)
+    total = db.execute(
+        text("SELECT count(*) FROM books_fts WHERE books_fts MATCH :match"),
+        {"match": match},
+    ).scalar()
+    if not total or offset >= total:
+        return ([], total or 0)
+    ids = db.execute(
+        text("SELECT rowid FROM books_fts WHERE books_fts MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset"),
+        {"match": match, "limit": limit, "offset": offset},
+    ).scalars().all()
+    books = {b.id: b for b in db.query(models.Book).filter(models.Book.id.in_(ids)).all()}
+    return ([books[i] for i in ids if i in books], total)
+
+def get_local_isbns(db: Session, keyword: str, search_by: str = "title"):
+    """Retorna os ISBNs de todos os livros locais que casam com a busca (para remover duplicatas)."""
+    match = build_fts_query(keyword, search_by)
+    if match is None:
+        return set()
+    rows = db.execute(
+        text(
+            "SELECT b.isbn FROM books_fts JOIN books b ON b.id = books_fts.rowid "
+            "WHERE books_fts MATCH :match AND b.isbn IS NOT NULL"
+        ),
+        {"match": match},
+    ).scalars().all()
+    return set(rows)
 
-    # Passo 3: Se realmente não existe, cria um novo.
-    return create_book(db, book_data)
+def catalog_version(db: Session) -> int:
+    """Versão do catálogo local para os ETags da busca: o maior id de livro (muda a cada livro novo)."""
+    return db.execute(text("SELECT coalesce(max(id), 0) FROM books")).scalar()
 
 # -------------------------------
-# CRUD da Estante (UserBook)
+# Estatísticas dos livros (book_stats / book_coshelf)
 # -------------------------------
 
-def add_book_to_shelf(db: Session, user_id: int, book_id: int, status: models.BookStatus):
+# Soma um delta às estatísticas do livro (cria a linha se ainda não existir)
+BOOK_STATS_DELTA_SQL = text("""
+    INSERT INTO book_stats (book_id, readers, rating_count, rating_sum, lido, lendo, quero_ler)
+    VALUES (:book_id, :readers, :rating_count, :rating_sum, :lido, :lendo, :quero_ler)
+    ON CONFLICT (book_id) DO UPDATE SET
+        readers = book_stats.readers + excluded.readers,
+        rating_count = book_stats.rating_count + excluded.rating_count,
+        rating_sum = book_stats.rating_sum + excluded.rating_sum,
+        lido = book_stats.lido + excluded.lido,
+        lendo = book_stats.lendo + excluded.lendo,
+        quero_ler = book_stats.quero_ler + excluded.quero_ler
+""")
+
+# Soma `delta` a cada par (livro, outro livro) da estante do usuário em que pelo menos
+# um dos dois está em `book_ids`. Os pares são ordenados: as duas direções são gravadas.
+COSHELF_DELTA_SQL = text("""
+    INSERT INTO book_coshelf (book_id, other_book_id, shelved_together)
+    SELECT a.book_id, b.book_id, :delta
+    FROM user_books a JOIN user_books b ON b.user_id = a.user_id AND b.book_id <> a.book_id
+    WHERE a.user_id = :user_id AND (a.book_id IN :book_ids OR b.book_id IN :book_ids)
+    ON CONFLICT (book_id, other_book_id) DO UPDATE SET
+        shelved_together = book_coshelf.shelved_together + excluded.shelved_together
+""").bindparams(bindparam("book_ids", expanding=True))
+
+COSHELF_PRUNE_SQL = text(
+    "DELETE FROM book_coshelf WHERE shelved_together <= 0 AND book_id IN :book_ids"
+).bindparams(bindparam("book_ids", expanding=True))
+COSHELF_PRUNE_REVERSE_SQL = text("""
+    DELETE FROM book_coshelf WHERE shelved_together <= 0 AND other_book_id IN :book_ids
+    AND book_id IN (SELECT book_id FROM user_books WHERE user_id = :user_id)
+""").bindparams(bindparam("book_ids", expanding=True))
+
+REBUILD_BOOK_STATS_SQL = [
+    "DELETE FROM book_stats",
     """
-    Adiciona um livro na estante de um usuário.
-    Se o livro já estiver na estante, apenas atualiza seu status.
+    INSERT INTO book_stats (book_id, readers, rating_count, rating_sum, lido, lendo, quero_ler)
+    SELECT book_id, count(*),
+           sum(CASE WHEN rating > 0 THEN 1 ELSE 0 END),
+           sum(CASE WHEN rating > 0 THEN rating ELSE 0 END),
+           sum(status = 'lido'), sum(status = 'lendo'), sum(status = 'quero_ler')
+    FROM user_books GROUP BY book_id
+    """,
+    "DELETE FROM book_coshelf",
     """
+    INSERT INTO book_coshelf (book_id, other_book_id, shelved_together)
+    SELECT a.book_id, b.book_id, count(*)
+    FROM user_books a JOIN user_books b ON b.user_id = a.user_id AND b.book_id <> a.book_id
+    GROUP BY a.book_id, b.book_id
+    """,
+]
+
+def _stats_contribution(entry) -> dict:
+    """Quanto um item da estante, (status, avaliação) ou None, soma às estatísticas do livro."""
+    row = {"readers": 0, "rating_count": 0, "rating_sum": 0, "lido": 0, "lendo": 0, "quero_ler": 0}
+    if entry is None:
+        return row
+    status, rating = entry
+    row["readers"] = 1
+    row[models.BookStatus(status).name] = 1
+    if rating and rating > 0:
+        row["rating_count"] = 1
+        row["rating_sum"] = rating
+    return row
+
+def _update_book_stats(db: Session, book_id: int, old, new):
+    """
+    Aplica às estatísticas do livro a troca de um item da estante: `old` e `new` são
+    (status, avaliação), ou None quando o item não existia / deixou de existir.
+    """
+    before, after = _stats_contribution(old), _stats_contribution(new)
+    delta = {column: after[column] - before[column] for column in after}
+    if any(delta.values()):
+        db.execute(BOOK_STATS_DELTA_SQL, {"book_id": book_id, **delta})
+    if delta["readers"] < 0:
+        db.execute(text("DELETE FROM book_stats WHERE book_id = :book_id AND readers <= 0"), {"book_id": book_id})
+
+def _update_coshelf(db: Session, user_id: int, book_ids, delta: int):
+    """
+    Atualiza os pares de livros da estante do usuário que envolvem `book_ids`.
+    Na inclusão, chamar depois do flush dos itens novos (delta +1); na remoção,
+    antes de apagar o item (delta -1).
+    """
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    db.execute(COSHELF_DELTA_SQL, {"user_id": user_id, "book_ids": book_ids, "delta": delta})
+    if delta < 0:
+        # Pares zerados saem da tabela (as duas direções, pela chave primária)
+        params = {"user_id": user_id, "book_ids": book_ids}
+        db.execute(COSHELF_PRUNE_SQL, params)
+        db.execute(COSHELF_PRUNE_REVERSE_SQL, params)
+
+@retry_on_locked
+def rebuild_book_stats(db: Session):
+    """Recalcula do zero as estatísticas e os pares de livros a partir de `user_books`."""
+    for statement in REBUILD_BOOK_STATS_SQL:
+        db.execute(text(statement))
+    db.commit()
+    return {
+        "books": db.execute(text("SELECT count(*) FROM book_stats")).scalar(),
+        "pairs": db.execute(text("SELECT count(*) FROM book_coshelf")).scalar(),
+    }
+
+def get_book_stats(db: Session, book_id: int):
+    """Estatísticas de leitura do livro (ou None se ninguém o tem na estante)."""
+    return db.get(models.BookStats, book_id)
+
+def get_also_shelved(db: Session, book_id: int, limit: int = 6):
+    """Livros que mais aparecem nas estantes de quem tem este livro, com a quantidade de leitores."""
+    rows = (
+        db.query(models.Book, models.BookCoShelf.shelved_together)
+        .join(models.BookCoShelf, models.BookCoShelf.other_book_id == models.Book.id)
+        .filter(models.BookCoShelf.book_id == book_id, models.BookCoShelf.shelved_together > 0)
+        .order_by(models.BookCoShelf.shelved_together.desc(), models.Book.id)
+        .limit(limit)
+        .all()
+    )
+    return [(book, count) for book, count in rows]
+
+# -------------------------------
+# CRUD da Estante (UserBook)
+# -------------------------------
+
+def _bump_shelf_version(db: Session, user_id: int):
+    """Marca a estante do usuário como alterada, na mesma transação da alteração."""
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {
+            models.User.shelf_version: models.User.shelf_version + 1,
+            models.User.shelf_updated_at: int(time.time()),
+        },
+        synchronize_session=False,
+    )
+
+def get_shelf_version(db: Session, user_id: int):
+    """Retorna (versão, última alteração em epoch) da estante, sem carregar os itens."""
+    row = (
+        db.query(models.User.shelf_version, models.User.shelf_updated_at)
+        .filter(models.User.id == user_id)
+        .first()
+    )
+    return (row[0], row[1]) if row else (0, 0)
+
+def _put_on_shelf(db: Session, user_id: int, book_id: int, status: models.BookStatus):
+    """Inclui/atualiza o item da estante sem fazer commit."""
     db_item = db.query(models.UserBook).filter_by(user_id=user_id, book_id=book_id).first()
 
     if db_item:
+        _update_book_stats(db, book_id, (db_item.status, db_item.rating), (status, db_item.rating))
         db_item.status = status
-        print(f"INFO: Livro (ID: {book_id}) já na estante. Status atualizado.")
+        logger.debug("Livro %s já na estante do usuário %s; status atualizado.", book_id, user_id)
     else:
         db_item = models.UserBook(user_id=user_id, book_id=book_id, status=status)
         db.add(db_item)
-        print(f"INFO: Livro (ID: {book_id}) adicionado à estante.")
-    
+        db.flush()
+        _update_book_stats(db, book_id, None, (status, None))
+        _update_coshelf(db, user_id, [book_id], +1)
+        logger.debug("Livro %s adicionado à estante do usuário %s.", book_id, user_id)
+    _bump_shelf_version(db, user_id)
+    return db_item
+
+@retry_on_locked
+def add_book_to_shelf(db: Session, user_id: int, book_id: int, status: models.BookStatus):
+    """
+    Adiciona um livro na estante de um usuário.
+    Se o livro já estiver na estante, apenas atualiza seu status.
+    """
+    db_item = _put_on_shelf(db, user_id, book_id, status)
     db.commit()
     db.refresh(db_item)
     return db_item
 
+@retry_on_locked
+def shelve_book(db: Session, user_id: int, book_data: dict, status: models.BookStatus):
+    """
+    Resolve o livro (upsert de uma instrução) e o coloca na estante, tudo na mesma transação.
+    """
+    book_id = upsert_book(db, book_data)
+    db_item = _put_on_shelf(db, user_id, book_id, status)
+    db.commit()
+    return db_item
+
+# Inserção do lote: em conflito (o livro foi criado por outra transação depois da
+# consulta), não insere nada e o livro é consultado de novo
+INSERT_BOOK_SQL = text("""
+    INSERT INTO books (title, authors, description, isbn, publisher, "pageCount", "publishedDate",
+                       title_norm, authors_norm)
+    VALUES (:title, :authors, :description, :isbn, :publisher, :pageCount, :publishedDate,
+            :title_norm, :authors_norm)
+    ON CONFLICT DO NOTHING
+    RETURNING id
+""")
+
+def _find_book_id(db: Session, isbn, key):
+    """Id do livro com este ISBN canônico ou, sem ISBN, do livro sem ISBN com este título+autores."""
+    query = db.query(models.Book.id)
+    if isbn:
+        return query.filter(models.Book.isbn == isbn).scalar()
+    return query.filter(
+        models.Book.isbn.is_(None), models.Book.title_norm == key[0], models.Book.authors_norm == key[1]
+    ).scalar()
+
+@retry_on_locked
+def bulk_shelve(db: Session, user_id: int, entries: list):
+    """
+    Inclui (ou atualiza) vários livros na estante em uma única transação.
+    Os livros são resolvidos com consultas em conjunto (por ISBN canônico ou, sem ISBN,
+    por título+autores normalizados entre os livros sem ISBN); os que não existem são inseridos com
+    ON CONFLICT DO NOTHING e, se outra transação os criou nesse meio-tempo, consultados de novo.
+    Cada entrada traz os campos do livro mais `status` e `rating`.
+    """
+    for e in entries:
+        e["isbn"] = canonical_isbn(e.get("isbn"))
+        e["key"] = (normalize_text(e["title"]), normalize_authors(e["authors"]))
+
+    isbns = {e["isbn"] for e in entries if e["isbn"]}
+    by_isbn = {}
+    if isbns:
+        rows = db.query(models.Book.isbn, models.Book.id).filter(models.Book.isbn.in_(isbns))
+        by_isbn = {isbn: book_id for isbn, book_id in rows}
+
+    keys = {e["key"] for e in entries if not e["isbn"]}
+    by_key = {}
+    if keys:
+        rows = db.query(models.Book.title_norm, models.Book.authors_norm, models.Book.id).filter(
+            models.Book.isbn.is_(None),
+            tuple_(models.Book.title_norm, models.Book.authors_norm).in_(list(keys)),
+        )
+        by_key = {(title_norm, authors_norm): book_id for title_norm, authors_norm, book_id in rows}
+
+    books_created = 0
+    resolved = []
+    for e in entries:
+        book_id = by_isbn.get(e["isbn"]) if e["isbn"] else by_key.get(e["key"])
+        if book_id is None:
+            book_id = db.execute(INSERT_BOOK_SQL, {
+                "title": e["title"],
+                "authors": e["authors"],
+                "description": models.Book.description.default.arg,
+                "isbn": e["isbn"],
+                "publisher": e.get("publisher"),
+                "pageCount": e.get("pageCount"),
+                "publishedDate": e.get("publishedDate"),
+                "title_norm": e["key"][0],
+                "authors_norm": e["key"][1],
+            }).scalar()
+            if book_id is None:
+                book_id = _find_book_id(db, e["isbn"], e["key"])
+            else:
+                books_created += 1
+            if e["isbn"]:
+                by_isbn[e["isbn"]] = book_id
+            else:
+                by_key[e["key"]] = book_id
+        resolved.append((e, book_id))
+
+    book_ids = {book_id for _, book_id in resolved}
+    existing = {
+        item.book_id: item
+        for item in db.query(models.UserBook).filter(
+            models.UserBook.user_id == user_id, models.UserBook.book_id.in_(book_ids)
+        )
+    }
+    added = updated = 0
+    added_ids = []
+    for e, book_id in resolved:
+        item = existing.get(book_id)
+        old = None
+        if item is None:
+            item = models.UserBook(user_id=user_id, book_id=book_id, status=e["status"], rating=e.get("rating"))
+            db.add(item)
+            existing[book_id] = item
+            added_ids.append(book_id)
+            added += 1
+        else:
+            old = (item.status, item.rating)
+            item.status = e["status"]
+            if e.get("rating"):
+                item.rating = e["rating"]
+            updated += 1
+        _update_book_stats(db, book_id, old, (item.status, item.rating))
+
+    # Pares do lote inteiro em uma instrução (cada par contado uma vez)
+    db.flush()
+    _update_coshelf(db, user_id, added_ids, +1)
+    _bump_shelf_version(db, user_id)
+    db.commit()
+    return {"books_created": books_created, "added": added, "updated": updated}
+
 def get_user_shelf(db: Session, user_id: int):
-    """Retorna todos os livros da estante de um usuário."""
-    return db.query(models.UserBook).filter(models.UserBook.user_id == user_id).all()
+    """Retorna todos os livros da estante de um usuário (livros carregados na mesma consulta)."""
+    return (
+        db.query(models.UserBook)
+        .options(joinedload(models.UserBook.book))
+        .filter(models.UserBook.user_id == user_id)
+        .all()
+    )
 
+# Ordenações aceitas pela estante: nome -> (coluna do livro, decrescente?)
+# Sem coluna, a ordem é a de inclusão na estante.
+SHELF_SORTS = {
+    "added": (None, False),
+    "title-asc": (models.Book.title, False),
+    "title-desc": (models.Book.title, True),
+    "authors-asc": (models.Book.authors, False),
+}
+
+def shelf_sort(sort: str) -> str:
+    """Ordenação efetiva da estante (valores desconhecidos caem em "added")."""
+    return sort if sort in SHELF_SORTS else "added"
+
+def shelf_key_is_valid(sort: str, key) -> bool:
+    """
+    Se `key` tem o formato da chave gerada por `get_shelf_page` para `sort`:
+    [id] em "added" e [valor da coluna, id] nas demais (a coluna é texto e pode ser nula).
+    """
+    column, _ = SHELF_SORTS[shelf_sort(sort)]
+    if not isinstance(key, list) or len(key) != (1 if column is None else 2):
+        return False
+    *values, last_id = key
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        return False
+    return all(value is None or isinstance(value, str) for value in values)
+
+def get_shelf_page(
+    db: Session,
+    user_id: int,
+    status: str = None,
+    search: str = None,
+    sort: str = "added",
+    after: list = None,
+    limit: int = 48,
+):
+    """
+    Retorna uma página da estante já filtrada e ordenada no banco, com paginação por chave
+    (keyset): `after` é a chave do último item da página anterior, no formato da
+    ordenação `sort` (veja `shelf_key_is_valid`; uma chave inválida levanta ValueError).
+    Retorna uma tupla: (itens da página, chave para a próxima página ou None).
+    """
+    sort = shelf_sort(sort)
+    if after is not None and not shelf_key_is_valid(sort, after):
+        raise ValueError("chave de paginação não corresponde à ordenação")
+    query = (
+        db.query(models.UserBook)
+        .join(models.UserBook.book)
+        .options(contains_eager(models.UserBook.book))
+        .filter(models.UserBook.user_id == user_id)
+    )
+    if status:
+        query = query.filter(models.UserBook.status == models.BookStatus(status))
+    if search:
+        like = f"%{search}%"
+        query = query.filter(or_(models.Book.title.ilike(like), models.Book.authors.ilike(like)))
+
+    column, descending = SHELF_SORTS[sort]
+    keys = [models.UserBook.id] if column is None else [collate(column, "NOCASE"), models.UserBook.id]
+
+    if after:
+        row = tuple_(*keys) if len(keys) > 1 else keys[0]
+        value = tuple_(*after) if len(keys) > 1 else after[0]
+        query = query.filter(row < value if descending else row > value)
+
+    order = [k.desc() if descending else k.asc() for k in keys]
+    items = query.order_by(*order).limit(limit + 1).all()
+
+    next_key = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_key = [last.id] if column is None else [getattr(last.book, column.key), last.id]
+    return items, next_key
+
+@retry_on_locked
 def update_shelf_item(db: Session, user_book_id: int, status: models.BookStatus, rating: int):
     """Atualiza o status e a avaliação de um item na estante."""
     db_item = db.query(models.UserBook).filter(models.UserBook.id == user_book_id).first()
     if db_item:
+        old = (db_item.status, db_item.rating)
         db_item.status = status
         db_item.rating = rating if rating > 0 else None
+        _update_book_stats(db, db_item.book_id, old, (db_item.status, db_item.rating))
+        _bump_shelf_version(db, db_item.user_id)
         db.commit()
         db.refresh(db_item)
     return db_item
 
+@retry_on_locked
 def remove_book_from_shelf(db: Session, user_book_id: int):
     """Remove um livro da estante de um usuário."""
     db_item = db.query(models.UserBook).filter(models.UserBook.id == user_book_id).first()
     if db_item:
+        _update_book_stats(db, db_item.book_id, (db_item.status, db_item.rating), None)
+        _update_coshelf(db, db_item.user_id, [db_item.book_id], -1)
         db.delete(db_item)
+        _bump_shelf_version(db, db_item.user_id)
         db.commit()
-    return db_item
\ No newline at end of file
+    return db_item
+
+# -------------------------------
+# Versões assíncronas (AsyncSession, usadas pelas rotas async)
+# -------------------------------
+
+def _async_version(fn):
+    """
+    Versão assíncrona de uma função do crud: a mesma lógica roda na `AsyncSession`
+    (via `run_sync`), e a espera pelo banco não ocupa uma thread. Funções de escrita
+    (com `retry_on_locked`) refazem a operação com espera assíncrona.
+    """
+    sync_fn = getattr(fn, "__wrapped__", fn)
+
+    @functools.wraps(sync_fn)
+    async def run(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(sync_fn, *args, **kwargs)
+
+    run.__name__ = run.__qualname__ = f"{sync_fn.__name__}_async"
+    return async_retry_on_locked(run) if sync_fn is not fn else run
+
+get_user_by_email_async = _async_version(get_user_by_email)
+create_user_async = _async_version(create_user)
+update_user_password_hash_async = _async_version(update_user_password_hash)
+search_local_books_async = _async_version(search_local_books)
+get_local_isbns_async = _async_version(get_local_isbns)
+catalog_version_async = _async_version(catalog_version)
+get_book_stats_async = _async_version(get_book_stats)
+get_also_shelved_async = _async_version(get_also_shelved)
+get_shelf_version_async = _async_version(get_shelf_version)
+add_book_to_shelf_async = _async_version(add_book_to_shelf)
+shelve_book_async = _async_version(shelve_book)
+get_shelf_page_async = _async_version(get_shelf_page)
+update_shelf_item_async = _async_version(update_shelf_item)
+remove_book_from_shelf_async = _async_version(remove_book_from_shelf)
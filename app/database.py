@@ -1,13 +1,148 @@
-from sqlalchemy import create_engine
+import asyncio
+import functools
+import os
+import random
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from . import metrics
+
 # Conexão com SQLite local
-SQLALCHEMY_DATABASE_URL = "sqlite:///./books.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./books.db")
+
+# "default": um único engine, como no desenvolvimento.
+# "production": WAL + pragmas ajustados, engine de leitura com pool e engine de escrita único.
+DB_PROFILE = os.getenv("DB_PROFILE", "default")
+
+# Ajustes do perfil de produção
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "20"))
+
+# Novas tentativas quando o SQLite responde "database is locked"
+DB_LOCKED_RETRIES = int(os.getenv("DB_LOCKED_RETRIES", "5"))
+
+
+def _set_production_pragmas(dbapi_conn, connection_record):
+    """Pragmas aplicados a cada nova conexão do perfil de produção."""
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def make_engines(url: str = SQLALCHEMY_DATABASE_URL, profile: str = DB_PROFILE):
+    """
+    Cria os engines do banco conforme o perfil. Retorna (engine_de_escrita, engine_de_leitura);
+    no perfil "default" os dois são o mesmo engine.
+    """
+    connect_args = {"check_same_thread": False}
+    if profile != "production":
+        engine = create_engine(url, connect_args=connect_args)
+        metrics.instrument_engine(engine)
+        return engine, engine
+
+    connect_args["timeout"] = DB_BUSY_TIMEOUT_MS / 1000
+    # Um único escritor: as escritas fazem fila no pool em vez de disputar o lock do arquivo
+    write_engine = create_engine(url, connect_args=connect_args, pool_size=1, max_overflow=0, pool_timeout=30)
+    # Com WAL, leitores não bloqueiam o escritor (nem são bloqueados por ele)
+    read_engine = create_engine(url, connect_args=connect_args, pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_POOL_SIZE)
+    event.listen(write_engine, "connect", _set_production_pragmas)
+    event.listen(read_engine, "connect", _set_production_pragmas)
+    metrics.instrument_engine(write_engine)
+    metrics.instrument_engine(read_engine)
+    return write_engine, read_engine
+
+
+def async_url(url: str) -> str:
+    """URL do mesmo banco com o driver assíncrono (aiosqlite)."""
+    return url.replace("sqlite://", "sqlite+aiosqlite://", 1) if url.startswith("sqlite://") else url
+
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def make_async_engines(url: str = SQLALCHEMY_DATABASE_URL, profile: str = DB_PROFILE):
+    """
+    Engines assíncronos (aiosqlite) com os mesmos perfis de `make_engines`, usados pelas
+    rotas `async def`: a espera pelo banco não ocupa uma thread do Starlette.
+    Retorna (engine_de_escrita, engine_de_leitura).
+    """
+    url = async_url(url)
+    if profile != "production":
+        engine = create_async_engine(url)
+        metrics.instrument_engine(engine.sync_engine)
+        return engine, engine
+
+    connect_args = {"timeout": DB_BUSY_TIMEOUT_MS / 1000}
+    write_engine = create_async_engine(url, connect_args=connect_args, pool_size=1, max_overflow=0, pool_timeout=30)
+    read_engine = create_async_engine(
+        url, connect_args=connect_args, pool_size=DB_READ_POOL_SIZE, max_overflow=DB_READ_POOL_SIZE
+    )
+    for async_engine in (write_engine, read_engine):
+        event.listen(async_engine.sync_engine, "connect", _set_production_pragmas)
+        metrics.instrument_engine(async_engine.sync_engine)
+    return write_engine, read_engine
+
+
+engine, read_engine = make_engines()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# Sessões assíncronas: os objetos continuam utilizáveis após o commit (sem recarga implícita,
+# que exigiria uma nova ida ao banco fora de um `await`)
+async_engine, async_read_engine = make_async_engines()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+Base = declarative_base()
+
+
+def is_locked_error(exc: OperationalError) -> bool:
+    return "database is locked" in str(exc.orig) or "database is busy" in str(exc.orig)
+
+
+def retry_on_locked(fn):
+    """
+    Refaz uma operação de escrita quando o SQLite responde "database is locked",
+    com espera exponencial e jitter. A função decorada recebe a sessão como primeiro argumento.
+    """
+    @functools.wraps(fn)
+    def wrapper(db, *args, **kwargs):
+        for attempt in range(DB_LOCKED_RETRIES + 1):
+            try:
+                return fn(db, *args, **kwargs)
+            except OperationalError as exc:
+                if attempt == DB_LOCKED_RETRIES or not is_locked_error(exc):
+                    raise
+                db.rollback()
+                metrics.record_locked_retry(fn.__name__)
+                time.sleep(_locked_backoff(attempt))
+    return wrapper
+
+
+def async_retry_on_locked(fn):
+    """`retry_on_locked` para funções assíncronas que recebem uma `AsyncSession`."""
+    @functools.wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        for attempt in range(DB_LOCKED_RETRIES + 1):
+            try:
+                return await fn(db, *args, **kwargs)
+            except OperationalError as exc:
+                if attempt == DB_LOCKED_RETRIES or not is_locked_error(exc):
+                    raise
+                await db.rollback()
+                metrics.record_locked_retry(fn.__name__)
+                await asyncio.sleep(_locked_backoff(attempt))
+    return wrapper
+
 
-Base = declarative_base()
\ No newline at end of file
+def _locked_backoff(attempt: int) -> float:
+    return min(0.05 * 2 ** attempt, 1.0) * random.uniform(0.5, 1.5)
@@ -0,0 +1,188 @@
+# app/featured.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Intervalo entre atualizações em segundo plano (em segundos)
+FEATURED_REFRESH_SECONDS = int(os.getenv("FEATURED_REFRESH_SECONDS", "3600"))
+# Espera antes de tentar de novo depois de uma atualização que falhou (dobra a cada
+# falha seguida, até FEATURED_REFRESH_SECONDS)
+FEATURED_RETRY_SECONDS = float(os.getenv("FEATURED_RETRY_SECONDS", "30"))
+
+# Chave da lista no cache compartilhado
+STORE_KEY = "featured_books"
+
+
+class FeaturedCache:
+    """
+    Cache em memória (por processo) da lista de livros em destaque da home.
+
+    - É preenchido na inicialização da aplicação (ou logo depois, em segundo plano).
+    - Uma thread em segundo plano atualiza a lista periodicamente.
+    - `get()` nunca espera pelo Google: devolve sempre a última lista boa
+      (stale-while-revalidate) e, se ela estiver vencida, dispara uma
+      atualização em segundo plano.
+    - Se uma atualização falhar (exceção ou lista vazia), a lista anterior
+      continua sendo servida, e `get()` só tenta de novo depois de `retry_seconds`
+      (dobrando a cada falha seguida): com o Google fora, as requisições não
+      disparam uma atualização cada.
+    - Há no máximo uma atualização em andamento por processo.
+    - `version` é um hash do conteúdo da lista (igual entre processos com a mesma
+      lista) e `updated_at` guarda o instante (epoch) da última troca; a home
+      deriva deles o ETag/Last-Modified.
+    - Com um `store` (cache compartilhado entre workers), a lista carregada por um
+      worker é adotada pelos outros enquanto tiver menos de `refresh_seconds`: só um
+      worker chama o Google por intervalo e a inicialização dos demais não espera por ele.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], List[dict]],
+        refresh_seconds: int = FEATURED_REFRESH_SECONDS,
+        store=None,
+        retry_seconds: float = FEATURED_RETRY_SECONDS,
+    ):
+        self._loader = loader
+        self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        self._store = store
+        self._books: List[dict] = []
+        self._loaded_at: Optional[float] = None
+        self.version = ""
+        self.updated_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._failures = 0
+        self._retry_at: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _claim(self) -> bool:
+        """Marca uma atualização em andamento; False se já houver outra."""
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            return True
+
+    def refresh(self) -> bool:
+        """Recarrega a lista de forma síncrona. Retorna True se a lista foi trocada."""
+        if not self._claim():
+            return False
+        return self._refresh_claimed()
+
+    def _refresh_claimed(self) -> bool:
+        """Atualização para quem já fez `_claim()`; registra o resultado para o backoff."""
+        refreshed = False
+        try:
+            refreshed = self._load()
+            return refreshed
+        finally:
+            with self._lock:
+                self._refreshing = False
+                if refreshed:
+                    self._failures = 0
+                    self._retry_at = None
+                else:
+                    self._failures += 1
+                    backoff = self.retry_seconds * 2 ** min(self._failures - 1, 16)
+                    self._retry_at = time.monotonic() + min(backoff, self.refresh_seconds)
+
+    def _load(self) -> bool:
+        try:
+            shared = self._store.get(STORE_KEY) if self._store is not None else None
+            if shared is not None and time.time() - shared["fetched_at"] < self.refresh_seconds:
+                # Outro worker já atualizou neste intervalo
+                self._adopt(shared["books"], shared["version"], shared["updated_at"])
+                return True
+            books = self._loader()
+        except Exception:
+            logger.exception("Falha ao atualizar os livros em destaque; mantendo a lista anterior.")
+            return False
+
+        if not books:
+            logger.warning("Atualização dos destaques não retornou livros; mantendo a lista anterior.")
+            return False
+
+        version = hashlib.sha1(json.dumps(books, sort_keys=True, default=str).encode()).hexdigest()
+        updated_at = time.time()
+        if shared is not None and shared["version"] == version:
+            updated_at = shared["updated_at"]
+        elif version == self.version:
+            updated_at = self.updated_at
+        self._adopt(books, version, updated_at)
+        if self._store is not None:
+            self._store.set(STORE_KEY, {
+                "books": books, "version": version, "updated_at": updated_at, "fetched_at": time.time(),
+            })
+        return True
+
+    def _adopt(self, books: List[dict], version: str, updated_at: float):
+        with self._lock:
+            self._books = books
+            self._loaded_at = time.monotonic()
+            self.version = version
+            self.updated_at = updated_at
+
+    @property
+    def ready(self) -> bool:
+        """Se já há uma lista carregada (a primeira carga pode estar em andamento)."""
+        return self._loaded_at is not None
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """Espera (sem ocupar threads) a primeira carga por até `timeout` segundos."""
+        deadline = time.monotonic() + timeout
+        while not self.ready and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return self.ready
+
+    def is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    def get(self) -> List[dict]:
+        """Retorna a última lista boa sem bloquear; revalida em segundo plano se vencida."""
+        if self.is_stale() and (self._retry_at is None or time.monotonic() >= self._retry_at):
+            self.refresh_in_background()
+        return self._books
+
+    def refresh_in_background(self):
+        # A marca é feita antes de criar a thread: requisições simultâneas não disparam duas
+        if not self._claim():
+            return
+        threading.Thread(target=self._refresh_claimed, name="featured-refresh-once", daemon=True).start()
+
+    def _run(self, refresh_first: bool):
+        if refresh_first:
+            self.refresh()
+        while not self._stop.wait(self.refresh_seconds):
+            self.refresh()
+
+    def start(self, wait: bool = True):
+        """
+        Inicia a thread de atualização periódica. Com `wait=True` a primeira carga é feita
+        antes de retornar; com `wait=False` ela também fica em segundo plano (a inicialização
+        não depende do Google e a home mostra um esqueleto até a lista chegar).
+        """
+        if wait:
+            self.refresh()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(not wait,), name="featured-refresh", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
@@ -0,0 +1,495 @@
+# app/google_books.py
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .cache import make_cache
+from .resilience import (
+    CircuitBreaker, CircuitOpenError, QuotaExceeded, QuotaScheduler, RetryBudget, UpstreamError, call_timeout,
+    current_client, current_priority, remaining_budget,
+)
+
+logger = logging.getLogger(__name__)
+
+BASE_URL = os.getenv("GOOGLE_BOOKS_BASE_URL", "https://www.googleapis.com/books/v1/volumes")
+
+# Tamanho do pool de conexões keep-alive e limite de chamadas simultâneas ao Google
+POOL_SIZE = int(os.getenv("GOOGLE_BOOKS_POOL_SIZE", "20"))
+MAX_CONCURRENCY = int(os.getenv("GOOGLE_BOOKS_MAX_CONCURRENCY", "10"))
+# Threads para o trabalho de fundo (pré-carga e atualização dos destaques)
+BACKGROUND_CONCURRENCY = int(os.getenv("GOOGLE_BOOKS_BACKGROUND_CONCURRENCY", "2"))
+
+# Cache de resultados: chave (query, start_index, max_results)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "600"))
+SEARCH_CACHE_NEGATIVE_TTL = int(os.getenv("SEARCH_CACHE_NEGATIVE_TTL", "60"))
+
+# Volumes vistos nas buscas, pelo id do Google: o formulário de /shelf/add envia só
+# esse id (handle) e o servidor recupera daqui os dados do livro
+VOLUME_CACHE_SIZE = int(os.getenv("VOLUME_CACHE_SIZE", "20000"))
+VOLUME_CACHE_TTL = int(os.getenv("VOLUME_CACHE_TTL", "1800"))
+
+# Última resposta boa de cada busca, guardada por mais tempo: é servida quando o
+# Google falha ou o disjuntor está aberto
+STALE_CACHE_TTL = int(os.getenv("SEARCH_STALE_CACHE_TTL", str(24 * 3600)))
+
+# Timeouts de cada chamada (conexão, leitura); a leitura também é limitada pelo
+# orçamento de tempo da requisição (REQUEST_BUDGET_SECONDS)
+CONNECT_TIMEOUT = float(os.getenv("GOOGLE_BOOKS_CONNECT_TIMEOUT", "2"))
+READ_TIMEOUT = float(os.getenv("GOOGLE_BOOKS_READ_TIMEOUT", "4"))
+
+# Novas tentativas para 429/5xx e erros de rede, com espera exponencial e jitter,
+# limitadas a uma fração do tráfego recente (orçamento de novas tentativas)
+MAX_RETRIES = int(os.getenv("GOOGLE_BOOKS_MAX_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("GOOGLE_BOOKS_RETRY_BACKOFF", "0.1"))
+RETRY_BUDGET_RATIO = float(os.getenv("GOOGLE_BOOKS_RETRY_BUDGET_RATIO", "0.1"))
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Hedging: se a resposta não chegar em N ms, dispara uma segunda chamada igual e
+# usa a que responder primeiro (0 desliga)
+HEDGE_AFTER_MS = int(os.getenv("GOOGLE_BOOKS_HEDGE_AFTER_MS", "0"))
+
+# Disjuntor: falhas seguidas até abrir e por quanto tempo fica aberto
+BREAKER_FAILURES = int(os.getenv("GOOGLE_BOOKS_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("GOOGLE_BOOKS_BREAKER_RESET_SECONDS", "30"))
+
+# Cota da chave de API (por processo; com vários workers, divida pelo número deles):
+# chamadas por segundo, rajada máxima, limite diário (0 = sem limite) e a parte de
+# cada usuário/IP (GOOGLE_BOOKS_QUOTA_CLIENT_RPS=0 desliga). As capas têm uma parte
+# por cliente separada (_COVER_RPS/_COVER_BURST; uma página traz até 20 capas) e não
+# gastam a das buscas. As reservas e esperas por prioridade ficam em QuotaScheduler
+QUOTA_RPS = float(os.getenv("GOOGLE_BOOKS_QUOTA_RPS", "5"))
+QUOTA_BURST = float(os.getenv("GOOGLE_BOOKS_QUOTA_BURST", "20"))
+QUOTA_DAILY_LIMIT = int(os.getenv("GOOGLE_BOOKS_QUOTA_DAILY", "0"))
+QUOTA_CLIENT_RPS = float(os.getenv("GOOGLE_BOOKS_QUOTA_CLIENT_RPS", "1"))
+QUOTA_CLIENT_BURST = float(os.getenv("GOOGLE_BOOKS_QUOTA_CLIENT_BURST", "10"))
+QUOTA_CLIENT_COVER_RPS = float(os.getenv("GOOGLE_BOOKS_QUOTA_CLIENT_COVER_RPS", "2"))
+QUOTA_CLIENT_COVER_BURST = float(os.getenv("GOOGLE_BOOKS_QUOTA_CLIENT_COVER_BURST", "20"))
+QUOTA_MAX_WAIT = float(os.getenv("GOOGLE_BOOKS_QUOTA_MAX_WAIT", "1"))
+
+# Paginação: o Google devolve até 40 itens por chamada; as páginas do site são
+# servidas de janelas alinhadas desse tamanho (duas páginas de 20 por chamada) e,
+# ao abrir uma página, a janela seguinte é carregada em segundo plano
+SEARCH_WINDOW_SIZE = 40
+SEARCH_PREFETCH = os.getenv("SEARCH_PREFETCH", "1") == "1"
+# Quantos resultados a busca do site exibe no máximo
+SEARCH_RESULTS_LIMIT = 100
+
+VOLUME_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Uma chamada ao Google: (query, max_results, start_index)
+SearchCall = Tuple[str, int, int]
+
+
+def _build_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Sessão compartilhada: reaproveita conexões TLS entre as requisições
+session = _build_session()
+
+# Threads dedicadas às chamadas ao Google das requisições (não ocupam o threadpool do Starlette)
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="google-books")
+# Pool separado para o trabalho de fundo: esperas por cota e backoff da pré-carga e dos
+# destaques não deixam as buscas dos usuários na fila atrás deles
+_background_executor = ThreadPoolExecutor(max_workers=BACKGROUND_CONCURRENCY, thread_name_prefix="google-books-bg")
+# Tentativas em paralelo do hedging (separadas para não disputar com `_executor`)
+_hedge_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY * 2, thread_name_prefix="google-books-hedge")
+
+breaker = CircuitBreaker("google_books", BREAKER_FAILURES, BREAKER_RESET_SECONDS)
+retry_budget = RetryBudget(RETRY_BUDGET_RATIO)
+# Todas as chamadas (buscas, volumes, capas do Google) passam pela mesma cota
+quota = QuotaScheduler(
+    "google_books",
+    rate=QUOTA_RPS,
+    burst=QUOTA_BURST,
+    daily_limit=QUOTA_DAILY_LIMIT,
+    client_rate=QUOTA_CLIENT_RPS,
+    client_burst=QUOTA_CLIENT_BURST,
+    client_limits={"covers": (QUOTA_CLIENT_COVER_RPS, QUOTA_CLIENT_COVER_BURST)},
+    max_wait={"interactive": QUOTA_MAX_WAIT, "covers": QUOTA_MAX_WAIT / 2, "background": 0.0},
+)
+
+# Resultados vazios ficam menos tempo em cache (cache negativo). Com CACHE_BACKEND=shared,
+# os caches ficam em um arquivo lido por todos os workers
+search_cache = make_cache(
+    "google_search",
+    maxsize=SEARCH_CACHE_SIZE,
+    ttl=SEARCH_CACHE_TTL,
+    negative_ttl=SEARCH_CACHE_NEGATIVE_TTL,
+    is_negative=lambda result: not result[0],
+)
+
+volume_cache = make_cache("google_volumes", maxsize=VOLUME_CACHE_SIZE, ttl=VOLUME_CACHE_TTL)
+stale_search_cache = make_cache("google_search_stale", maxsize=SEARCH_CACHE_SIZE, ttl=STALE_CACHE_TTL)
+
+# Falhas de chamada ao Google tratadas pelas funções públicas (o resto é bug e sobe)
+UPSTREAM_FAILURES = (UpstreamError, requests.RequestException, ValueError)
+
+
+def extract_isbn(volume_info: dict):
+    isbn_10, isbn_13 = None, None
+    for ident in volume_info.get("industryIdentifiers", []):
+        if ident.get("type") == "ISBN_10":
+            isbn_10 = ident.get("identifier")
+        elif ident.get("type") == "ISBN_13":
+            isbn_13 = ident.get("identifier")
+    isbn = isbn_13 if isbn_13 else isbn_10
+    return isbn_10, isbn_13, isbn
+
+def normalize_book(item: dict) -> dict:
+    vi = item.get("volumeInfo", {})
+    ai = item.get("accessInfo", {})
+    isbn_10, isbn_13, isbn = extract_isbn(vi)
+    image_links = vi.get("imageLinks") or {}
+    return {
+        "id": item.get("id", ""),
+        "handle": f"g:{item['id']}" if item.get("id") else "",
+        "title": vi.get("title", "Título não encontrado"),
+        "authors": vi.get("authors", ["Desconhecido"]),
+        "publisher": vi.get("publisher", "—"),
+        "publishedDate": vi.get("publishedDate", "—"),
+        "description": vi.get("description", "Descrição não disponível"),
+        "categories": vi.get("categories", []),
+        "pageCount": vi.get("pageCount", "—"),
+        "thumbnail": image_links.get("thumbnail") or image_links.get("smallThumbnail") or "",
+        "infoLink": vi.get("infoLink", ""),
+        "previewLink": vi.get("previewLink", ""),
+        "webReaderLink": ai.get("webReaderLink", ""),
+        "isbn": isbn,
+        "isbn_10": isbn_10,
+        "isbn_13": isbn_13,
+        "url": item.get("selfLink", ""),
+    }
+
+def _attempt(url: str, params: dict, operation: str, timeout: Tuple[float, float]) -> requests.Response:
+    """Uma tentativa de GET no Google, medindo latência, status e classe do erro."""
+    start = time.perf_counter()
+    try:
+        r = session.get(url, params=params, timeout=timeout)
+    except requests.RequestException as exc:
+        metrics.observe_upstream("google_books", operation, time.perf_counter() - start, "error", type(exc).__name__)
+        raise
+    error = "" if r.ok else "HTTPError"
+    metrics.observe_upstream("google_books", operation, time.perf_counter() - start, str(r.status_code), error)
+    return r
+
+def _retryable(r: Optional[requests.Response]) -> bool:
+    return r is None or r.status_code in RETRYABLE_STATUS
+
+def _hedged(url: str, params: dict, operation: str, timeout: Tuple[float, float]) -> requests.Response:
+    """
+    Faz a tentativa e, se ela passar de HEDGE_AFTER_MS sem resposta (e houver orçamento),
+    dispara uma cópia; devolve a primeira resposta boa.
+    """
+    if HEDGE_AFTER_MS <= 0:
+        return _attempt(url, params, operation, timeout)
+
+    hedge_after = HEDGE_AFTER_MS / 1000
+    first = _hedge_executor.submit(_attempt, url, params, operation, timeout)
+    try:
+        return first.result(timeout=hedge_after)
+    except FutureTimeout:
+        pass
+    if not retry_budget.try_spend() or not quota.try_acquire():
+        return first.result()
+
+    metrics.UPSTREAM_HEDGES.inc("google_books", operation)
+    second_timeout = (timeout[0], max(0.05, timeout[1] - hedge_after))
+    pending = {first, _hedge_executor.submit(_attempt, url, params, operation, second_timeout)}
+    fallback, error = None, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                r = future.result()
+            except requests.RequestException as exc:
+                error = exc
+                continue
+            if not _retryable(r):
+                return r
+            fallback = r
+    if fallback is not None:
+        return fallback
+    raise error
+
+def _backoff(attempt: int, r: Optional[requests.Response]) -> float:
+    delay = RETRY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+    retry_after = r.headers.get("Retry-After") if r is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), 2.0))
+    return delay
+
+def _acquire_quota():
+    """Reserva uma chamada na cota, com a prioridade do contexto, medindo a espera."""
+    start = time.perf_counter()
+    try:
+        quota.acquire()
+    finally:
+        metrics.UPSTREAM_QUOTA_WAIT.observe(time.perf_counter() - start, "google_books", current_priority())
+
+def _get(url: str, params: dict, operation: str) -> requests.Response:
+    """
+    GET no Google com cota por prioridade, disjuntor, timeout derivado do orçamento da
+    requisição, hedging opcional e novas tentativas para 429/5xx e erros de rede. Devolve
+    a última resposta (o chamador faz `raise_for_status`) ou levanta a exceção da última
+    tentativa (`QuotaExceeded` se a primeira nem pôde ser feita).
+    """
+    retry_budget.record_request()
+    attempt = 0
+    r, error = None, None
+    while True:
+        try:
+            _acquire_quota()
+        except QuotaExceeded:
+            # Sem cota para uma nova tentativa: fica com o resultado da anterior
+            if attempt == 0:
+                raise
+            if error is not None:
+                raise error
+            return r
+        if not breaker.allow():
+            quota.refund()
+            metrics.UPSTREAM_SHORT_CIRCUITS.inc("google_books", operation)
+            raise CircuitOpenError("disjuntor do Google Books aberto")
+        timeout = (CONNECT_TIMEOUT, call_timeout(READ_TIMEOUT))
+
+        r, error = None, None
+        try:
+            r = _hedged(url, params, operation, timeout)
+        except requests.RequestException as exc:
+            error = exc
+        if not _retryable(r):
+            breaker.record_success()
+            return r
+        breaker.record_failure()
+
+        attempt += 1
+        delay = _backoff(attempt, r)
+        remaining = remaining_budget()
+        if attempt > MAX_RETRIES or (remaining is not None and remaining <= delay) or not retry_budget.try_spend():
+            if error is not None:
+                raise error
+            return r
+        metrics.UPSTREAM_RETRIES.inc("google_books", operation)
+        time.sleep(delay)
+
+def _fetch_search(query: str, max_results: int, start_index: int) -> (List[dict], int):
+    """Faz a chamada ao Google. Erros de rede/HTTP são propagados (e não vão para o cache)."""
+    params = {
+        "q": query,
+        "key": os.getenv("GOOGLE_BOOKS_API_KEY"),
+        "maxResults": max_results,
+        "startIndex": start_index
+    }
+    r = _get(BASE_URL, params, "search")
+    r.raise_for_status()
+    data = r.json()
+
+    items = data.get("items", [])
+    total_items = data.get("totalItems", 0)
+
+    normalized_books = [normalize_book(it) for it in items]
+    for book in normalized_books:
+        if book["id"]:
+            volume_cache.set(book["id"], book)
+    if normalized_books:
+        stale_search_cache.set((query, start_index, max_results), (normalized_books, total_items))
+    return (normalized_books, total_items)
+
+def _fetch_volume(volume_id: str) -> dict:
+    r = _get(f"{BASE_URL}/{volume_id}", {"key": os.getenv("GOOGLE_BOOKS_API_KEY")}, "volume")
+    r.raise_for_status()
+    return normalize_book(r.json())
+
+def get_volume(volume_id: str) -> Optional[dict]:
+    """
+    Dados de um volume do Google pelo id: vêm do cache das buscas recentes e, se já
+    expiraram, de uma consulta ao volume. Retorna None se o id for inválido ou o Google falhar.
+    """
+    if not VOLUME_ID_RE.match(volume_id or ""):
+        return None
+    try:
+        return volume_cache.get_or_load(volume_id, lambda: _fetch_volume(volume_id))
+    except UPSTREAM_FAILURES as exc:
+        _log_failure("volume", volume_id, exc)
+        return None
+
+class FailureTracker:
+    """
+    Marca se alguma chamada ao Google falhou dentro de um `track_failures()` e se
+    alguma foi recusada pela cota (`throttled`): o resultado não deve ir para caches
+    compartilhados, senão a cota de um cliente vira "nenhum resultado" para todos.
+    """
+
+    def __init__(self):
+        self.failed = False
+        self.throttled = False
+
+
+_failure_tracker: contextvars.ContextVar[Optional[FailureTracker]] = contextvars.ContextVar(
+    "google_failure_tracker", default=None
+)
+
+@contextmanager
+def track_failures():
+    """
+    Acompanha as falhas das chamadas ao Google feitas dentro do bloco (inclusive nas
+    threads de `_executor`, que recebem uma cópia do contexto). Falhas de outras
+    requisições ou da pré-carga não aparecem aqui.
+    """
+    tracker = FailureTracker()
+    token = _failure_tracker.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _failure_tracker.reset(token)
+
+def _log_failure(operation: str, target, exc: Exception):
+    tracker = _failure_tracker.get()
+    if tracker is not None:
+        tracker.failed = True
+        if isinstance(exc, QuotaExceeded):
+            tracker.throttled = True
+    # Com o disjuntor aberto ou sem cota, todas as chamadas falham: não polui o log com cada uma
+    level = logging.DEBUG if isinstance(exc, (CircuitOpenError, QuotaExceeded)) else logging.WARNING
+    logger.log(level, "Google Books (%s %r) falhou: %s: %s", operation, target, type(exc).__name__, exc)
+
+def google_search(query: str, max_results: int = 40, start_index: int = 0) -> (List[dict], int):
+    """
+    Busca na API do Google e retorna uma tupla: (lista de livros, total de itens encontrados).
+    Os resultados passam pelo `search_cache`; buscas idênticas simultâneas geram uma só chamada.
+    Se o Google falhar (ou o disjuntor estiver aberto), devolve a última resposta boa
+    dessa busca, se houver, ou ([], 0).
+    """
+    # Garante que max_results não passe de 40
+    if max_results > 40:
+        max_results = 40
+
+    key = (query, start_index, max_results)
+    load = lambda: _fetch_search(query, max_results, start_index)
+    try:
+        try:
+            return search_cache.get_or_load(key, load)
+        except QuotaExceeded as exc:
+            # Esperou a carga de outro cliente, barrada pela cota dele: tenta com a nossa
+            if exc.client == current_client():
+                raise
+            return search_cache.get_or_load(key, load)
+    except UPSTREAM_FAILURES as exc:
+        _log_failure("search", query, exc)
+        return stale_search_cache.get(key) or ([], 0)
+
+def _window_start(index: int) -> int:
+    return index // SEARCH_WINDOW_SIZE * SEARCH_WINDOW_SIZE
+
+def google_search_page(query: str, per_page: int, start_index: int) -> (List[dict], int):
+    """
+    Página [start_index, start_index + per_page) da busca, recortada das janelas
+    alinhadas de SEARCH_WINDOW_SIZE itens (via `google_search`, com cache). Páginas
+    vizinhas compartilham a mesma chamada ao Google; a janela seguinte é pré-carregada.
+    """
+    books, total = [], 0
+    start = _window_start(start_index)
+    end = start_index + per_page
+    while start < end:
+        window, window_total = google_search(query, max_results=SEARCH_WINDOW_SIZE, start_index=start)
+        total = max(total, window_total)
+        books += window[max(0, start_index - start):end - start]
+        # Janela incompleta: não há mais resultados adiante
+        if len(window) < SEARCH_WINDOW_SIZE:
+            break
+        start += SEARCH_WINDOW_SIZE
+    else:
+        if total:
+            prefetch_search_window(query, start, min(total, SEARCH_RESULTS_LIMIT))
+    return books, total
+
+_prefetching = set()
+_prefetch_lock = threading.Lock()
+
+def prefetch_search_window(query: str, start_index: int, limit: int = SEARCH_RESULTS_LIMIT):
+    """
+    Carrega em segundo plano a janela que começa em `start_index`, se ela existir,
+    ainda não estiver em cache, o Google estiver respondendo e houver folga na cota.
+    Não espera o resultado.
+    """
+    key = (query, start_index, SEARCH_WINDOW_SIZE)
+    if not SEARCH_PREFETCH or start_index >= limit or breaker.state != "closed":
+        return
+    # Perto do limite da cota, a pré-carga é a primeira a ser descartada
+    if not quota.has_headroom("background"):
+        return
+    if search_cache.get(key) is not None:
+        return
+    with _prefetch_lock:
+        # Já há pré-cargas suficientes na fila: esta seria atendida tarde demais
+        if key in _prefetching or len(_prefetching) >= BACKGROUND_CONCURRENCY * 2:
+            return
+        _prefetching.add(key)
+
+    def run():
+        try:
+            google_search(query, max_results=SEARCH_WINDOW_SIZE, start_index=start_index)
+        finally:
+            with _prefetch_lock:
+                _prefetching.discard(key)
+
+    metrics.SEARCH_PREFETCHES.inc()
+    # Sem copiar o contexto: a pré-carga não consome o orçamento de tempo da requisição
+    # e roda com prioridade "background"
+    _background_executor.submit(run)
+
+async def _run_in_executor(fn, *args):
+    """Executa uma chamada bloqueante ao Google em `_executor`, sem prender o event loop."""
+    loop = asyncio.get_running_loop()
+    # Leva o contexto (orçamento de tempo, métricas da requisição) para a thread
+    call = functools.partial(contextvars.copy_context().run, fn, *args)
+    return await loop.run_in_executor(_executor, call)
+
+async def google_search_page_async(query: str, per_page: int, start_index: int) -> (List[dict], int):
+    """Versão assíncrona de `google_search_page`."""
+    return await _run_in_executor(google_search_page, query, per_page, start_index)
+
+async def get_volume_async(volume_id: str) -> Optional[dict]:
+    """Versão assíncrona de `get_volume` (sem sair do event loop se o volume está em cache)."""
+    cached = volume_cache.get(volume_id) if VOLUME_ID_RE.match(volume_id or "") else None
+    if cached is not None:
+        return cached
+    return await _run_in_executor(get_volume, volume_id)
+
+def google_search_many(calls: Iterable[SearchCall], max_concurrency: Optional[int] = None) -> List[Tuple[List[dict], int]]:
+    """
+    Executa várias buscas em paralelo e retorna os resultados na mesma ordem das chamadas.
+    A latência total fica próxima à da chamada mais lenta, e não à soma de todas.
+    Fora de uma requisição (prioridade "background", ex.: destaques) usa o pool de fundo.
+    """
+    limit = threading.BoundedSemaphore(max_concurrency or MAX_CONCURRENCY)
+    executor = _background_executor if current_priority() == "background" else _executor
+
+    def run(call: SearchCall, context: contextvars.Context):
+        with limit:
+            return context.run(google_search, *call)
+
+    calls = list(calls)
+    # Uma cópia do contexto por chamada: um mesmo contexto não pode rodar em duas threads
+    return list(executor.map(run, calls, [contextvars.copy_context() for _ in calls]))
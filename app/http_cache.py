@@ -0,0 +1,270 @@
+# app/http_cache.py
+
+"""
+Cache HTTP da aplicação.
+
+- Páginas renderizadas: ETag derivado das versões dos dados (destaques, entrada do
+  cache de busca, versão da estante). Com `If-None-Match` igual, a rota responde 304
+  sem renderizar o template.
+- Compressão das respostas de texto (HTML, JSON, CSS, JS): brotli quando o módulo
+  `brotli` estiver instalado e o navegador aceitar, senão gzip.
+- Arquivos estáticos com impressão digital (`?v=<hash>`), cache de longa duração e
+  variantes .gz/.br geradas uma vez e servidas prontas.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import zlib
+from email.utils import formatdate
+from pathlib import Path
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+try:  # brotli é opcional: sem ele, só gzip
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Onde ficam as variantes pré-comprimidas dos arquivos estáticos
+STATIC_CACHE_DIR = Path(os.getenv("STATIC_CACHE_DIR", "./cache/static"))
+
+# Respostas menores que isso não compensam a compressão
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "500"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Tipos que valem a pena comprimir (imagens já vêm comprimidas)
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/xml",
+    "image/svg+xml",
+)
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".html", ".json", ".svg", ".txt", ".xml"}
+
+# Páginas: o navegador guarda, mas sempre revalida (o ETag muda com os dados)
+PAGE_CACHE_CONTROL = "private, no-cache"
+# Estáticos pedidos com a impressão digital atual: nunca mudam nessa URL
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+# ---------- Requisições condicionais ----------
+
+def make_etag(*parts) -> str:
+    """ETag fraco a partir das versões que determinam o conteúdo da página."""
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> Optional[Response]:
+    """
+    Resposta 304 se o cliente já tem a versão `etag` da página; senão None.
+    Só o `If-None-Match` é considerado: o ETag inclui o usuário da sessão, a data não.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {_opaque(t) for t in header.split(",")}
+    if "*" in tags or _opaque(etag) in tags:
+        return Response(status_code=304, headers=cache_headers(etag, last_modified))
+    return None
+
+def cache_headers(etag: str, last_modified: Optional[float] = None) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL, "Vary": "Cookie"}
+    if last_modified:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+def with_cache_headers(response: Response, etag: str, last_modified: Optional[float] = None) -> Response:
+    response.headers.update(cache_headers(etag, last_modified))
+    return response
+
+
+# ---------- Compressão ----------
+
+def _is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+def _gzip_compressor():
+    c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = formato gzip
+    # Em respostas em streaming, cada bloco sai comprimido (sync flush) sem esperar o fim
+    return lambda data, more: c.compress(data) + (c.flush(zlib.Z_SYNC_FLUSH) if more else c.flush())
+
+def _brotli_compressor():
+    c = brotli.Compressor(quality=BROTLI_QUALITY)
+    return lambda data, more: c.process(data) + (c.flush() if more else c.finish())
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class CompressionMiddleware:
+    """
+    Comprime respostas de texto com brotli ou gzip conforme o `Accept-Encoding`.
+    Respostas que já têm `Content-Encoding` (estáticos pré-comprimidos) passam direto.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compress = None
+
+        async def send_compressed(message):
+            nonlocal start, compress
+            if message["type"] == "http.response.start":
+                # Só decide depois de ver o primeiro bloco do corpo
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                compressible = _is_compressible(headers.get("content-type", ""))
+                if compressible and "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+                if (
+                    compressible
+                    and "content-encoding" not in headers
+                    and (more_body or len(body) >= self.minimum_size)
+                ):
+                    compress = _brotli_compressor() if encoding == "br" else _gzip_compressor()
+                    headers["Content-Encoding"] = encoding
+                    if "content-length" in headers:
+                        del headers["Content-Length"]
+                    body = compress(body, more_body)
+                    if not more_body:
+                        headers["Content-Length"] = str(len(body))
+                    message = {**message, "body": body}
+                await send(start)
+                start = None
+            elif compress is not None:
+                message = {**message, "body": compress(body, more_body)}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
+
+
+# ---------- Arquivos estáticos ----------
+
+class StaticAssets(StaticFiles):
+    """
+    `StaticFiles` com impressão digital e variantes pré-comprimidas.
+
+    - `url(path)` devolve `/static/<path>?v=<hash do conteúdo>`; pedidos com o hash
+      atual recebem cache imutável de um ano, os demais revalidam pelo ETag.
+    - CSS/JS são comprimidos uma vez (gzip e, se disponível, brotli) em
+      `STATIC_CACHE_DIR` e servidos prontos conforme o `Accept-Encoding`.
+    """
+
+    def __init__(self, directory: str, prefix: str = "/static", cache_dir: Path = STATIC_CACHE_DIR):
+        super().__init__(directory=directory)
+        self.root = Path(directory)
+        self.prefix = prefix
+        self.cache_dir = cache_dir
+        self.fingerprints: Dict[str, str] = {}
+        self._variants: Dict[str, Dict[str, Path]] = {}
+        self._build()
+
+    def _build(self):
+        for path in sorted(p for p in self.root.rglob("*") if p.is_file()):
+            rel = path.relative_to(self.root).as_posix()
+            data = path.read_bytes()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            self.fingerprints[rel] = digest
+            if path.suffix in COMPRESSIBLE_SUFFIXES:
+                try:
+                    self._variants[rel] = self._precompress(rel, digest, data)
+                except OSError:
+                    logger.warning("Não foi possível pré-comprimir %s", rel, exc_info=True)
+
+    def _precompress(self, rel: str, digest: str, data: bytes) -> Dict[str, Path]:
+        encoders = {"gzip": lambda d: gzip.compress(d, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            encoders["br"] = lambda d: brotli.compress(d, quality=11)
+        variants = {}
+        for encoding, encode in encoders.items():
+            suffix = "gz" if encoding == "gzip" else "br"
+            # O hash no nome evita servir uma variante de uma versão antiga do arquivo
+            target = self.cache_dir / f"{rel}.{digest}.{suffix}"
+            if not target.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+                tmp.write_bytes(encode(data))
+                os.replace(tmp, target)
+            variants[encoding] = target
+        return variants
+
+    def url(self, path: str) -> str:
+        path = path.lstrip("/")
+        digest = self.fingerprints.get(path)
+        return f"{self.prefix}/{path}?v={digest}" if digest else f"{self.prefix}/{path}"
+
+    async def get_response(self, path: str, scope) -> Response:
+        rel = path.replace(os.sep, "/")
+        request_headers = Headers(scope=scope)
+        response = None
+
+        variants = self._variants.get(rel)
+        encoding = choose_encoding(request_headers.get("accept-encoding", "")) if variants else None
+        if encoding in (variants or {}):
+            target = variants[encoding]
+            media_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+            response = FileResponse(
+                target,
+                media_type=media_type,
+                stat_result=os.stat(target),  # ETag/Last-Modified já no construtor
+                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+            )
+            if self.is_not_modified(response.headers, request_headers):
+                response = Response(status_code=304, headers={"ETag": response.headers["etag"]})
+        if response is None:
+            response = await super().get_response(path, scope)
+
+        if response.status_code in (200, 304):
+            version = Request(scope).query_params.get("v")
+            fresh = version is not None and version == self.fingerprints.get(rel)
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if fresh else "public, no-cache"
+        return response
+
+    def build_id(self, templates_dir: str) -> str:
+        """Identifica a versão dos templates e estáticos; entra nos ETags das páginas."""
+        digest = hashlib.sha256()
+        for rel, fingerprint in sorted(self.fingerprints.items()):
+            digest.update(f"{rel}:{fingerprint}".encode())
+        for path in sorted(p for p in Path(templates_dir).rglob("*") if p.is_file()):
+            digest.update(path.read_bytes())
+        return digest.hexdigest()[:12]
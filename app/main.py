@@ -1,28 +1,54 @@
 # app/main.py
 
-from fastapi import FastAPI, Depends, Request, Form, Query
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Depends, Request, Form, Query, File, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pathlib import Path
-from typing import List
-from dotenv import load_dotenv
+from typing import List, Optional
+import base64
+import json
+import logging
 import os
 import re
-import requests
+import tempfile
+import time
 from starlette.middleware.sessions import SessionMiddleware
-from . import models, database, crud
-from .auth import hash_password, verify_password
+from contextlib import asynccontextmanager
+from . import models, database, crud, metrics, migrations, bulk
+from .cache import CACHE_BACKEND, make_cache
+from .auth import PasswordHasherBusy, hash_password_async, verify_and_update_async, shutdown_pool
+from .covers import PLACEHOLDER_COVER, CoverSourceRefused, cover_store, cover_url, resolve_source, source_version
+from .featured import FEATURED_REFRESH_SECONDS, FeaturedCache
+from .google_books import (
+    SEARCH_CACHE_NEGATIVE_TTL, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, SEARCH_RESULTS_LIMIT, SEARCH_WINDOW_SIZE,
+    breaker as google_breaker, get_volume_async, google_search_many, google_search_page_async,
+    quota as google_quota, search_cache, track_failures, volume_cache,
+)
+from .resilience import (
+    QuotaExceeded, RequestBudgetMiddleware, UpstreamPriorityMiddleware, current_client, upstream_priority,
+)
+from .http_cache import (
+    CompressionMiddleware, StaticAssets, cache_headers, make_etag, not_modified, with_cache_headers,
+)
+from .normalize import canonical_isbn
 from datetime import datetime
+from email.utils import formatdate
 
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(dotenv_path=env_path)
-GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_BOOKS_API_KEY")
+logger = logging.getLogger(__name__)
 
-BASE_URL = "https://www.googleapis.com/books/v1/volumes"
+# Templates compilados ficam em disco: os workers não recompilam a cada inicialização
+JINJA_CACHE_DIR = Path(os.getenv("JINJA_CACHE_DIR", "./cache/jinja"))
+
+# Com vários workers, o esquema é preparado uma vez antes de subi-los
+# (python -m app.manage migrate) e cada worker só confere a versão
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") == "1"
 
 templates = Jinja2Templates(directory="app/templates")
+JINJA_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+templates.env.bytecode_cache = FileSystemBytecodeCache(str(JINJA_CACHE_DIR))
 
 def format_date(value: str):
     if not value:
@@ -38,86 +64,103 @@ def format_date(value: str):
         return value
 
 templates.env.filters["format_date"] = format_date
+templates.env.globals["cover_url"] = cover_url
+
+# Estáticos com impressão digital (?v=hash) e variantes pré-comprimidas
+static_files = StaticAssets(directory="app/static")
+templates.env.globals["static_url"] = static_files.url
+
+# Muda a cada deploy com templates/estáticos diferentes; entra em todos os ETags de página
+BUILD_ID = static_files.build_id("app/templates")
 
-app = FastAPI()
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+def page_etag(*parts) -> str:
+    return make_etag(BUILD_ID, *parts)
 
-models.Base.metadata.create_all(bind=database.engine)
+# Marcador nos templates: o que vem antes dele é enviado ao navegador sem esperar o resto
+FLUSH_MARKER = "<!--flush-->"
 
+def stream_template(name: str, context: dict, headers: Optional[dict] = None) -> StreamingResponse:
+    """
+    Renderiza o template em streaming: cada trecho até um FLUSH_MARKER sai assim que
+    fica pronto (o navegador já começa a baixar CSS/JS e a desenhar o topo da página).
+    """
+    template = templates.get_template(name)
+
+    async def body():
+        buffer = []
+        for piece in template.generate(context):
+            *ready, rest = piece.split(FLUSH_MARKER)
+            for part in ready:
+                buffer.append(part)
+                yield "".join(buffer)
+                buffer = []
+            buffer.append(rest)
+        yield "".join(buffer)
+
+    return StreamingResponse(body(), media_type="text/html; charset=utf-8", headers=headers)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Destaques carregados e atualizados em segundo plano: a inicialização não espera o Google
+    featured_cache.start(wait=False)
+    yield
+    featured_cache.stop()
+    shutdown_pool()
+    await database.async_engine.dispose()
+    await database.async_read_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+app.mount("/static", static_files, name="static")
+
+if MIGRATE_ON_STARTUP:
+    migrations.setup_database(database.engine)
+elif migrations.pending(database.engine):
+    logger.warning("Banco com migrações pendentes; rode: python -m app.manage migrate")
+
+# Dentro da sessão: chamadas ao Google das requisições são "interactive", com a cota dividida por usuário/IP
+app.add_middleware(UpstreamPriorityMiddleware)
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_SECRET", "sua_chave_secreta"))
+app.add_middleware(CompressionMiddleware)
+# Prazo total das chamadas externas de cada requisição (REQUEST_BUDGET_SECONDS)
+app.add_middleware(RequestBudgetMiddleware)
+# Por último: as métricas medem a requisição inteira, incluindo a compressão
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Quanto /featured espera pela primeira carga dos destaques e por quanto tempo o
+# fragmento pode ser reaproveitado sem revalidar (em segundos)
+FEATURED_WAIT_SECONDS = float(os.getenv("FEATURED_WAIT_SECONDS", "3"))
+FEATURED_FRAGMENT_MAX_AGE = int(os.getenv("FEATURED_FRAGMENT_MAX_AGE", "300"))
+
+# Por quanto tempo uma capa pedida sem a versão da origem (`?v=`) atual pode ser
+# reaproveitada sem revalidar (em segundos); com a versão, ela é imutável
+COVER_MAX_AGE = int(os.getenv("COVER_MAX_AGE", "3600"))
+
+# Se definido, /metrics exige "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# "hybrid": catálogo local primeiro, Google completa a página; "google": apenas Google
+SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")
 
 EMAIL_REGEX = r"^[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,24}$"
 
-def get_db():
-    db = database.SessionLocal()
+def get_read_db():
+    """Sessão síncrona de leitura (engine de leitura no perfil de produção), para rotas no threadpool."""
+    db = database.ReadSessionLocal()
     try:
         yield db
     finally:
         db.close()
 
-def extract_isbn(volume_info: dict):
-    isbn_10, isbn_13 = None, None
-    for ident in volume_info.get("industryIdentifiers", []):
-        if ident.get("type") == "ISBN_10":
-            isbn_10 = ident.get("identifier")
-        elif ident.get("type") == "ISBN_13":
-            isbn_13 = ident.get("identifier")
-    isbn = isbn_13 if isbn_13 else isbn_10
-    return isbn_10, isbn_13, isbn
-
-def normalize_book(item: dict) -> dict:
-    vi = item.get("volumeInfo", {})
-    ai = item.get("accessInfo", {})
-    isbn_10, isbn_13, isbn = extract_isbn(vi)
-    image_links = vi.get("imageLinks") or {}
-    return {
-        "title": vi.get("title", "Título não encontrado"),
-        "authors": vi.get("authors", ["Desconhecido"]),
-        "publisher": vi.get("publisher", "—"),
-        "publishedDate": vi.get("publishedDate", "—"),
-        "description": vi.get("description", "Descrição não disponível"),
-        "categories": vi.get("categories", []),
-        "pageCount": vi.get("pageCount", "—"),
-        "thumbnail": image_links.get("thumbnail") or image_links.get("smallThumbnail") or "",
-        "infoLink": vi.get("infoLink", ""),
-        "previewLink": vi.get("previewLink", ""),
-        "webReaderLink": ai.get("webReaderLink", ""),
-        "isbn": isbn,
-        "isbn_10": isbn_10,
-        "isbn_13": isbn_13,
-        "url": item.get("selfLink", ""),
-    }
-
-def google_search(query: str, max_results: int = 40, start_index: int = 0) -> (List[dict], int):
-    """
-    Busca na API do Google e retorna uma tupla: (lista de livros, total de itens encontrados).
-    """
-    # Garante que max_results não passe de 40
-    if max_results > 40:
-        max_results = 40
-
-    params = {
-        "q": query,
-        "key": GOOGLE_BOOKS_API_KEY,
-        "maxResults": max_results,
-        "startIndex": start_index
-    }
-
-    try:
-        r = requests.get(BASE_URL, params=params)
-        r.raise_for_status()
-        data = r.json()
-        
-        items = data.get("items", [])
-        total_items = data.get("totalItems", 0)
-
-        normalized_books = [normalize_book(it) for it in items]
-        return (normalized_books, total_items)
+# As rotas são `async def` e usam sessões assíncronas (aiosqlite): esperar pelo banco
+# ou pelo Google não ocupa uma thread do threadpool do Starlette
+async def get_async_db():
+    async with database.AsyncSessionLocal() as db:
+        yield db
 
-    except requests.exceptions.RequestException as e:
-        return ([], 0)
-    except Exception as e:
-        return ([], 0)
+async def get_async_read_db():
+    """Sessão assíncrona para rotas que só leem (engine de leitura no perfil de produção)."""
+    async with database.AsyncReadSessionLocal() as db:
+        yield db
 
 def featured_from_google():
     termos_fixos = [
@@ -126,12 +169,15 @@ def featured_from_google():
         "Torre do Alvorecer", "Reino de Cinzas", "A Vida Invisível de Addie Larue",
         "Noites Brancas"
     ]
+    # Todas as buscas saem em paralelo: a latência fica próxima à de uma só chamada
+    with track_failures() as failures:
+        resultados = google_search_many((f'intitle:"{termo}"', 1, 0) for termo in termos_fixos)
+    # Parte destas buscas falhou (Google fora ou cota reservada às buscas dos usuários):
+    # se já há uma lista, ela continua valendo em vez de uma incompleta
+    if failures.failed and featured_cache.ready:
+        return []
     featured = []
-    for termo in termos_fixos:
-        # --- LÓGICA CORRIGIDA ABAIXO ---
-        # Agora, desempacotamos a tupla (lista_de_livros, total)
-        livros_encontrados, total = google_search(f'intitle:"{termo}"', max_results=1)
-        
+    for livros_encontrados, total in resultados:
         # Verificamos se a LISTA de livros não está vazia
         if livros_encontrados:
             # Pegamos o primeiro item da LISTA
@@ -139,6 +185,22 @@ def featured_from_google():
             
     return featured
 
+# Cache dos destaques: a home nunca espera pelo Google. Com vários workers, a lista
+# fica também no cache compartilhado e só um deles chama o Google a cada intervalo
+featured_cache = FeaturedCache(
+    featured_from_google,
+    store=make_cache("featured", maxsize=1, ttl=FEATURED_REFRESH_SECONDS * 24) if CACHE_BACKEND == "shared" else None,
+)
+
+@app.exception_handler(PasswordHasherBusy)
+def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    # Fila do bcrypt cheia: recusa rápido em vez de segurar a requisição
+    return HTMLResponse(
+        "Muitas tentativas de login no momento. Tente novamente em instantes.",
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
 # ---------- Flash helpers (mensagens 1 vez) ----------
 def set_flash(request: Request, key: str, message: str):
     request.session[key] = message
@@ -147,97 +209,291 @@ def pop_flash(request: Request, key: str):
     return request.session.pop(key, None)
 # -----------------------------------------------------
 
+@app.get("/metrics")
+async def metrics_endpoint(request: Request):
+    """Métricas no formato texto do Prometheus."""
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        return PlainTextResponse("Não autorizado", status_code=401)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/", response_class=HTMLResponse)
-def home(request: Request):
-    featured_books = featured_from_google()
+async def home(request: Request):
+    featured_books = featured_cache.get()
     user_id = request.session.get("user_id")
-    return templates.TemplateResponse(
+    etag = page_etag("home", featured_cache.version, user_id)
+    cached = not_modified(request, etag, featured_cache.updated_at)
+    if cached:
+        return cached
+    # Com os destaques prontos, a grade vem na própria página; senão, um esqueleto que o
+    # ui.js substitui pelo fragmento de /featured
+    return stream_template(
         "index.html",
         {
             "request": request,
             "featured_books": featured_books,
+            "featured_ready": featured_cache.ready,
             "user_id": user_id
-        }
+        },
+        headers=cache_headers(etag, featured_cache.updated_at),
+    )
+
+@app.get("/featured", response_class=HTMLResponse)
+async def featured_fragment(request: Request):
+    """
+    Grade de destaques como fragmento HTML. Não depende do usuário: pode ficar em
+    caches compartilhados por FEATURED_FRAGMENT_MAX_AGE segundos e revalida pelo ETag.
+    """
+    await featured_cache.wait_ready(FEATURED_WAIT_SECONDS)
+    featured_books = featured_cache.get()
+    response = templates.TemplateResponse(
+        "_featured.html", {"request": request, "featured_books": featured_books}
     )
+    if not featured_cache.ready:
+        # Ainda sem lista: a mensagem de "nenhum destaque" não deve ficar em cache
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+    etag = page_etag("featured", featured_cache.version)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={FEATURED_FRAGMENT_MAX_AGE}"}
+    if featured_cache.updated_at:
+        headers["Last-Modified"] = formatdate(featured_cache.updated_at, usegmt=True)
+    cached = not_modified(request, etag)
+    if cached:
+        cached.headers.update(headers)
+        return cached
+    response.headers.update(headers)
+    return response
 
 @app.get("/login", response_class=HTMLResponse)
-def login_form(request: Request):
+async def login_form(request: Request):
     error_message = pop_flash(request, "flash_error")
     return templates.TemplateResponse("login.html", {"request": request, "error_message": error_message})
 
 @app.post("/login")
-def login_user(
+async def login_user(
     request: Request,
     email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_async_read_db)
 ):
+    # O bcrypt roda no pool de processos e o banco é acessado pela sessão assíncrona
     if not re.match(EMAIL_REGEX, email or ""):
         set_flash(request, "flash_error", "Formato de email inválido")
         return RedirectResponse(url="/login", status_code=303)
-    user = crud.get_user_by_email(db, email)
+    user = await crud.get_user_by_email_async(read_db, email)
     if not user:
         set_flash(request, "flash_error", "Email não cadastrado")
         return RedirectResponse(url="/login", status_code=303)
-    if not verify_password(password, user.password_hash):
+    password_ok, new_hash = await verify_and_update_async(password, user.password_hash)
+    if not password_ok:
         set_flash(request, "flash_error", "Senha incorreta")
         return RedirectResponse(url="/login", status_code=303)
+    if new_hash:
+        # Custo do bcrypt mudou: regrava o hash de forma transparente
+        await crud.update_user_password_hash_async(db, user.id, new_hash)
     request.session["user_id"] = user.id
     return RedirectResponse(url="/", status_code=303)
 
 @app.get("/register", response_class=HTMLResponse)
-def register_form(request: Request):
+async def register_form(request: Request):
     error_message = pop_flash(request, "flash_error")
     return templates.TemplateResponse("register.html", {"request": request, "error_message": error_message})
 
 @app.post("/register")
-def register_user(
+async def register_user(
     request: Request,
     full_name: str = Form(...),
     email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_async_read_db)
 ):
     if not re.match(EMAIL_REGEX, email or ""):
         set_flash(request, "flash_error", "Formato de email inválido")
         return RedirectResponse(url="/register", status_code=303)
-    existing_user = crud.get_user_by_email(db, email)
+    existing_user = await crud.get_user_by_email_async(read_db, email)
     if existing_user:
         set_flash(request, "flash_error", "Email já cadastrado")
         return RedirectResponse(url="/register", status_code=303)
-    hashed_pw = hash_password(password)
-    crud.create_user(db, full_name, email, hashed_pw)
+    hashed_pw = await hash_password_async(password)
+    await crud.create_user_async(db, full_name, email, hashed_pw)
     return RedirectResponse(url="/login", status_code=303)
 
 @app.get("/logout")
-def logout(request: Request):
+async def logout(request: Request):
     request.session.clear()
     return RedirectResponse(url="/", status_code=303)
 
+def book_to_dict(book: models.Book) -> dict:
+    """Converte um livro do catálogo local no mesmo formato usado pelos resultados do Google."""
+    return {
+        "id": book.id,
+        "handle": f"l:{book.id}",
+        "title": book.title,
+        "authors": [a.strip() for a in (book.authors or "Desconhecido").split(",")],
+        "publisher": book.publisher,
+        "publishedDate": book.publishedDate,
+        "description": book.description,
+        "pageCount": book.pageCount,
+        "thumbnail": book.thumbnail or "",
+        "isbn": book.isbn,
+    }
+
+def _is_local_duplicate(book: dict, local_isbns: set) -> bool:
+    return bool(book.get("isbn")) and canonical_isbn(book.get("isbn")) in local_isbns
+
+def _google_unique_total(window: list, window_total: int, local_isbns: set) -> int:
+    """Total do Google sem as duplicatas dos locais que aparecem em `window` (as demais são desconhecidas)."""
+    return max(0, window_total - sum(_is_local_duplicate(b, local_isbns) for b in window))
+
+async def google_unique_results(query: str, local_isbns: set, skip: int, count: int):
+    """
+    Itens [skip, skip + count) dos resultados do Google sem os livros locais. Percorre as
+    janelas alinhadas desde o início (ficam em cache), então cada resultado tem a mesma
+    posição em todas as páginas: nada se repete nem é pulado entre uma página e outra.
+    Retorna (livros, total do Google sem as duplicatas encontradas).
+    """
+    books, position, duplicates, total = [], 0, 0, 0
+    start = 0
+    while start < SEARCH_RESULTS_LIMIT and len(books) < count:
+        window, total = await google_search_page_async(query, SEARCH_WINDOW_SIZE, start)
+        for book in window:
+            if _is_local_duplicate(book, local_isbns):
+                duplicates += 1
+                continue
+            if position >= skip and len(books) < count:
+                books.append(book)
+            position += 1
+        # Janela incompleta: não há mais resultados adiante
+        if len(window) < SEARCH_WINDOW_SIZE:
+            break
+        start += SEARCH_WINDOW_SIZE
+    return books, max(0, total - duplicates)
+
+async def hybrid_search(db: AsyncSession, keyword: str, search_by: str, query: str, per_page: int, start_index: int):
+    """
+    Busca híbrida: responde primeiro com o catálogo local (índice FTS5) e só chama
+    o Google para completar a página. Se o Google estiver fora, a página traz só os locais.
+    Retorna (livros, total, há mais resultados além do total?).
+    """
+    local_books, local_total = await crud.search_local_books_async(
+        db, keyword, search_by, limit=per_page, offset=start_index
+    )
+    books = [book_to_dict(b) for b in local_books]
+    local_isbns = await crud.get_local_isbns_async(db, keyword, search_by) if local_total else set()
+
+    need = per_page - len(books)
+    if need == 0:
+        # Página inteira local: não espera o Google. O total vem da primeira janela se ela
+        # já estiver em cache; senão a paginação só indica que há mais resultados
+        first = search_cache.get((query, 0, SEARCH_WINDOW_SIZE))
+        if first is None:
+            return books, local_total, True
+        return books, local_total + _google_unique_total(*first, local_isbns), False
+
+    # A parte do Google começa onde os locais acabam, na sequência sem duplicatas
+    google_books, google_total = await google_unique_results(
+        query, local_isbns, max(0, start_index - local_total), need
+    )
+    return books + google_books, local_total + google_total, False
+
+# Páginas de busca prontas (livros, total, Google degradado?): chave (modo, termo, campo,
+# página, versão do catálogo). O carimbo de versão de cada entrada compõe o ETag da página.
+search_pages = make_cache(
+    "search_pages",
+    maxsize=SEARCH_CACHE_SIZE,
+    ttl=SEARCH_CACHE_TTL,
+    negative_ttl=SEARCH_CACHE_NEGATIVE_TTL,
+    is_negative=lambda result: not result[0] or result[2],
+)
+
+class SearchThrottled(Exception):
+    """Página montada com chamadas recusadas pela cota: não vai para `search_pages`."""
+
+    def __init__(self, page: tuple, client: Optional[str]):
+        super().__init__("busca limitada pela cota do Google")
+        self.page = page
+        self.client = client
+
+async def load_search_page(key: tuple, load_page):
+    """
+    Página de busca via `search_pages`. Retorna (página, veio do cache compartilhado?).
+    Uma página montada sob limite de cota volta só para quem a pediu, sem cache; quem
+    esperava a mesma carga (de outro cliente) monta a sua.
+    """
+    try:
+        return await search_pages.get_or_load_async(key, load_page), True
+    except SearchThrottled as exc:
+        if exc.client == current_client():
+            return exc.page, False
+    try:
+        return await search_pages.get_or_load_async(key, load_page), True
+    except SearchThrottled as exc:
+        return exc.page, False
+
+metrics.register_cache("google_search", search_cache)
+metrics.register_cache("google_volumes", volume_cache)
+metrics.register_cache("search_pages", search_pages)
+metrics.register_cache("cover_refs", cover_store.refs)
+metrics.register_breaker(google_breaker)
+metrics.register_quota(google_quota)
+
 @app.get("/search", response_class=HTMLResponse)
-def search_books(
+async def search_books(
     request: Request,
     keyword: str = Query(..., min_length=1),
     search_by: str = Query("title"),
     page: int = Query(1, ge=1),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     query = f'inauthor:"{keyword}"' if search_by == "author" else f'intitle:"{keyword}"'
     
     per_page = 20 # Quantos livros você quer mostrar por página no seu site
     start_index = (page - 1) * per_page
 
+    user_id = request.session.get("user_id")
+
+    # No modo híbrido a página depende também do catálogo local
+    catalog = await crud.catalog_version_async(db) if SEARCH_MODE == "hybrid" else 0
+    key = (SEARCH_MODE, keyword, search_by, page, catalog)
+    version = search_pages.version(key)
+    if version is not None:
+        cached = not_modified(request, page_etag("search", key, version, user_id))
+        if cached:
+            return cached
+
     # A função agora retorna os livros JÁ PAGINADOS e o total de resultados
-    books, total_books = google_search(query, max_results=per_page, start_index=start_index)
-    total_books = min(total_books, 100)
+    async def load_page():
+        with track_failures() as failures:
+            if SEARCH_MODE == "hybrid":
+                books, total, more = await hybrid_search(db, keyword, search_by, query, per_page, start_index)
+            else:
+                (books, total), more = await google_search_page_async(query, per_page, start_index), False
+        if failures.throttled:
+            raise SearchThrottled((books, total, True, more), current_client())
+        # Página montada com o Google degradado (só locais ou resultado antigo)
+        # fica pouco tempo em cache, como um resultado vazio
+        return books, total, failures.failed, more
+
+    (books, total_books, _, more_results), shared = await load_search_page(key, load_page)
+    if not shared and not books:
+        # A cota do Google recusou esta busca: avisa o cliente em vez de mostrar uma lista vazia
+        return HTMLResponse(
+            "Muitas buscas em pouco tempo. Tente novamente em instantes.",
+            status_code=429,
+            headers={"Retry-After": "5", "Cache-Control": "no-store"},
+        )
+    version = search_pages.version(key) if shared else None
+    total_books = min(total_books, SEARCH_RESULTS_LIMIT)
+    more_results = more_results and total_books < SEARCH_RESULTS_LIMIT
 
     # A lógica de paginação agora usa o `total_books` retornado pela API
     displayed_start = 0 if total_books == 0 else start_index + 1
     displayed_end = min(start_index + len(books), total_books)
     total_pages = max(1, (total_books + per_page - 1) // per_page)
 
-    user_id = request.session.get("user_id")
-
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "search_results.html",
         {
             "request": request,
@@ -248,74 +504,287 @@ def search_books(
             "displayed_books_start": displayed_start,
             "displayed_books_end": displayed_end,
             "total_pages": total_pages,
+            "more_results": more_results,
             "current_page": page,
             "per_page": per_page,
             "user_id": user_id,
         }
     )
+    if version is None:
+        return response
+    return with_cache_headers(response, page_etag("search", key, version, user_id))
+
+# =========================================================
+# ======================== CAPAS ==========================
+# =========================================================
+
+@app.get("/covers/{key}")
+def get_cover(
+    request: Request,
+    key: str,
+    size: str = Query("grid"),
+    v: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Capa de um livro (por id do livro, ISBN ou "g:<id do volume>" do Google), baixada
+    uma vez e servida do cache em disco.
+    `size` escolhe a variante: "grid" (cards e lista) ou "modal". A URL não é endereçada
+    pelo conteúdo: só é imutável quando `v` é a versão da origem atual (ver `cover_url`);
+    sem ela, vale por COVER_MAX_AGE e depois é revalidada pelo ETag.
+    Continua síncrona (threadpool): lê e grava arquivos e baixa a imagem com `requests`;
+    com o cache imutável no navegador, cada capa é pedida raramente.
+    """
+    # Capas valem menos que as buscas na cota do Google
+    with upstream_priority("covers"):
+        source = resolve_source(db, key)
+        if not source:
+            return RedirectResponse(PLACEHOLDER_COVER, status_code=302)
+        try:
+            data, content_type, etag = cover_store.get(source, size)
+        except QuotaExceeded:
+            # Sem cota agora: o navegador tenta de novo na próxima visita (o redirect não é cacheado)
+            return RedirectResponse(PLACEHOLDER_COVER, status_code=302)
+        except CoverSourceRefused as exc:
+            logger.warning("Capa %s recusada: %s", key, exc)
+            return RedirectResponse(PLACEHOLDER_COVER, status_code=302)
+        except Exception:
+            logger.warning("Falha ao obter a capa %s", key, exc_info=True)
+            return RedirectResponse(PLACEHOLDER_COVER, status_code=302)
+
+    if v == source_version(source):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = f"public, max-age={COVER_MAX_AGE}"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(data, media_type=content_type, headers=headers)
 
 # =========================================================
 # ============ NOVAS ROTAS PARA A ESTANTE =================
 # =========================================================
 
+def volume_to_book_data(volume: dict) -> dict:
+    """Dados de um volume do Google no formato esperado por `crud.shelve_book`."""
+    return {
+        "title": volume["title"],
+        "authors": volume["authors"],
+        "description": volume["description"],
+        "thumbnail": volume["thumbnail"],
+        "isbn": volume["isbn"],
+        "publisher": volume["publisher"],
+        "pageCount": volume["pageCount"] if isinstance(volume["pageCount"], int) else None,
+        "publishedDate": volume["publishedDate"],
+    }
+
 @app.post("/shelf/add")
-def add_to_shelf(
+async def add_to_shelf(
     request: Request,
-    db: Session = Depends(get_db),
-    # Dados do livro vêm do formulário
-    book_title: str = Form(...),
-    book_authors: str = Form(...),
-    book_description: str = Form(...),
-    book_thumbnail: str = Form(...),
-    book_isbn: str = Form(None),
-    # --- NOVOS PARÂMETROS ---
-    book_publisher: str = Form(...),
-    book_pageCount: int = Form(...),
-    book_publishedDate: str = Form(...),
-    # --- FIM DOS NOVOS PARÂMETROS ---
-    status: str = Form(...)
+    db: AsyncSession = Depends(get_async_db),
+    # O formulário só traz o handle do resultado da busca: "l:<id do livro>" (catálogo
+    # local) ou "g:<id do volume no Google>". Os dados do livro são resolvidos no servidor.
+    handle: str = Form(...),
+    status: models.BookStatus = Form(...)
 ):
     user_id = request.session.get("user_id")
     if not user_id:
         return RedirectResponse("/login", status_code=303)
 
-    book_data = {
-        "title": book_title,
-        "authors": book_authors.split(','),
-        "description": book_description,
-        "thumbnail": book_thumbnail,
-        "isbn": book_isbn,
-        "publisher": book_publisher,
-        "pageCount": book_pageCount,
-        "publishedDate": book_publishedDate
+    source, _, ref = handle.partition(":")
+    if source == "l" and ref.isdigit() and await db.get(models.Book, int(ref)):
+        await crud.add_book_to_shelf_async(db, user_id, int(ref), status)
+    elif source == "g" and (volume := await get_volume_async(ref)):
+        await crud.shelve_book_async(db, user_id=user_id, book_data=volume_to_book_data(volume), status=status)
+    else:
+        return HTMLResponse("Resultado de busca inválido ou expirado. Refaça a busca.", status_code=404)
+    return RedirectResponse("/shelf", status_code=303)
+
+SHELF_PAGE_SIZE = 48 # Livros por página da estante
+
+def encode_cursor(key: Optional[list], sort: str = "added", status: Optional[str] = None,
+                  q: Optional[str] = None) -> Optional[str]:
+    """
+    Transforma a chave do último item em um cursor opaco para a URL. O cursor leva
+    também a ordenação e os filtros da listagem: só vale para a mesma consulta.
+    """
+    if key is None:
+        return None
+    payload = {"key": key, "sort": crud.shelf_sort(sort), "status": status, "q": q}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_cursor(cursor: Optional[str], sort: str, status: Optional[str], q: Optional[str]) -> Optional[list]:
+    """
+    Chave de paginação do cursor, ou None se não houver cursor. Levanta ValueError se
+    o cursor estiver malformado ou for de outra consulta (ordenação ou filtros diferentes).
+    """
+    if not cursor:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("cursor malformado") from None
+    sort = crud.shelf_sort(sort)
+    if (
+        not isinstance(payload, dict)
+        or payload.get("sort") != sort
+        or payload.get("status") != status
+        or payload.get("q") != q
+        or not crud.shelf_key_is_valid(sort, payload.get("key"))
+    ):
+        raise ValueError("cursor de outra consulta")
+    return payload["key"]
+
+def shelf_item_to_dict(item: models.UserBook) -> dict:
+    """Dados de um card da estante (os mesmos atributos data-* do template)."""
+    book = item.book
+    return {
+        "id": item.id,
+        "book_id": book.id,
+        "status": item.status.value,
+        "rating": item.rating or 0,
+        "title": book.title,
+        "authors": book.authors,
+        "description": book.description or "Sem descrição",
+        "publisher": book.publisher or "—",
+        "pages": book.pageCount or "—",
+        "date": format_date(book.publishedDate) or "—",
+        "thumb": cover_url(book, "grid"),
+        "cover": cover_url(book, "modal"),
     }
 
-    book = crud.get_or_create_book(db, book_data)
-    crud.add_book_to_shelf(db, user_id=user_id, book_id=book.id, status=status)
-    return RedirectResponse("/shelf", status_code=303)
+@app.get("/books/{book_id}/stats")
+async def book_stats(book_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    """Avaliação média, leitores por status e "quem tem este livro também tem" (para o modal)."""
+    stats = await crud.get_book_stats_async(db, book_id)
+    also_shelved = await crud.get_also_shelved_async(db, book_id)
+    return {
+        "readers": stats.readers if stats else 0,
+        "rating_count": stats.rating_count if stats else 0,
+        "average_rating": stats.average_rating if stats else None,
+        "status_counts": {s.value: getattr(stats, s.name) if stats else 0 for s in models.BookStatus},
+        "also_shelved": [
+            {
+                "id": book.id,
+                "title": book.title,
+                "authors": book.authors,
+                "thumb": cover_url(book, "grid"),
+                "readers": count,
+            }
+            for book, count in also_shelved
+        ],
+    }
 
 @app.get("/shelf", response_class=HTMLResponse)
-def view_shelf(request: Request, db: Session = Depends(get_db)):
+async def view_shelf(request: Request, db: AsyncSession = Depends(get_async_read_db)):
     user_id = request.session.get("user_id")
     if not user_id:
         return RedirectResponse("/login", status_code=303)
 
-    user_books = crud.get_user_shelf(db, user_id)
+    shelf_version, shelf_updated_at = await crud.get_shelf_version_async(db, user_id)
+    etag = page_etag("shelf", user_id, shelf_version)
+    cached = not_modified(request, etag, shelf_updated_at)
+    if cached:
+        return cached
+
+    # Só a primeira página é renderizada; o restante vem de /shelf/items conforme a rolagem
+    user_books, next_key = await crud.get_shelf_page_async(db, user_id, limit=SHELF_PAGE_SIZE)
     
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         "shelf.html",
         {
             "request": request,
             "user_id": user_id,
-            "user_books": user_books
+            "user_books": user_books,
+            "next_cursor": encode_cursor(next_key),
         }
     )
+    return with_cache_headers(response, etag, shelf_updated_at)
+
+@app.get("/shelf/items")
+async def shelf_items(
+    request: Request,
+    db: AsyncSession = Depends(get_async_read_db),
+    status: Optional[models.BookStatus] = Query(None),
+    q: Optional[str] = Query(None),
+    sort: str = Query("added"),
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(SHELF_PAGE_SIZE, ge=1, le=200),
+):
+    """API JSON da estante: filtro, ordenação e paginação por chave feitos no servidor."""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return JSONResponse({"detail": "Não autenticado"}, status_code=401)
+
+    shelf_version, shelf_updated_at = await crud.get_shelf_version_async(db, user_id)
+    etag = page_etag("shelf-items", user_id, shelf_version, status, q, sort, cursor, limit)
+    cached = not_modified(request, etag, shelf_updated_at)
+    if cached:
+        return cached
+
+    status_value = status.value if status else None
+    search = q.strip() if q else None
+    try:
+        after = decode_cursor(cursor, sort, status_value, search)
+    except ValueError:
+        return JSONResponse({"detail": "Cursor inválido para esta listagem"}, status_code=400)
+
+    items, next_key = await crud.get_shelf_page_async(
+        db, user_id,
+        status=status_value,
+        search=search,
+        sort=sort,
+        after=after,
+        limit=limit,
+    )
+    response = JSONResponse({
+        "items": [shelf_item_to_dict(item) for item in items],
+        "next_cursor": encode_cursor(next_key, sort, status_value, search),
+    })
+    return with_cache_headers(response, etag, shelf_updated_at)
+
+@app.post("/shelf/import")
+async def import_shelf(
+    request: Request,
+    file: UploadFile = File(...),
+    format: str = Form("auto"),
+):
+    """
+    Importa uma estante (CSV da RedLibrary, CSV do Goodreads ou JSONL) em streaming.
+    A resposta é NDJSON com uma linha de progresso por lote gravado. Os lotes são
+    gravados pela sessão síncrona do `bulk`, no threadpool, enquanto a resposta é enviada.
+    """
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return JSONResponse({"detail": "Não autenticado"}, status_code=401)
+
+    # O upload é fechado assim que a rota retorna: copia (em blocos) para um arquivo
+    # temporário que pertence à resposta e é lido linha a linha durante o streaming
+    upload = tempfile.TemporaryFile()
+    while chunk := await file.read(1024 * 1024):
+        upload.write(chunk)
+    upload.seek(0)
+    return StreamingResponse(bulk.import_file(user_id, upload, format), media_type="application/x-ndjson")
+
+@app.get("/shelf/export")
+async def export_shelf(request: Request, format: str = Query("csv", pattern="^(csv|jsonl)$")):
+    """Exporta a estante em CSV ou JSONL, gerada em streaming a partir do banco."""
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return RedirectResponse("/login", status_code=303)
+
+    if format == "jsonl":
+        body, media_type = bulk.export_jsonl(user_id), "application/x-ndjson"
+    else:
+        body, media_type = bulk.export_csv(user_id), "text/csv; charset=utf-8"
+    headers = {"Content-Disposition": f'attachment; filename="estante.{format}"'}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
 
 @app.post("/shelf/update/{user_book_id}")
-def update_shelf(
+async def update_shelf(
     request: Request,
     user_book_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     status: str = Form(...),
     rating: int = Form(0)
 ):
@@ -323,18 +792,18 @@ def update_shelf(
     if not user_id:
         return RedirectResponse("/login", status_code=303)
     
-    crud.update_shelf_item(db, user_book_id, status, rating)
+    await crud.update_shelf_item_async(db, user_book_id, status, rating)
     return RedirectResponse("/shelf", status_code=303)
 
 @app.post("/shelf/delete/{user_book_id}")
-def delete_from_shelf(
+async def delete_from_shelf(
     request: Request,
     user_book_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     user_id = request.session.get("user_id")
     if not user_id:
         return RedirectResponse("/login", status_code=303)
         
-    crud.remove_book_from_shelf(db, user_book_id)
+    await crud.remove_book_from_shelf_async(db, user_book_id)
     return RedirectResponse("/shelf", status_code=303)
\ No newline at end of file
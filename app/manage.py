@@ -0,0 +1,55 @@
+# app/manage.py
+
+"""
+Comandos de manutenção do banco (na raiz do projeto):
+
+    python -m app.manage migrate         # cria as tabelas e aplica as migrações pendentes
+    python -m app.manage rebuild-stats   # recalcula book_stats e book_coshelf do zero
+
+Com vários workers, rode `migrate` antes de subi-los e inicie a aplicação com
+MIGRATE_ON_STARTUP=0 (e CACHE_BACKEND=shared).
+"""
+
+import argparse
+import time
+
+from . import crud, database, migrations
+
+
+def migrate():
+    pending = migrations.pending(database.engine)
+    migrations.setup_database(database.engine)
+    print(f"Banco pronto: {pending} migração(ões) aplicada(s), versão {len(migrations.MIGRATIONS)}")
+
+
+def rebuild_stats():
+    db = database.SessionLocal()
+    try:
+        start = time.perf_counter()
+        result = crud.rebuild_book_stats(db)
+        print(
+            f"Estatísticas recalculadas: {result['books']} livros, {result['pairs']} pares "
+            f"em {time.perf_counter() - start:.2f}s"
+        )
+    finally:
+        db.close()
+
+
+COMMANDS = {
+    "migrate": migrate,
+    "rebuild-stats": rebuild_stats,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+
+    if args.command != "migrate":
+        migrations.setup_database(database.engine)
+    COMMANDS[args.command]()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+# app/metrics.py
+
+"""
+Métricas da aplicação no formato texto do Prometheus (exibidas em /metrics).
+
+- Latência por rota (histograma por método, rota e status).
+- Chamadas ao Google Books: latência, status HTTP e classe do erro.
+- Cota do Google Books: fichas disponíveis, uso do dia, chamadas em espera e
+  atendidas/descartadas por prioridade, e o tempo de espera por uma ficha.
+- Banco: duração de cada consulta e, por requisição, quantidade de consultas e
+  tempo total no banco (via eventos do engine do SQLAlchemy).
+- Log de requisições lentas (`SLOW_REQUEST_MS`) com o detalhamento das consultas:
+  a mesma instrução repetida dezenas de vezes indica N+1; poucas consultas com
+  tempo alto (ou novas tentativas por "database is locked") indicam disputa de lock.
+
+Implementação própria e pequena, sem dependência do prometheus_client.
+"""
+
+import bisect
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Requisições mais lentas que isso (em ms) são registradas no log; 0 desliga
+SLOW_REQUEST_MS = int(os.getenv("SLOW_REQUEST_MS", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_QUERY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1, 5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [contagem por bucket..., soma, total]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(labels)
+            if data is None:
+                data = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, data in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, data):
+                    cumulative += count
+                    le = _labels(self.labelnames, labels, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                le = _labels(self.labelnames, labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {data[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {data[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {data[-1]}")
+        return lines
+
+
+# ---------- Métricas registradas ----------
+
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latência das requisições por rota.", ("method", "route", "status")
+)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Duração de cada consulta ao banco.", ("operation",), DB_QUERY_BUCKETS
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "Consultas ao banco por requisição.", ("route",), QUERY_COUNT_BUCKETS
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Tempo total no banco por requisição.", ("route",)
+)
+DB_LOCKED_RETRIES = Counter(
+    "db_locked_retries_total", "Novas tentativas de escrita após \"database is locked\".", ("operation",)
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Latência das chamadas a serviços externos (Google Books).",
+    ("service", "operation", "status", "error"),
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total", "Novas tentativas de chamadas externas.", ("service", "operation")
+)
+UPSTREAM_HEDGES = Counter(
+    "upstream_hedged_requests_total", "Chamadas externas duplicadas por hedging.", ("service", "operation")
+)
+UPSTREAM_SHORT_CIRCUITS = Counter(
+    "upstream_short_circuits_total", "Chamadas recusadas pelo disjuntor aberto.", ("service", "operation")
+)
+UPSTREAM_QUOTA_WAIT = Histogram(
+    "upstream_quota_wait_seconds", "Espera por cota antes das chamadas externas.", ("service", "priority"),
+    DB_QUERY_BUCKETS,
+)
+SEARCH_PREFETCHES = Counter(
+    "search_prefetches_total", "Janelas de busca do Google pré-carregadas em segundo plano."
+)
+
+_metrics: list = [HTTP_LATENCY, DB_QUERY_DURATION, DB_QUERIES_PER_REQUEST, DB_TIME_PER_REQUEST,
+                  DB_LOCKED_RETRIES, UPSTREAM_LATENCY, UPSTREAM_RETRIES, UPSTREAM_HEDGES,
+                  UPSTREAM_SHORT_CIRCUITS, UPSTREAM_QUOTA_WAIT, SEARCH_PREFETCHES]
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(collect: Callable[[], List[str]]):
+    """Registra uma função que gera linhas de métricas no momento da leitura de /metrics."""
+    _collectors.append(collect)
+
+def register_cache(name: str, cache):
+    """Exibe os contadores de um `TTLCache` (stats()) como métricas `cache_*{cache=name}`."""
+    register_collector(
+        lambda: [f'cache_{key}{{cache="{_escape(name)}"}} {value}' for key, value in cache.stats().items()]
+    )
+
+def register_breaker(breaker):
+    """Estado do disjuntor (0 fechado, 1 meio-aberto, 2 aberto) e quantas vezes abriu."""
+    states = {"closed": 0, "half_open": 1, "open": 2}
+    register_collector(lambda: [
+        f'circuit_breaker_state{{name="{_escape(breaker.name)}"}} {states[breaker.state]}',
+        f'circuit_breaker_opened_total{{name="{_escape(breaker.name)}"}} {breaker.opened}',
+    ])
+
+def register_quota(quota):
+    """Uso da cota (`QuotaScheduler.stats()`) no momento da leitura: fichas, uso do dia, fila e resultados."""
+    def collect():
+        name = _escape(quota.name)
+        stats = quota.stats()
+        lines = [
+            f'upstream_quota_tokens{{name="{name}"}} {stats["tokens"]}',
+            f'upstream_quota_rate{{name="{name}"}} {quota.rate}',
+            f'upstream_quota_burst{{name="{name}"}} {quota.burst}',
+            f'upstream_quota_used_today{{name="{name}"}} {stats["used_today"]}',
+            f'upstream_quota_daily_limit{{name="{name}"}} {quota.daily_limit}',
+        ]
+        for priority, waiting in stats["waiting"].items():
+            lines.append(f'upstream_quota_waiting{{name="{name}",priority="{priority}"}} {waiting}')
+        for (priority, outcome), count in sorted(stats["outcomes"].items()):
+            lines.append(
+                f'upstream_quota_requests_total{{name="{name}",priority="{priority}",outcome="{outcome}"}} {count}'
+            )
+        return lines
+    register_collector(collect)
+
+def render() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+# ---------- Estatísticas da requisição em andamento ----------
+
+class RequestStats:
+    """Consultas e chamadas externas feitas durante uma requisição."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.upstream_calls = 0
+        self.upstream_time = 0.0
+        self.locked_retries = 0
+        # instrução (resumida) -> [quantidade, tempo total]
+        self.statements: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add_query(self, statement: str, elapsed: float):
+        key = _summarize(statement)
+        with self._lock:
+            self.queries += 1
+            self.db_time += elapsed
+            entry = self.statements.setdefault(key, [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def breakdown(self, limit: int = 5) -> str:
+        top = sorted(self.statements.items(), key=lambda kv: kv[1][1], reverse=True)[:limit]
+        return "; ".join(f"{count}x {total * 1000:.1f}ms {sql}" for sql, (count, total) in top)
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+def _summarize(statement: str) -> str:
+    return re.sub(r"\s+", " ", statement).strip()[:120]
+
+
+# ---------- Banco (eventos do engine) ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    operation = (statement.split(None, 1) or ["?"])[0].upper()
+    DB_QUERY_DURATION.observe(elapsed, operation)
+    stats = _current.get()
+    if stats is not None:
+        stats.add_query(statement, elapsed)
+
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(engine):
+    """Registra os eventos que medem cada consulta do engine."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+def record_locked_retry(operation: str):
+    DB_LOCKED_RETRIES.inc(operation)
+    stats = _current.get()
+    if stats is not None:
+        stats.locked_retries += 1
+
+
+# ---------- Serviços externos ----------
+
+def observe_upstream(service: str, operation: str, elapsed: float, status: str, error: str = ""):
+    UPSTREAM_LATENCY.observe(elapsed, service, operation, status, error)
+    stats = _current.get()
+    if stats is not None:
+        stats.upstream_calls += 1
+        stats.upstream_time += elapsed
+
+
+# ---------- Middleware ----------
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    # Montagens (ex.: /static) não definem "route"; usa o prefixo montado
+    return scope.get("root_path") or "<unmatched>"
+
+
+class MetricsMiddleware:
+    """Mede cada requisição HTTP e, se configurado, registra as lentas com o detalhamento do banco."""
+
+    def __init__(self, app, slow_request_ms: int = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            route = _route_label(scope)
+            HTTP_LATENCY.observe(elapsed, scope["method"], route, str(status))
+            DB_QUERIES_PER_REQUEST.observe(stats.queries, route)
+            DB_TIME_PER_REQUEST.observe(stats.db_time, route)
+            if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+                logger.warning(
+                    "Requisição lenta: %s %s -> %s em %.0f ms | banco: %d consultas, %.0f ms, %d novas tentativas por lock"
+                    " | externo: %d chamadas, %.0f ms | %s",
+                    scope["method"], scope["path"], status, elapsed * 1000,
+                    stats.queries, stats.db_time * 1000, stats.locked_retries,
+                    stats.upstream_calls, stats.upstream_time * 1000, stats.breakdown(),
+                )
@@ -0,0 +1,198 @@
+# app/migrations.py
+
+"""
+Migrações do banco SQLite que o `create_all` não cobre (tabelas virtuais,
+triggers, índices e colunas novas em tabelas já existentes).
+
+Cada migração roda uma única vez; a versão aplicada fica em `PRAGMA user_version`.
+`setup_database` (criação das tabelas + migrações) é o passo único de preparação do
+banco: roda na inicialização da aplicação ou, com vários workers, antes de subi-los
+(`python -m app.manage migrate`).
+"""
+
+from contextlib import contextmanager
+
+from sqlalchemy.engine import Engine
+
+try:  # fcntl só existe em sistemas POSIX: sem ele, não há trava entre processos
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from .crud import REBUILD_BOOK_STATS_SQL
+from .models import Base, BookCoShelf, BookStats
+from .normalize import canonical_isbn, normalize_authors, normalize_text
+
+
+def _create_books_fts(conn):
+    """Índice de busca textual (FTS5) sobre título, autores, editora e sinopse."""
+    conn.exec_driver_sql("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, authors, publisher, description,
+            content='books', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    # Triggers mantêm o índice sincronizado com a tabela `books`
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, authors, publisher, description)
+            VALUES (new.id, new.title, new.authors, new.publisher, new.description);
+        END
+    """)
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, authors, publisher, description)
+            VALUES ('delete', old.id, old.title, old.authors, old.publisher, old.description);
+        END
+    """)
+    conn.exec_driver_sql("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, authors, publisher, description)
+            VALUES ('delete', old.id, old.title, old.authors, old.publisher, old.description);
+            INSERT INTO books_fts(rowid, title, authors, publisher, description)
+            VALUES (new.id, new.title, new.authors, new.publisher, new.description);
+        END
+    """)
+    # Indexa os livros que já existiam antes da migração
+    conn.exec_driver_sql("INSERT INTO books_fts(books_fts) VALUES ('rebuild')")
+
+
+def _create_shelf_indexes(conn):
+    """Índices compostos da estante (bancos criados antes deles existirem no modelo)."""
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_user_books_user_status ON user_books (user_id, status)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_user_books_user_book ON user_books (user_id, book_id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_title_nocase ON books (title COLLATE NOCASE, id)")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_books_authors_nocase ON books (authors COLLATE NOCASE, id)")
+
+
+def _normalize_book_identity(conn):
+    """
+    ISBN canônico (ISBN-13) e título/autores normalizados para os livros existentes.
+    Livros que passam a ter a mesma identidade são fundidos no mais antigo, e os itens
+    de estante são transferidos para ele. Por fim, cria o índice único da identidade.
+    """
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(books)")}
+    for column in ("title_norm", "authors_norm"):
+        if column not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE books ADD COLUMN {column} VARCHAR NOT NULL DEFAULT ''")
+
+    survivors, merges = {}, []
+    by_isbn, by_key = {}, {}
+    rows = conn.exec_driver_sql("SELECT id, title, authors, isbn FROM books ORDER BY id").fetchall()
+    for book_id, title, authors, isbn in rows:
+        isbn = canonical_isbn(isbn)
+        key = (normalize_text(title), normalize_authors(authors))
+        survivor = by_isbn.get(isbn) if isbn else None
+        survivor = survivor or by_key.get(key)
+        if survivor is not None:
+            merges.append((book_id, survivor))
+            if isbn and survivors[survivor]["isbn"] is None:
+                survivors[survivor]["isbn"] = isbn
+                by_isbn[isbn] = survivor
+            continue
+        survivors[book_id] = {"isbn": isbn, "key": key}
+        if isbn:
+            by_isbn[isbn] = book_id
+        by_key[key] = book_id
+
+    # Primeiro remove as duplicatas (liberando os ISBNs), depois atualiza os sobreviventes
+    for duplicate, survivor in merges:
+        conn.exec_driver_sql("UPDATE user_books SET book_id = ? WHERE book_id = ?", (survivor, duplicate))
+        conn.exec_driver_sql("DELETE FROM books WHERE id = ?", (duplicate,))
+    conn.exec_driver_sql("UPDATE books SET isbn = NULL")
+    for book_id, identity in survivors.items():
+        conn.exec_driver_sql(
+            "UPDATE books SET isbn = ?, title_norm = ?, authors_norm = ? WHERE id = ?",
+            (identity["isbn"], identity["key"][0], identity["key"][1], book_id),
+        )
+    # Um mesmo livro pode ter ficado duas vezes na estante de alguém após a fusão
+    conn.exec_driver_sql("""
+        DELETE FROM user_books WHERE id NOT IN (
+            SELECT min(id) FROM user_books GROUP BY user_id, book_id
+        )
+    """)
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_books_title_authors_norm ON books (title_norm, authors_norm)"
+    )
+
+
+def _add_shelf_version(conn):
+    """Colunas de versão da estante na tabela `users` (ETag/Last-Modified das páginas)."""
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(users)")}
+    for column in ("shelf_version", "shelf_updated_at"):
+        if column not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE users ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+
+
+def _create_book_stats(conn):
+    """Tabelas de estatísticas por livro e de pares de livros, preenchidas a partir das estantes."""
+    # Mesma definição dos modelos (bancos que já existiam antes deles)
+    BookStats.__table__.create(conn, checkfirst=True)
+    BookCoShelf.__table__.create(conn, checkfirst=True)
+    for statement in REBUILD_BOOK_STATS_SQL:
+        conn.exec_driver_sql(statement)
+
+
+def _book_identity_by_isbn(conn):
+    """
+    Título+autores normalizados deixam de ser únicos para livros com ISBN (edições
+    diferentes do mesmo título); continuam únicos entre os livros sem ISBN.
+    """
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ux_books_title_authors_norm")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_books_title_authors_norm ON books (title_norm, authors_norm)"
+    )
+    conn.exec_driver_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_books_title_authors_noisbn "
+        "ON books (title_norm, authors_norm) WHERE isbn IS NULL"
+    )
+
+
+# A posição na lista define a versão: a migração N leva o banco para user_version = N
+MIGRATIONS = [
+    _create_books_fts,
+    _create_shelf_indexes,
+    _normalize_book_identity,
+    _add_shelf_version,
+    _create_book_stats,
+    _book_identity_by_isbn,
+]
+
+
+def run_migrations(engine: Engine):
+    """Aplica, em ordem, as migrações ainda não aplicadas."""
+    with engine.begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+
+
+def pending(engine: Engine) -> int:
+    """Quantas migrações ainda não foram aplicadas ao banco."""
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+    return max(0, len(MIGRATIONS) - version)
+
+
+@contextmanager
+def _setup_lock(engine: Engine):
+    """Trava de arquivo ao lado do banco: vários processos subindo juntos preparam o banco um de cada vez."""
+    database = engine.url.database
+    if fcntl is None or not database or database == ":memory:":
+        yield
+        return
+    with open(f"{database}.setup.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def setup_database(engine: Engine):
+    """Cria as tabelas que faltam e aplica as migrações pendentes (idempotente)."""
+    with _setup_lock(engine):
+        Base.metadata.create_all(bind=engine)
+        run_migrations(engine)
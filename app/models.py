@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, ForeignKey, Enum, Index, collate
+from sqlalchemy.orm import relationship, validates
 from .database import Base
+from .normalize import canonical_isbn, normalize_authors, normalize_text
 import enum
 
 
@@ -18,10 +19,39 @@ class Book(Base):
     publisher = Column(String, default="—")
     pageCount = Column(Integer, nullable=True)
     publishedDate = Column(String, default="—")
+    # Identidade normalizada (preenchida automaticamente a partir de title/authors)
+    title_norm = Column(String, nullable=False, default="")
+    authors_norm = Column(String, nullable=False, default="")
 
     # Relação com UserBook
     users = relationship("UserBook", back_populates="book")
 
+    # Índices para ordenar a estante por título/autor (sem diferenciar maiúsculas) e
+    # para procurar por título+autores normalizados. A identidade é o ISBN canônico:
+    # edições diferentes (ISBNs diferentes) do mesmo título e autores são livros
+    # distintos; só os livros sem ISBN são únicos por título+autores
+    __table_args__ = (
+        Index("ix_books_title_nocase", collate(title, "NOCASE"), id),
+        Index("ix_books_authors_nocase", collate(authors, "NOCASE"), id),
+        Index("ix_books_title_authors_norm", title_norm, authors_norm),
+        Index("ux_books_title_authors_noisbn", title_norm, authors_norm, unique=True, sqlite_where=isbn.is_(None)),
+    )
+
+    @validates("isbn")
+    def _validate_isbn(self, key, value):
+        # ISBN-10 e ISBN-13 do mesmo livro viram a mesma chave (ISBN-13)
+        return canonical_isbn(value)
+
+    @validates("title")
+    def _validate_title(self, key, value):
+        self.title_norm = normalize_text(value)
+        return value
+
+    @validates("authors")
+    def _validate_authors(self, key, value):
+        self.authors_norm = normalize_authors(value)
+        return value
+
 
 class User(Base):
     __tablename__ = "users"
@@ -30,6 +60,10 @@ class User(Base):
     full_name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
+    # Versão da estante (incrementada a cada alteração) e instante da última alteração
+    # (epoch em segundos); usados nos ETag/Last-Modified das páginas da estante
+    shelf_version = Column(Integer, nullable=False, default=0)
+    shelf_updated_at = Column(Integer, nullable=False, default=0)
 
     # Relação com UserBook
     books = relationship("UserBook", back_populates="user")
@@ -53,4 +87,44 @@ class UserBook(Base):
 
     # Relações
     user = relationship("User", back_populates="books")
-    book = relationship("Book", back_populates="users")
\ No newline at end of file
+    book = relationship("Book", back_populates="users")
+
+    # Índices da estante: filtro por status e busca do livro na estante do usuário
+    __table_args__ = (
+        Index("ix_user_books_user_status", user_id, status),
+        Index("ix_user_books_user_book", user_id, book_id),
+    )
+
+class BookStats(Base):
+    """
+    Estatísticas de leitura de cada livro, mantidas de forma incremental na mesma
+    transação que altera a estante (`crud`); `crud.rebuild_book_stats` recalcula tudo.
+    """
+    __tablename__ = "book_stats"
+
+    book_id = Column(Integer, ForeignKey("books.id"), primary_key=True)
+    readers = Column(Integer, nullable=False, default=0)
+    rating_count = Column(Integer, nullable=False, default=0)
+    rating_sum = Column(Integer, nullable=False, default=0)
+    # Quantos leitores têm o livro em cada status (colunas com o nome de BookStatus)
+    lido = Column(Integer, nullable=False, default=0)
+    lendo = Column(Integer, nullable=False, default=0)
+    quero_ler = Column(Integer, nullable=False, default=0)
+
+    @property
+    def average_rating(self):
+        return round(self.rating_sum / self.rating_count, 2) if self.rating_count else None
+
+
+class BookCoShelf(Base):
+    """Quantos leitores têm os dois livros na estante ("quem tem este livro também tem...")."""
+    __tablename__ = "book_coshelf"
+
+    book_id = Column(Integer, ForeignKey("books.id"), primary_key=True)
+    other_book_id = Column(Integer, ForeignKey("books.id"), primary_key=True)
+    shelved_together = Column(Integer, nullable=False, default=0)
+
+    # Os mais frequentes de um livro saem do índice, sem ordenar todos os pares
+    __table_args__ = (
+        Index("ix_book_coshelf_top", book_id, shelved_together),
+    )
@@ -0,0 +1,60 @@
+# app/normalize.py
+
+"""
+Normalização da identidade dos livros: ISBN canônico (ISBN-13) e
+título/autores normalizados (sem acentos, caixa e pontuação).
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+ISBN_RE = re.compile(r"^(\d{9}[\dX]|\d{13})$")
+
+
+def clean_isbn(value: str) -> str:
+    """Remove hífens, espaços e outros separadores de um ISBN."""
+    return re.sub(r"[^0-9X]", "", (value or "").upper())
+
+def is_isbn(value: str) -> bool:
+    return bool(ISBN_RE.match(clean_isbn(value)))
+
+def _isbn13_check_digit(first12: str) -> str:
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+def _isbn10_valid(isbn: str) -> bool:
+    total = sum((10 - i) * (10 if c == "X" else int(c)) for i, c in enumerate(isbn))
+    return "X" not in isbn[:9] and total % 11 == 0
+
+def to_isbn13(value: str) -> Optional[str]:
+    """
+    Converte um ISBN-10 ou ISBN-13 para o ISBN-13 canônico.
+    Retorna None se o valor não for um ISBN válido.
+    """
+    isbn = clean_isbn(value)
+    if len(isbn) == 13 and isbn.isdigit():
+        return isbn if _isbn13_check_digit(isbn[:12]) == isbn[12] else None
+    if len(isbn) == 10 and _isbn10_valid(isbn):
+        first12 = "978" + isbn[:9]
+        return first12 + _isbn13_check_digit(first12)
+    return None
+
+def canonical_isbn(value: str) -> Optional[str]:
+    """
+    Chave de ISBN gravada no banco: o ISBN-13 quando o valor é válido; caso contrário
+    o valor limpo (para não perder identificadores fora do padrão), ou None se vazio.
+    """
+    if not value:
+        return None
+    return to_isbn13(value) or clean_isbn(value) or None
+
+def normalize_text(value: str) -> str:
+    """Texto para comparação: sem acentos, minúsculo e só letras/números separados por espaço."""
+    text = unicodedata.normalize("NFKD", value or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+def normalize_authors(value: str) -> str:
+    """Autores normalizados, mantendo a ordem e separados por vírgula."""
+    return ", ".join(a for a in (normalize_text(part) for part in (value or "").split(",")) if a)
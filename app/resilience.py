@@ -0,0 +1,443 @@
+# app/resilience.py
+
+"""
+Proteções para chamadas a serviços externos (Google Books).
+
+- Orçamento por requisição: cada requisição HTTP tem um prazo total
+  (`REQUEST_BUDGET_SECONDS`); o timeout de cada chamada externa é o menor entre
+  o configurado e o que ainda resta do orçamento.
+- Disjuntor (circuit breaker): após N falhas seguidas, as chamadas falham na hora
+  por um tempo, em vez de prender threads esperando um serviço degradado.
+- Orçamento de novas tentativas: novas tentativas (e requisições duplicadas por
+  hedging) ficam limitadas a uma fração do tráfego, para não multiplicar a carga
+  justamente quando o serviço está sobrecarregado.
+- Cota (token bucket) com prioridades: todas as chamadas dividem a mesma chave de
+  API; perto do limite, o trabalho de fundo é descartado antes das buscas dos
+  usuários, e cada usuário (ou IP) tem a sua parte.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Optional, Tuple
+
+# Prazo total de uma requisição HTTP para chamadas externas (em segundos)
+REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", "5"))
+
+
+class UpstreamError(Exception):
+    """Falha em uma chamada externa que já foi tratada (registrada e contabilizada)."""
+
+
+class CircuitOpenError(UpstreamError):
+    """O disjuntor está aberto: a chamada nem foi feita."""
+
+
+class DeadlineExceeded(UpstreamError):
+    """Não resta orçamento de tempo na requisição para fazer a chamada."""
+
+
+class QuotaExceeded(UpstreamError):
+    """
+    Sem cota para a chamada. `reason`: "shed" (descartada pela prioridade), "client_limit"
+    (o cliente passou da sua parte) ou "daily_limit"; `client` é o cliente da chamada.
+    """
+
+    def __init__(self, message: str, reason: str = "shed", client: Optional[str] = None):
+        super().__init__(message)
+        self.reason = reason
+        self.client = client
+
+
+# ---------- Orçamento de tempo da requisição ----------
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+@contextmanager
+def request_budget(seconds: float):
+    """Define o prazo das chamadas externas feitas dentro do bloco (não amplia um prazo menor já definido)."""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_budget() -> Optional[float]:
+    """Segundos que restam do orçamento da requisição atual, ou None se não houver orçamento."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def call_timeout(configured: float) -> float:
+    """Timeout de uma chamada: o configurado, limitado pelo que resta do orçamento."""
+    remaining = remaining_budget()
+    if remaining is None:
+        return configured
+    if remaining <= 0.05:
+        raise DeadlineExceeded("orçamento de tempo da requisição esgotado")
+    return min(configured, remaining)
+
+
+class RequestBudgetMiddleware:
+    """Abre um orçamento de tempo (`REQUEST_BUDGET_SECONDS`) para cada requisição HTTP."""
+
+    def __init__(self, app, seconds: float = REQUEST_BUDGET_SECONDS):
+        self.app = app
+        self.seconds = seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.seconds <= 0:
+            await self.app(scope, receive, send)
+            return
+        with request_budget(self.seconds):
+            await self.app(scope, receive, send)
+
+
+# ---------- Disjuntor ----------
+
+class CircuitBreaker:
+    """
+    Disjuntor por falhas consecutivas.
+
+    - "closed": chamadas passam; `failure_threshold` falhas seguidas abrem o circuito.
+    - "open": `allow()` recusa tudo por `reset_timeout` segundos.
+    - "half_open": passado esse tempo, uma única chamada de teste é liberada;
+      sucesso fecha o circuito, falha o abre de novo.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_running = False
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+# ---------- Orçamento de novas tentativas ----------
+
+class RetryBudget:
+    """
+    Limita novas tentativas a `ratio` das requisições da janela recente, mais um
+    mínimo de `min_per_second` (para o tráfego baixo ainda poder tentar de novo).
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 1.0, window: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        """Reserva uma nova tentativa se houver saldo; retorna False se o orçamento acabou."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = self.min_per_second * self.window + self.ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+# ---------- Cota de chamadas com prioridades ----------
+
+# Da mais para a menos importante
+PRIORITIES = ("interactive", "covers", "background")
+
+# Fora de uma requisição (atualização dos destaques, pré-carga) tudo é trabalho de fundo
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar("upstream_priority", default="background")
+_client: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("upstream_client", default=None)
+
+@contextmanager
+def upstream_priority(priority: str, client: Optional[str] = None):
+    """Define a prioridade (e, se informado, o cliente) das chamadas externas feitas dentro do bloco."""
+    if priority not in PRIORITIES:
+        raise ValueError(f"prioridade desconhecida: {priority}")
+    priority_token = _priority.set(priority)
+    client_token = _client.set(client) if client is not None else None
+    try:
+        yield
+    finally:
+        if client_token is not None:
+            _client.reset(client_token)
+        _priority.reset(priority_token)
+
+def current_priority() -> str:
+    return _priority.get()
+
+def current_client() -> Optional[str]:
+    return _client.get()
+
+
+class _Bucket:
+    """Balde de fichas: `rate` por segundo, acumulando até `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class QuotaScheduler:
+    """
+    Token bucket na frente de um serviço externo: `rate` chamadas por segundo, com
+    rajadas de até `burst`, e (opcionalmente) `daily_limit` chamadas por dia.
+
+    - Prioridades: cada classe só gasta uma ficha se o balde continuar acima da sua
+      reserva (`reserves`, fração do balde e da cota diária). Perto do limite, o
+      trabalho de fundo para primeiro, depois as capas; as buscas ficam com o resto.
+    - Espera: cada classe espera por uma ficha até `max_wait[prioridade]` segundos
+      (limitado pelo orçamento da requisição); enquanto houver uma classe mais
+      importante esperando, as menos importantes não são atendidas. Sem ficha no
+      prazo, a chamada é descartada com `QuotaExceeded`.
+    - Justiça: cada cliente (usuário ou IP) tem um balde próprio de `client_rate`/
+      `client_burst`; quem passa da sua parte é recusado sem tirar a cota dos outros.
+      `client_limits` dá a uma prioridade um balde por cliente separado, (rate, burst):
+      as capas de uma página não gastam a parte do cliente reservada às buscas.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: float,
+        daily_limit: int = 0,
+        client_rate: float = 0,
+        client_burst: float = 0,
+        reserves: Optional[Dict[str, float]] = None,
+        max_wait: Optional[Dict[str, float]] = None,
+        max_clients: int = 10000,
+        client_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+    ):
+        self.name = name
+        self.daily_limit = daily_limit
+        self.client_rate = client_rate
+        self.client_burst = client_burst or client_rate
+        self.reserves = reserves or {"interactive": 0.0, "covers": 0.1, "background": 0.3}
+        self.max_wait = max_wait or {"interactive": 1.0, "covers": 0.5, "background": 0.0}
+        self.max_clients = max_clients
+        self.client_limits = client_limits or {}
+        self._bucket = _Bucket(rate, burst)
+        # (classe do balde, cliente) -> balde; a classe é a prioridade quando ela tem limite próprio
+        self._clients: "OrderedDict[tuple, _Bucket]" = OrderedDict()
+        self._waiting = {priority: 0 for priority in PRIORITIES}
+        self._day = date.today()
+        self.used_today = 0
+        # (prioridade, resultado) -> quantidade: "granted", "shed", "client_limit", "daily_limit"
+        self.outcomes: Dict[tuple, int] = {}
+        self._cond = threading.Condition()
+
+    @property
+    def rate(self) -> float:
+        return self._bucket.rate
+
+    @property
+    def burst(self) -> float:
+        return self._bucket.burst
+
+    def _count(self, priority: str, outcome: str):
+        key = (priority, outcome)
+        self.outcomes[key] = self.outcomes.get(key, 0) + 1
+
+    def _roll_day(self):
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self.used_today = 0
+
+    def _daily_allows(self, priority: str) -> bool:
+        if not self.daily_limit:
+            return True
+        return self.used_today < self.daily_limit * (1 - self.reserves[priority])
+
+    def _client_key(self, priority: str, client: str) -> tuple:
+        return (priority if priority in self.client_limits else None, client)
+
+    def _client_limit(self, priority: str) -> Tuple[float, float]:
+        rate, burst = self.client_limits.get(priority, (self.client_rate, self.client_burst))
+        return rate, burst or rate
+
+    def _take_client_token(self, priority: str, client: str, now: float) -> bool:
+        key = self._client_key(priority, client)
+        bucket = self._clients.get(key)
+        if bucket is None:
+            bucket = self._clients[key] = _Bucket(*self._client_limit(priority))
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(key)
+        bucket.refill(now)
+        if bucket.tokens < 1:
+            return False
+        bucket.tokens -= 1
+        return True
+
+    def _higher_waiting(self, priority: str) -> bool:
+        return any(self._waiting[p] for p in PRIORITIES[:PRIORITIES.index(priority)])
+
+    def acquire(self, priority: Optional[str] = None, client: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Reserva uma chamada para `priority` (por padrão, a do contexto atual) ou levanta
+        `QuotaExceeded`. `timeout` substitui a espera máxima configurada para a classe.
+        """
+        priority = priority or current_priority()
+        client = client if client is not None else current_client()
+        wait = self.max_wait[priority] if timeout is None else timeout
+        remaining = remaining_budget()
+        if remaining is not None:
+            wait = min(wait, max(0.0, remaining - 0.05))
+
+        with self._cond:
+            now = time.monotonic()
+            self._roll_day()
+            if not self._daily_allows(priority):
+                self._count(priority, "daily_limit")
+                raise QuotaExceeded(f"cota diária de {self.name} reservada a prioridades maiores", "daily_limit", client)
+            if (
+                client is not None
+                and self._client_limit(priority)[0] > 0
+                and not self._take_client_token(priority, client, now)
+            ):
+                self._count(priority, "client_limit")
+                raise QuotaExceeded(f"cliente passou da sua parte da cota de {self.name}", "client_limit", client)
+
+            reserve = self.reserves[priority] * self._bucket.burst
+            deadline = now + wait
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    self._bucket.refill(now)
+                    if self._bucket.tokens - 1 >= reserve and not self._higher_waiting(priority):
+                        self._bucket.tokens -= 1
+                        self.used_today += 1
+                        self._count(priority, "granted")
+                        return
+                    if now >= deadline:
+                        key = self._client_key(priority, client) if client is not None else None
+                        if key in self._clients:
+                            self._clients[key].tokens += 1
+                        self._count(priority, "shed")
+                        raise QuotaExceeded(f"sem cota de {self.name} para prioridade {priority}", "shed", client)
+                    # Acorda quando a ficha que falta deve chegar (ou antes, se outra chamada liberar a vez)
+                    missing = reserve + 1 - self._bucket.tokens
+                    next_token = missing / self._bucket.rate if missing > 0 and self._bucket.rate > 0 else 0.01
+                    self._cond.wait(min(deadline - now, max(next_token, 0.001)))
+                    now = time.monotonic()
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def try_acquire(self, priority: Optional[str] = None) -> bool:
+        """Reserva uma chamada sem esperar; retorna False se não houver cota."""
+        try:
+            self.acquire(priority, timeout=0)
+        except QuotaExceeded:
+            return False
+        return True
+
+    def refund(self):
+        """Devolve a ficha de uma chamada reservada que acabou não sendo feita."""
+        with self._cond:
+            self._bucket.tokens = min(self._bucket.burst, self._bucket.tokens + 1)
+            self.used_today = max(0, self.used_today - 1)
+            self._cond.notify_all()
+
+    def has_headroom(self, priority: str) -> bool:
+        """Se há cota agora para uma chamada de `priority` sem esperar (não reserva nada)."""
+        with self._cond:
+            self._roll_day()
+            self._bucket.refill(time.monotonic())
+            return (
+                self._daily_allows(priority)
+                and self._bucket.tokens - 1 >= self.reserves[priority] * self._bucket.burst
+                and not self._higher_waiting(priority)
+            )
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._roll_day()
+            self._bucket.refill(time.monotonic())
+            return {
+                "tokens": round(self._bucket.tokens, 3),
+                "used_today": self.used_today,
+                "waiting": dict(self._waiting),
+                "outcomes": dict(self.outcomes),
+            }
+
+
+class UpstreamPriorityMiddleware:
+    """
+    Marca as chamadas externas de cada requisição HTTP como "interactive" e identifica
+    o cliente (usuário logado ou IP) para a justiça da cota. Deve ficar dentro do
+    SessionMiddleware (adicionado antes dele), para enxergar a sessão.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        user_id = (scope.get("session") or {}).get("user_id")
+        if user_id is not None:
+            client = f"user:{user_id}"
+        else:
+            client = f"ip:{scope['client'][0]}" if scope.get("client") else None
+        with upstream_priority("interactive", client):
+            await self.app(scope, receive, send)
@@ -84,6 +84,47 @@ if (modal) {
     });
   }
 
+  // Estatísticas do livro no modal da estante (leitores, média e "também tem")
+  const modalStats = document.getElementById("modal-stats");
+  let statsRequest = 0;
+
+  async function loadBookStats(bookId) {
+    if (!modalStats) return;
+    modalStats.hidden = true;
+    if (!bookId) return;
+
+    const requestId = ++statsRequest;
+    const response = await fetch(`/books/${bookId}/stats`);
+    if (!response.ok || requestId !== statsRequest) return;
+    const stats = await response.json();
+
+    const counts = Object.entries(stats.status_counts)
+      .filter(([, count]) => count > 0)
+      .map(([status, count]) => `${count} ${status}`);
+    document.getElementById("modal-readers").textContent =
+      counts.length ? `${stats.readers} (${counts.join(", ")})` : stats.readers;
+    document.getElementById("modal-average").textContent = stats.average_rating
+      ? `${stats.average_rating.toFixed(1)} ★ (${stats.rating_count} avaliações)`
+      : "Sem avaliações";
+
+    const alsoShelved = document.getElementById("modal-also-shelved");
+    const list = document.getElementById("modal-also-shelved-list");
+    list.innerHTML = "";
+    stats.also_shelved.forEach(book => {
+      const li = document.createElement("li");
+      li.className = "also-shelved__item";
+      const img = document.createElement("img");
+      img.src = book.thumb;
+      img.alt = `Capa de ${book.title}`;
+      const label = document.createElement("span");
+      label.textContent = `${book.title} — ${book.authors}`;
+      li.append(img, label);
+      list.appendChild(li);
+    });
+    alsoShelved.hidden = stats.also_shelved.length === 0;
+    modalStats.hidden = false;
+  }
+
   function openBookModal(card) {
     // Sempre preenche as informações básicas do livro
     modalCover.src = card.dataset.cover;
@@ -121,6 +162,7 @@ if (modal) {
         deleteForm.style.display = "none";
     }
 
+    loadBookStats(card.dataset.bookId);
     modal.style.display = "flex";
   }
 
@@ -129,13 +171,28 @@ if (modal) {
     if (e.target === modal) modal.style.display = "none";
   });
 
-  document.querySelectorAll(".card").forEach(card => {
-    card.addEventListener("click", () => {
-        openBookModal(card);
-    });
+  // Delegação: vale também para os cards carregados depois pela estante
+  document.addEventListener("click", (e) => {
+    const card = e.target.closest(".card:not(.card--skeleton)");
+    if (card) openBookModal(card);
   });
 }
 
+// Destaques da home: se vieram só como esqueleto, busca o fragmento em /featured
+const featuredGrid = document.querySelector("#featured-grid[data-src]");
+if (featuredGrid) {
+  fetch(featuredGrid.dataset.src)
+    .then(response => response.ok ? response.text() : Promise.reject(response.status))
+    .then(html => {
+      featuredGrid.innerHTML = html;
+      delete featuredGrid.dataset.src;
+    })
+    .catch(() => {
+      featuredGrid.innerHTML =
+        '<p style="color: white; grid-column: 1 / -1; text-align: center;">Não foi possível carregar os destaques.</p>';
+    });
+}
+
 // Abre/fecha o dropdown de "Adicionar"
 document.addEventListener("click", function(e) {
   const isDropdownButton = e.target.matches(".add-button");
@@ -166,57 +223,100 @@ document.addEventListener('DOMContentLoaded', () => {
 
   const controlButtons = shelfControls.querySelectorAll('.control-btn');
   const searchInput = document.getElementById('shelf-search-input');
-  const grid = document.querySelector('.grid');
-  // Pega todos os cards e transforma em um array para poder ordenar
-  const bookCards = Array.from(grid.querySelectorAll('.card'));
-
-  // --- LÓGICA DE FILTRAGEM (Status: Lido, Lendo, etc.) ---
-  function filterBooks(filterValue) {
-    bookCards.forEach(card => {
-      const cardStatus = card.dataset.status;
-      
-      if (filterValue === 'all' || cardStatus === filterValue) {
-        card.style.display = 'block'; // Mostra o card
-      } else {
-        card.style.display = 'none'; // Esconde o card
-      }
-    });
-  }
+  const grid = document.getElementById('shelf-grid');
+  const sentinel = document.getElementById('shelf-sentinel');
 
-  // --- LÓGICA DE ORDENAÇÃO (A-Z, Autor, etc.) ---
-  function sortBooks(sortValue) {
-    const [sortBy, sortDir] = sortValue.split('-'); // Ex: 'title-asc' -> ['title', 'asc']
+  // Filtro, ordenação e busca são feitos no servidor (/shelf/items);
+  // o navegador só guarda o estado atual e o cursor da próxima página.
+  const state = {
+    status: '',
+    sort: 'added',
+    q: '',
+    cursor: grid.dataset.nextCursor || '',
+    loading: false,
+    requestId: 0,
+  };
 
-    bookCards.sort((a, b) => {
-      // Pega o valor do data-attribute (ex: data-title, data-authors)
-      const valA = a.dataset[sortBy] ? a.dataset[sortBy].toLowerCase() : '';
-      const valB = b.dataset[sortBy] ? b.dataset[sortBy].toLowerCase() : '';
+  // --- MONTA UM CARD (mesma estrutura do shelf.html) ---
+  function renderCard(item) {
+    const card = document.createElement('article');
+    card.className = 'card';
+    card.dataset.userBookId = item.id;
+    card.dataset.bookId = item.book_id;
+    card.dataset.cover = item.cover;
+    card.dataset.title = item.title;
+    card.dataset.authors = item.authors;
+    card.dataset.description = item.description;
+    card.dataset.publisher = item.publisher;
+    card.dataset.pages = item.pages;
+    card.dataset.date = item.date;
+    card.dataset.status = item.status;
+    card.dataset.rating = item.rating;
 
-      if (sortDir === 'asc') {
-        return valA.localeCompare(valB); // Compara strings de A-Z
-      } else {
-        return valB.localeCompare(valA); // Compara strings de Z-A
-      }
-    });
+    const thumb = document.createElement('a');
+    thumb.className = 'card__thumb';
+    thumb.href = 'javascript:void(0);';
+    const img = document.createElement('img');
+    img.className = 'card__img';
+    img.src = item.thumb;
+    img.alt = `Capa de ${item.title}`;
+    thumb.appendChild(img);
 
-    // Limpa o grid e adiciona os cards na nova ordem
-    grid.innerHTML = '';
-    bookCards.forEach(card => grid.appendChild(card));
+    const rating = document.createElement('div');
+    rating.className = 'card__rating';
+    for (let i = 1; i <= 5; i++) {
+      const star = document.createElement('span');
+      star.className = i <= item.rating ? 'star-icon filled' : 'star-icon';
+      star.textContent = i <= item.rating ? '★' : '☆';
+      rating.appendChild(star);
+    }
+
+    const body = document.createElement('div');
+    body.className = 'card__body';
+    const title = document.createElement('h3');
+    title.className = 'card__title';
+    title.textContent = item.title;
+    const meta = document.createElement('p');
+    meta.className = 'card__meta';
+    meta.textContent = item.authors;
+    body.append(title, meta);
+
+    card.append(thumb, rating, body);
+    return card;
   }
-  
-  // --- LÓGICA DA BUSCA LOCAL ---
-  function searchOnShelf(searchTerm) {
-    const term = searchTerm.toLowerCase();
-    bookCards.forEach(card => {
-      const title = card.dataset.title.toLowerCase();
-      const authors = card.dataset.authors.toLowerCase();
-      
-      if (title.includes(term) || authors.includes(term)) {
-        card.style.display = 'block';
-      } else {
-        card.style.display = 'none';
-      }
-    });
+
+  function renderEmpty() {
+    const empty = document.createElement('p');
+    empty.style.cssText = 'color: white; grid-column: 1 / -1; text-align: center;';
+    empty.textContent = 'Nenhum livro encontrado na sua estante.';
+    grid.appendChild(empty);
+  }
+
+  // --- CARREGA UMA PÁGINA (reset = recomeça a lista com o filtro atual) ---
+  async function loadPage(reset) {
+    if (!reset && (state.loading || !state.cursor)) return;
+
+    const requestId = ++state.requestId;
+    const params = new URLSearchParams({ sort: state.sort });
+    if (state.status) params.set('status', state.status);
+    if (state.q) params.set('q', state.q);
+    if (!reset) params.set('cursor', state.cursor);
+
+    state.loading = true;
+    try {
+      const response = await fetch(`/shelf/items?${params}`);
+      if (!response.ok) return;
+      const data = await response.json();
+      // Descarta respostas antigas (o usuário já mudou o filtro)
+      if (requestId !== state.requestId) return;
+
+      if (reset) grid.innerHTML = '';
+      data.items.forEach(item => grid.appendChild(renderCard(item)));
+      if (reset && data.items.length === 0) renderEmpty();
+      state.cursor = data.next_cursor || '';
+    } finally {
+      if (requestId === state.requestId) state.loading = false;
+    }
   }
 
   // --- ADICIONA OS EVENTOS NOS BOTÕES ---
@@ -230,15 +330,29 @@ document.addEventListener('DOMContentLoaded', () => {
       const sort = button.dataset.sort;
 
       if (filter) {
-        filterBooks(filter);
+        state.status = filter === 'all' ? '' : filter;
       } else if (sort) {
-        sortBooks(sort);
+        state.sort = sort;
       }
+      loadPage(true);
     });
   });
   
-  // --- ADICIONA O EVENTO NA BARRA DE BUSCA ---
+  // --- BUSCA NA ESTANTE (espera o usuário parar de digitar) ---
+  let searchTimer;
   searchInput.addEventListener('input', (e) => {
-    searchOnShelf(e.target.value);
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+      state.q = e.target.value.trim();
+      loadPage(true);
+    }, 250);
   });
-});
\ No newline at end of file
+
+  // --- ROLAGEM INFINITA: carrega a próxima página ao chegar no fim ---
+  if (sentinel && 'IntersectionObserver' in window) {
+    const observer = new IntersectionObserver(entries => {
+      if (entries.some(entry => entry.isIntersecting)) loadPage(false);
+    }, { rootMargin: '400px' });
+    observer.observe(sentinel);
+  }
+});
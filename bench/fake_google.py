@@ -0,0 +1,144 @@
+# bench/fake_google.py
+
+"""
+Servidor local que imita a API de volumes do Google Books, para benchmarks sem rede.
+
+Responde a `/volumes?q=...&maxResults=...&startIndex=...`, a `/volumes/<id>` e às
+capas em `/img/<n>.png`, com latência e taxa de erro configuráveis. Os resultados
+são determinísticos: a mesma busca devolve sempre os mesmos livros.
+
+Uso isolado (na raiz do projeto):
+    python -m bench.fake_google --port 8765 --latency-ms 120 --error-rate 0.02
+e na aplicação:
+    GOOGLE_BOOKS_BASE_URL=http://127.0.0.1:8765/volumes uvicorn app.main:app
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+TOTAL_ITEMS = 200
+COVER_PNG = (Path(__file__).resolve().parent.parent / "app" / "static" / "images" / "book_icon.png").read_bytes()
+
+
+def _isbn13(seed: str) -> str:
+    digits = "978" + str(int(hashlib.sha1(seed.encode()).hexdigest(), 16))[:9]
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits))
+    return digits + str((10 - total % 10) % 10)
+
+
+def fake_volume(base_url: str, query: str, index: int) -> dict:
+    volume_id = hashlib.sha1(f"{query}|{index}".encode()).hexdigest()[:12]
+    term = query.split(":", 1)[-1].replace('"', "").strip().title()
+    return _volume(base_url, volume_id, f"{term} {index}", index)
+
+
+def _volume(base_url: str, volume_id: str, title: str, index: int) -> dict:
+    return {
+        "id": volume_id,
+        "volumeInfo": {
+            "title": title,
+            "authors": [f"Autor {index % 37}"],
+            "publisher": "Editora Fake",
+            "publishedDate": f"{1950 + index % 70}-01-01",
+            "description": "Sinopse gerada para o benchmark. " * 8,
+            "pageCount": 100 + index % 400,
+            "industryIdentifiers": [{"type": "ISBN_13", "identifier": _isbn13(volume_id)}],
+            "imageLinks": {"thumbnail": f"{base_url}/img/{index % 50}.png"},
+        },
+    }
+
+
+class FakeGoogleBooks(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 8765, latency_ms: float = 100, jitter_ms: float = 30, error_rate: float = 0.0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeGoogleBooks":
+        threading.Thread(target=self.serve_forever, name="fake-google", daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # o cliente desistiu (timeout): normal nos testes de degradação
+
+    def do_GET(self):
+        server: FakeGoogleBooks = self.server
+        url = urlparse(self.path)
+        if url.path.startswith("/img/"):
+            self._send(200, COVER_PNG, "image/png")
+            return
+
+        with server._lock:
+            server.requests += 1
+        delay = max(0.0, random.gauss(server.latency_ms, server.jitter_ms)) / 1000
+        time.sleep(delay)
+        if random.random() < server.error_rate:
+            status = random.choice([429, 500, 503])
+            self._send(status, json.dumps({"error": {"code": status}}).encode())
+            return
+
+        if url.path.startswith("/volumes/"):
+            volume_id = url.path.rsplit("/", 1)[1]
+            self._send(200, json.dumps(_volume(server.base_url, volume_id, f"Volume {volume_id}", 0)).encode())
+            return
+        if url.path != "/volumes":
+            self._send(404, b"{}")
+            return
+
+        params = parse_qs(url.query)
+        query = params.get("q", [""])[0]
+        max_results = min(int(params.get("maxResults", ["10"])[0]), 40)
+        start = int(params.get("startIndex", ["0"])[0])
+        count = max(0, min(max_results, TOTAL_ITEMS - start))
+        items = [fake_volume(server.base_url, query, start + i) for i in range(count)]
+        self._send(200, json.dumps({"totalItems": TOTAL_ITEMS, "items": items}).encode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeGoogleBooks(args.port, args.latency_ms, args.jitter_ms, args.error_rate)
+    print(f"Google Books falso em {server.base_url}/volumes")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+# bench/load_test.py
+
+"""
+Teste de carga de ponta a ponta: sobe a aplicação (uvicorn, em subprocesso) contra
+o Google Books falso (`bench.fake_google`), com um banco temporário populado com
+usuários e estantes sintéticos, e dispara `/`, `/search`, `/login`, `/shelf` e
+`/shelf/add` em cada nível de concorrência.
+
+Mostra vazão e p50/p95/p99 por cenário e, com `--baseline`, compara com uma
+medição guardada: piora acima da tolerância é marcada e o processo sai com código 1.
+
+Uso (na raiz do projeto):
+    python -m bench.load_test --concurrency 1 8 32 --seconds 10 --baseline bench/baseline.json
+    python -m bench.load_test --save-baseline bench/baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+from passlib.context import CryptContext
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, migrations, models
+from app.normalize import normalize_authors, normalize_text
+
+from .fake_google import FakeGoogleBooks
+from .stats import summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+SCENARIOS = ["home", "search", "login", "shelf", "shelf_add"]
+PASSWORD = "senha-do-benchmark"
+WORDS = [
+    "sombra", "vidro", "coroa", "fogo", "tempestade", "cinzas", "noite", "mar", "sol", "lua",
+    "reino", "torre", "rainha", "espada", "jardim", "vento", "pedra", "rio", "floresta", "estrela",
+    "casa", "cidade", "caminho", "segredo", "sonho", "memória", "tempo", "guerra", "paz", "ilha",
+]
+
+
+# ---------- Banco sintético ----------
+
+def seed_database(url: str, users: int, books: int, shelf_size: int, bcrypt_rounds: int):
+    write_engine, _ = database.make_engines(url, "default")
+    migrations.setup_database(write_engine)
+    Session = sessionmaker(bind=write_engine)
+    rng = random.Random(42)
+
+    # Mesmo custo do servidor: assim o login não regrava o hash a cada requisição
+    password_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=bcrypt_rounds).hash(PASSWORD)
+    db = Session()
+    try:
+        db.execute(models.User.__table__.insert(), [
+            {"full_name": f"Leitor {i}", "email": f"leitor{i}@bench.local", "password_hash": password_hash,
+             "shelf_version": 0, "shelf_updated_at": 0}
+            for i in range(users)
+        ])
+        book_rows = []
+        for i in range(books):
+            title = f"{rng.choice(WORDS).title()} de {rng.choice(WORDS)} {i}"
+            authors = f"Autor {i % 97}"
+            book_rows.append({
+                "title": title, "authors": authors, "description": "Sinopse sintética. " * 10,
+                "thumbnail": None, "isbn": f"978{i:010d}", "publisher": "Editora Bench",
+                "pageCount": 100 + i % 500, "publishedDate": "2001-01-01",
+                "title_norm": normalize_text(title), "authors_norm": normalize_authors(authors),
+            })
+        db.execute(models.Book.__table__.insert(), book_rows)
+        statuses = [s.name for s in models.BookStatus]
+        shelf_rows = []
+        for user_id in range(1, users + 1):
+            for book_id in rng.sample(range(1, books + 1), min(shelf_size, books)):
+                shelf_rows.append({"user_id": user_id, "book_id": book_id, "status": rng.choice(statuses), "rating": None})
+        db.execute(models.UserBook.__table__.insert(), shelf_rows)
+        db.commit()
+        # Inserção direta não passa pelo crud: calcula as estatísticas dos livros de uma vez
+        crud.rebuild_book_stats(db)
+    finally:
+        db.close()
+        write_engine.dispose()
+
+
+# ---------- Servidor ----------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_app(env: dict, port: int, workers: int) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env={**os.environ, **env})
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("A aplicação terminou durante a inicialização.")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/login", timeout=1).status_code == 200:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("A aplicação não respondeu em 60 s.")
+
+
+# ---------- Cenários ----------
+
+class Client:
+    """Um usuário virtual: sessão HTTP própria (cookies e keep-alive)."""
+
+    def __init__(self, base_url: str, user: int, books: int, rng: random.Random):
+        self.base_url = base_url
+        self.email = f"leitor{user}@bench.local"
+        self.books = books
+        self.rng = rng
+        self.http = requests.Session()
+
+    def login(self) -> bool:
+        r = self.http.post(f"{self.base_url}/login", data={"email": self.email, "password": PASSWORD},
+                           allow_redirects=False, timeout=30)
+        return r.status_code == 303 and r.headers.get("location") == "/"
+
+    def home(self) -> bool:
+        return self.http.get(f"{self.base_url}/", timeout=30).status_code == 200
+
+    def search(self) -> bool:
+        params = {"keyword": self.rng.choice(WORDS), "search_by": "title", "page": self.rng.randint(1, 3)}
+        return self.http.get(f"{self.base_url}/search", params=params, timeout=30).status_code == 200
+
+    def shelf(self) -> bool:
+        return self.http.get(f"{self.base_url}/shelf", allow_redirects=False, timeout=30).status_code == 200
+
+    def shelf_add(self) -> bool:
+        data = {"handle": f"l:{self.rng.randint(1, self.books)}", "status": self.rng.choice(["lido", "lendo", "quero ler"])}
+        r = self.http.post(f"{self.base_url}/shelf/add", data=data, allow_redirects=False, timeout=30)
+        return r.status_code == 303 and r.headers.get("location") == "/shelf"
+
+
+def run_scenario(base_url: str, scenario: str, concurrency: int, seconds: float, warmup: float,
+                 users: int, books: int) -> dict:
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    timing = {}
+
+    def start_clock():
+        # Roda uma vez, quando todos já fizeram login: só então a medição começa
+        now = time.perf_counter()
+        timing["measure_from"] = now + warmup
+        timing["end"] = now + warmup + seconds
+
+    ready = threading.Barrier(concurrency + 1, action=start_clock)
+
+    def worker(index: int):
+        nonlocal errors
+        client = Client(base_url, index % users, books, random.Random(index))
+        if scenario != "login":
+            # A fila do bcrypt pode recusar (503) quando muitos entram ao mesmo tempo
+            deadline = time.monotonic() + 120
+            while not client.login() and time.monotonic() < deadline:
+                time.sleep(0.2 + 0.3 * client.rng.random())
+        action = getattr(client, scenario)
+        local, local_errors = [], 0
+        ready.wait()
+        while time.perf_counter() < timing["end"]:
+            start = time.perf_counter()
+            try:
+                ok = action()
+            except requests.RequestException:
+                ok = False
+            done = time.perf_counter()
+            if start < timing["measure_from"]:
+                continue
+            if ok:
+                local.append(done - start)
+            else:
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors += local_errors
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    for t in threads:
+        t.join()
+    return summarize(latencies, errors, seconds)
+
+
+# ---------- Comparação com a linha de base ----------
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Lista de pioras acima da tolerância: (cenário, concorrência, métrica, base, atual)."""
+    regressions = []
+    for scenario, levels in results.items():
+        for level, current in levels.items():
+            base = baseline.get("results", {}).get(scenario, {}).get(level)
+            if not base:
+                continue
+            if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                regressions.append((scenario, level, "p95_ms", base["p95_ms"], current["p95_ms"]))
+            if base["ops_per_s"] and current["ops_per_s"] < base["ops_per_s"] * (1 - tolerance):
+                regressions.append((scenario, level, "ops_per_s", base["ops_per_s"], current["ops_per_s"]))
+    return regressions
+
+def _delta(current: float, base: float) -> str:
+    return f"{(current - base) / base * 100:+.0f}%" if base else "—"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--shelf-size", type=int, default=300)
+    parser.add_argument("--latency-ms", type=float, default=100, help="latência do Google falso")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de erros do Google falso")
+    parser.add_argument("--workers", type=int, default=1, help="processos do uvicorn")
+    parser.add_argument("--db-profile", default="production")
+    parser.add_argument("--bcrypt-rounds", type=int, default=int(os.getenv("BCRYPT_ROUNDS", "12")))
+    parser.add_argument("--baseline", type=Path, help="compara com esta medição (JSON)")
+    parser.add_argument("--save-baseline", type=Path, help="grava a medição como nova linha de base")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="piora aceita antes de acusar regressão")
+    args = parser.parse_args()
+
+    config = {k: v for k, v in vars(args).items() if k not in ("baseline", "save_baseline", "tolerance")}
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        print(f"Populando o banco: {args.users} usuários, {args.books} livros, {args.shelf_size} por estante...")
+        seed_database(url, args.users, args.books, args.shelf_size, args.bcrypt_rounds)
+
+        google = FakeGoogleBooks(0, args.latency_ms, args.latency_ms * 0.3, args.error_rate).start()
+        port = free_port()
+        env = {
+            "DATABASE_URL": url,
+            "DB_PROFILE": args.db_profile,
+            "GOOGLE_BOOKS_BASE_URL": f"{google.base_url}/volumes",
+            "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+            "COVER_CACHE_DIR": str(Path(tmp) / "covers"),
+            # As capas do Google falso vêm do próprio servidor local
+            "COVER_ALLOWED_HOSTS": "127.0.0.1",
+            "STATIC_CACHE_DIR": str(Path(tmp) / "static"),
+            "SESSION_SECRET": "benchmark",
+            "JINJA_CACHE_DIR": str(Path(tmp) / "jinja"),
+            # O banco já foi preparado por seed_database; os workers só o abrem
+            "MIGRATE_ON_STARTUP": "0",
+            # Todos os clientes virtuais saem do mesmo IP: a cota do Google (falso) não limita o teste
+            "GOOGLE_BOOKS_QUOTA_RPS": "100000",
+            "GOOGLE_BOOKS_QUOTA_BURST": "100000",
+            "GOOGLE_BOOKS_QUOTA_CLIENT_RPS": "0",
+            "GOOGLE_BOOKS_QUOTA_CLIENT_COVER_RPS": "0",
+        }
+        if args.workers > 1:
+            # Caches compartilhados entre os workers (um arquivo SQLite)
+            env["CACHE_BACKEND"] = "shared"
+            env["SHARED_CACHE_PATH"] = str(Path(tmp) / "shared-cache.db")
+        app = start_app(env, port, args.workers)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            for scenario in args.scenarios:
+                results[scenario] = {}
+                for level in args.concurrency:
+                    r = run_scenario(base_url, scenario, level, args.seconds, args.warmup, args.users, args.books)
+                    results[scenario][str(level)] = r
+                    print(
+                        f"{scenario:<10} c={level:<4} {r['ops']:>7} ops {r['ops_per_s']:>8.1f}/s "
+                        f"p50 {r['p50_ms']:>8.1f} ms  p95 {r['p95_ms']:>8.1f} ms  p99 {r['p99_ms']:>8.1f} ms  "
+                        f"erros {r['errors']}"
+                    )
+        finally:
+            app.terminate()
+            app.wait(timeout=30)
+            google.shutdown()
+
+    measurement = {
+        "config": config,
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "results": results,
+    }
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(measurement, indent=2, sort_keys=True, default=str) + "\n")
+        print(f"Linha de base gravada em {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("config") != json.loads(json.dumps(config, default=str)):
+            print("Aviso: a linha de base foi medida com outra configuração; a comparação é aproximada.")
+        print(f"\nComparação com {args.baseline} (tolerância {args.tolerance:.0%}):")
+        for scenario, levels in results.items():
+            for level, current in levels.items():
+                base = baseline.get("results", {}).get(scenario, {}).get(level)
+                if base:
+                    print(
+                        f"{scenario:<10} c={level:<4} ops/s {_delta(current['ops_per_s'], base['ops_per_s']):>6}  "
+                        f"p50 {_delta(current['p50_ms'], base['p50_ms']):>6}  "
+                        f"p95 {_delta(current['p95_ms'], base['p95_ms']):>6}  "
+                        f"p99 {_delta(current['p99_ms'], base['p99_ms']):>6}"
+                    )
+        regressions = compare(results, baseline, args.tolerance)
+        for scenario, level, metric, base, current in regressions:
+            print(f"REGRESSÃO: {scenario} c={level} {metric}: {base:.1f} -> {current:.1f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
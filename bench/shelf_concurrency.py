@@ -0,0 +1,118 @@
+# bench/shelf_concurrency.py
+
+"""
+Benchmark de concorrência da estante: várias threads chamando
+`crud.add_book_to_shelf` (escrita) e `crud.get_user_shelf` (leitura)
+sobre um banco SQLite temporário, para cada perfil de armazenamento.
+
+Uso (na raiz do projeto):
+    python -m bench.shelf_concurrency --profiles default production --threads 16 --seconds 5
+"""
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, migrations, models
+
+from .stats import summarize
+
+
+def seed(session_factory, users: int, books: int):
+    db = session_factory()
+    try:
+        for i in range(users):
+            db.add(models.User(full_name=f"Leitor {i}", email=f"leitor{i}@bench.local", password_hash="x"))
+        for i in range(books):
+            db.add(models.Book(title=f"Livro {i:05d}", authors=f"Autor {i % 97}", isbn=f"978{i:010d}"))
+        db.commit()
+        user_ids = [u.id for u in db.query(models.User).all()]
+        book_ids = [b.id for b in db.query(models.Book).all()]
+    finally:
+        db.close()
+    return user_ids, book_ids
+
+
+def run_profile(profile: str, threads: int, seconds: float, books: int, write_ratio: float):
+    tmp = tempfile.TemporaryDirectory()
+    url = f"sqlite:///{Path(tmp.name) / 'bench.db'}"
+    write_engine, read_engine = database.make_engines(url, profile)
+    database.Base.metadata.create_all(bind=write_engine)
+    migrations.run_migrations(write_engine)
+
+    WriteSession = sessionmaker(autocommit=False, autoflush=False, bind=write_engine)
+    ReadSession = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+    user_ids, book_ids = seed(WriteSession, threads, books)
+
+    latencies = {"add_book_to_shelf": [], "get_user_shelf": []}
+    errors = {"add_book_to_shelf": 0, "get_user_shelf": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    statuses = list(models.BookStatus)
+
+    def worker(user_id: int):
+        rng = random.Random(user_id)
+        local = {name: [] for name in latencies}
+        local_errors = {name: 0 for name in errors}
+        while time.perf_counter() < deadline:
+            write = rng.random() < write_ratio
+            name = "add_book_to_shelf" if write else "get_user_shelf"
+            db = WriteSession() if write else ReadSession()
+            start = time.perf_counter()
+            try:
+                if write:
+                    crud.add_book_to_shelf(db, user_id=user_id, book_id=rng.choice(book_ids), status=rng.choice(statuses))
+                else:
+                    crud.get_user_shelf(db, user_id)
+                local[name].append(time.perf_counter() - start)
+            except OperationalError:
+                local_errors[name] += 1
+            finally:
+                db.close()
+        with lock:
+            for name in latencies:
+                latencies[name].extend(local[name])
+                errors[name] += local_errors[name]
+
+    pool = [threading.Thread(target=worker, args=(uid,)) for uid in user_ids]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    write_engine.dispose()
+    read_engine.dispose()
+    tmp.cleanup()
+
+    return {name: summarize(values, errors[name], elapsed) for name, values in latencies.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+
+    print(f"{'perfil':<12} {'operação':<20} {'ops':>7} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'erros':>6}")
+    for profile in args.profiles:
+        results = run_profile(profile, args.threads, args.seconds, args.books, args.write_ratio)
+        for name, r in results.items():
+            print(
+                f"{profile:<12} {name:<20} {r['ops']:>7} {r['ops_per_s']:>9.1f} "
+                f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['errors']:>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+# bench/stats.py
+
+"""Funções de estatística compartilhadas pelos benchmarks."""
+
+import statistics
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    """Resumo de uma rodada: vazão e percentis (latências em segundos, resultado em ms)."""
+    return {
+        "ops": len(latencies),
+        "ops_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": (statistics.mean(latencies) * 1000) if latencies else 0.0,
+        "errors": errors,
+    }
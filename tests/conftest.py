@@ -0,0 +1,95 @@
+# tests/conftest.py
+
+"""
+Ambiente dos testes. Os módulos da aplicação leem a configuração na importação,
+então as variáveis são definidas aqui, antes de qualquer `import app`: o Google
+Books é o servidor falso de `bench.fake_google` e banco, caches e capas ficam em
+um diretório temporário.
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench.fake_google import FakeGoogleBooks  # noqa: E402
+
+TMP_DIR = Path(tempfile.mkdtemp(prefix="redlibrary-tests-"))
+fake_google = FakeGoogleBooks(port=0, latency_ms=0, jitter_ms=0).start()
+
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{TMP_DIR / 'test.db'}",
+    "GOOGLE_BOOKS_BASE_URL": f"{fake_google.base_url}/volumes",
+    "BCRYPT_ROUNDS": "4",
+    "COVER_CACHE_DIR": str(TMP_DIR / "covers"),
+    # As capas do Google falso vêm do próprio servidor local
+    "COVER_ALLOWED_HOSTS": "127.0.0.1",
+    "STATIC_CACHE_DIR": str(TMP_DIR / "static"),
+    "JINJA_CACHE_DIR": str(TMP_DIR / "jinja"),
+    "SHARED_CACHE_PATH": str(TMP_DIR / "shared-cache.db"),
+    "SESSION_SECRET": "testes",
+    # Sem pré-carga: as contagens de chamadas ao Google falso ficam determinísticas
+    "SEARCH_PREFETCH": "0",
+    # Todos os testes saem do mesmo IP: a cota só é exercitada onde o teste a configura
+    "GOOGLE_BOOKS_QUOTA_RPS": "100000",
+    "GOOGLE_BOOKS_QUOTA_BURST": "100000",
+    "GOOGLE_BOOKS_QUOTA_CLIENT_RPS": "0",
+    "GOOGLE_BOOKS_QUOTA_CLIENT_COVER_RPS": "0",
+})
+os.chdir(ROOT)  # templates e estáticos são procurados a partir da raiz do projeto
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app.main import app as application
+    return application
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def google():
+    return fake_google
+
+
+@pytest.fixture
+def db(app):
+    from app import database
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def keyword():
+    """Termo de busca inédito: os caches de busca são do processo e valem entre os testes."""
+    return f"termo{uuid.uuid4().hex[:10]}"
+
+
+@pytest.fixture
+def user(client):
+    """Cadastra um usuário novo e deixa o `client` logado com ele. Retorna o id."""
+    from app import crud, database
+    email = f"{uuid.uuid4().hex[:12]}@teste.io"
+    response = client.post(
+        "/register", data={"full_name": "Leitor Teste", "email": email, "password": "senha-123"},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303 and response.headers["location"] == "/login"
+    response = client.post("/login", data={"email": email, "password": "senha-123"}, follow_redirects=False)
+    assert response.status_code == 303 and response.headers["location"] == "/"
+    with database.SessionLocal() as session:
+        return crud.get_user_by_email(session, email).id
@@ -0,0 +1,62 @@
+# tests/test_async.py
+
+import asyncio
+import sqlite3
+import uuid
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app import crud, database
+from app.database import Base
+
+
+def test_async_crud_runs_the_same_logic(db):
+    email = f"{uuid.uuid4().hex[:12]}@teste.io"
+
+    async def run():
+        async with database.AsyncSessionLocal() as session:
+            created = await crud.create_user_async(session, "Leitora", email, "hash")
+        async with database.AsyncReadSessionLocal() as session:
+            found = await crud.get_user_by_email_async(session, email)
+        return created, found
+
+    created, found = asyncio.run(run())
+    assert found.id == created.id and found.full_name == "Leitora"  # utilizável após fechar a sessão
+    assert crud.get_user_by_email(db, email).id == created.id
+    assert crud.update_user_password_hash_async.__name__ == "update_user_password_hash_async"
+
+
+def test_waiting_for_the_database_does_not_block_the_event_loop(tmp_path):
+    path = tmp_path / "app.db"
+    write, _ = database.make_engines(f"sqlite:///{path}", "production")
+    Base.metadata.create_all(write)
+    write.dispose()
+    async_write, _ = database.make_async_engines(f"sqlite:///{path}", "production")
+    Session = async_sessionmaker(async_write, autoflush=False, expire_on_commit=False)
+
+    lock = sqlite3.connect(path, isolation_level=None)
+    lock.execute("BEGIN IMMEDIATE")  # outro processo escrevendo
+
+    async def run():
+        ticks = 0
+
+        async def create():
+            async with Session() as session:
+                return await crud.create_user_async(session, "Leitor", "a@teste.io", "hash")
+
+        task = asyncio.create_task(create())
+        for _ in range(10):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not task.done()  # a escrita espera a trava...
+        lock.execute("ROLLBACK")
+        user = await task
+        await async_write.dispose()
+        return ticks, user
+
+    try:
+        ticks, user = asyncio.run(run())
+    finally:
+        lock.close()
+    assert ticks == 10  # ...sem segurar o event loop
+    assert user.id is not None
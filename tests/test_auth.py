@@ -0,0 +1,52 @@
+# tests/test_auth.py
+
+import threading
+import uuid
+
+from passlib.context import CryptContext
+
+from app import auth, crud, database
+
+
+def old_hash(password: str) -> str:
+    """Hash feito com outro custo do bcrypt (como o de uma configuração anterior)."""
+    return CryptContext(schemes=["bcrypt"], bcrypt__rounds=auth.BCRYPT_ROUNDS + 1).hash(password)
+
+
+def test_verify_and_update_rehashes_only_when_the_cost_changed():
+    current = auth.hash_password("senha-123")
+    assert auth.verify_and_update("senha-123", current) == (True, None)
+    assert auth.verify_and_update("outra", current) == (False, None)
+
+    ok, new_hash = auth.verify_and_update("senha-123", old_hash("senha-123"))
+    assert ok and new_hash.startswith(f"$2b${auth.BCRYPT_ROUNDS:02d}$")
+    assert auth.verify_and_update("senha-123", new_hash) == (True, None)
+
+
+def test_login_rewrites_a_hash_with_an_old_cost(client):
+    email = f"{uuid.uuid4().hex[:12]}@teste.io"
+    with database.SessionLocal() as session:
+        crud.create_user(session, "Leitora", email, old_hash("senha-123"))
+    response = client.post("/login", data={"email": email, "password": "senha-123"}, follow_redirects=False)
+    assert response.headers["location"] == "/"
+    with database.SessionLocal() as session:
+        stored = crud.get_user_by_email(session, email).password_hash
+    assert stored.startswith(f"$2b${auth.BCRYPT_ROUNDS:02d}$")
+
+
+def test_full_queue_is_refused_with_503(client, monkeypatch):
+    monkeypatch.setattr(auth, "_slots", threading.BoundedSemaphore(1))
+    assert auth._slots.acquire(blocking=False)  # um pedido ocupando a única vaga
+    response = client.post(
+        "/register", data={"full_name": "Leitor", "email": f"{uuid.uuid4().hex[:12]}@teste.io", "password": "x"},
+        follow_redirects=False,
+    )
+    assert response.status_code == 503 and response.headers["retry-after"] == "1"
+
+    auth._slots.release()
+    response = client.post(
+        "/register", data={"full_name": "Leitor", "email": f"{uuid.uuid4().hex[:12]}@teste.io", "password": "x"},
+        follow_redirects=False,
+    )
+    assert response.status_code == 303
+    assert auth._slots.acquire(blocking=False)  # a vaga foi devolvida ao terminar
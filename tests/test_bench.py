@@ -0,0 +1,68 @@
+# tests/test_bench.py
+
+import requests
+from sqlalchemy import create_engine, text
+
+from bench import load_test
+from bench.fake_google import TOTAL_ITEMS, FakeGoogleBooks
+from bench.stats import percentile, summarize
+
+
+def test_fake_google_is_deterministic(google):
+    url = f"{google.base_url}/volumes"
+    first = requests.get(url, params={"q": "intitle:duna", "maxResults": 40}).json()
+    again = requests.get(url, params={"q": "intitle:duna", "maxResults": 40}).json()
+    assert first == again and first["totalItems"] == TOTAL_ITEMS and len(first["items"]) == 40
+
+    page = requests.get(url, params={"q": "intitle:duna", "maxResults": 40, "startIndex": 20}).json()
+    assert page["items"][:20] == first["items"][20:]
+    last = requests.get(url, params={"q": "intitle:duna", "maxResults": 40, "startIndex": TOTAL_ITEMS - 5}).json()
+    assert len(last["items"]) == 5
+
+    volume = requests.get(f"{url}/abc123").json()
+    assert volume["id"] == "abc123"
+    assert requests.get(f"{google.base_url}/img/3.png").headers["content-type"] == "image/png"
+    assert requests.get(f"{google.base_url}/outra").status_code == 404
+
+
+def test_fake_google_error_rate():
+    server = FakeGoogleBooks(port=0, latency_ms=0, jitter_ms=0, error_rate=1.0).start()
+    try:
+        statuses = {requests.get(f"{server.base_url}/volumes", params={"q": "x"}).status_code for _ in range(20)}
+        assert statuses <= {429, 500, 503} and server.requests == 20
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_summary_percentiles():
+    latencies = [i / 1000 for i in range(1, 101)]  # 1..100 ms
+    assert percentile([], 95) == 0.0
+    summary = summarize(latencies, errors=2, elapsed=2.0)
+    assert summary["ops"] == 100 and summary["ops_per_s"] == 50 and summary["errors"] == 2
+    assert round(summary["p50_ms"]) == 51 and round(summary["p95_ms"]) == 95 and round(summary["p99_ms"]) == 99
+
+
+def test_compare_flags_only_regressions_over_the_tolerance():
+    baseline = {"results": {"search": {"8": {"p95_ms": 100, "ops_per_s": 200}}}}
+    results = {
+        "search": {"8": {"p95_ms": 119, "ops_per_s": 161}, "32": {"p95_ms": 999, "ops_per_s": 1}},
+        "shelf": {"8": {"p95_ms": 999, "ops_per_s": 1}},
+    }
+    assert load_test.compare(results, baseline, 0.2) == []
+    results["search"]["8"] = {"p95_ms": 130, "ops_per_s": 150}
+    assert load_test.compare(results, baseline, 0.2) == [
+        ("search", "8", "p95_ms", 100, 130),
+        ("search", "8", "ops_per_s", 200, 150),
+    ]
+
+
+def test_seed_database_builds_users_shelves_and_stats(tmp_path):
+    url = f"sqlite:///{tmp_path / 'bench.db'}"
+    load_test.seed_database(url, users=3, books=20, shelf_size=5, bcrypt_rounds=4)
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        count = lambda table: conn.execute(text(f"SELECT count(*) FROM {table}")).scalar()  # noqa: E731
+        assert (count("users"), count("books"), count("user_books")) == (3, 20, 15)
+        assert conn.execute(text("SELECT sum(readers) FROM book_stats")).scalar() == 15
+    engine.dispose()
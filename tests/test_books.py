@@ -0,0 +1,98 @@
+# tests/test_books.py
+
+import threading
+
+from bench.fake_google import _isbn13
+
+from app import crud, database, models
+
+
+def book_data(keyword, **extra):
+    return {"title": f"Duna {keyword}", "authors": ["Frank Herbert"], **extra}
+
+
+def count_books(db, keyword):
+    return db.query(models.Book).filter(models.Book.title == f"Duna {keyword}").count()
+
+
+def test_isbn_is_the_identity_of_a_book(db, keyword):
+    first = crud.upsert_book(db, book_data(keyword, isbn="978-0-441-01359-3"))
+    same = crud.upsert_book(db, book_data(keyword, isbn="0441013597", thumbnail="http://capa"))  # ISBN-10
+    other_edition = crud.upsert_book(db, book_data(keyword, isbn="9788576573135"))
+    db.commit()
+    assert same == first
+    assert other_edition != first
+    assert db.get(models.Book, first).thumbnail == "http://capa"
+
+
+def test_books_without_isbn_are_matched_by_normalized_title_and_authors(db, keyword):
+    first = crud.upsert_book(db, book_data(keyword))
+    same = crud.upsert_book(db, {"title": f"  DUNA {keyword} ", "authors": ["frank  herbert"]})
+    # Um livro com ISBN não é fundido com o registro sem ISBN de mesmo título
+    with_isbn = crud.upsert_book(db, book_data(keyword, isbn=_isbn13(keyword)))
+    db.commit()
+    assert first == same != with_isbn
+    assert count_books(db, keyword) == 2
+
+
+def test_concurrent_shelving_creates_one_book(user, keyword):
+    barrier = threading.Barrier(6)
+    errors = []
+    isbn = _isbn13(keyword)
+
+    def shelve():
+        session = database.SessionLocal()
+        try:
+            barrier.wait()
+            crud.shelve_book(session, user, book_data(keyword, isbn=isbn), models.BookStatus.lendo)
+        except Exception as exc:  # pragma: no cover - falha do teste
+            errors.append(exc)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=shelve) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    with database.SessionLocal() as session:
+        assert errors == []
+        assert count_books(session, keyword) == 1
+        book = session.query(models.Book).filter(models.Book.isbn == isbn).one()
+        assert session.query(models.UserBook).filter_by(user_id=user, book_id=book.id).count() == 1
+
+
+def test_concurrent_imports_share_the_created_books(client, keyword):
+    users = []
+    with database.SessionLocal() as session:
+        for i in range(2):
+            users.append(crud.create_user(session, "Leitor", f"{keyword}-{i}@teste.io", "hash").id)
+
+    entries = lambda: [  # noqa: E731
+        {"title": f"Livro {i} {keyword}", "authors": "Fulano", "isbn": None if i % 2 else f"97800000{i:05d}",
+         "status": models.BookStatus.quero_ler, "rating": None}
+        for i in range(60)
+    ]
+    results, errors = [], []
+
+    def run(user_id):
+        session = database.SessionLocal()
+        try:
+            results.append(crud.bulk_shelve(session, user_id, entries()))
+        except Exception as exc:  # pragma: no cover - falha do teste
+            errors.append(exc)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=run, args=(user_id,)) for user_id in users]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert sum(r["books_created"] for r in results) == 60
+    assert [r["added"] for r in results] == [60, 60]
+    with database.SessionLocal() as session:
+        assert session.query(models.Book).filter(models.Book.title.like(f"Livro % {keyword}")).count() == 60
@@ -0,0 +1,76 @@
+# tests/test_bulk.py
+
+import csv
+import io
+import json
+
+from app import bulk, models
+
+GOODREADS_HEADER = (
+    "Book Id,Title,Author,Additional Authors,ISBN,ISBN13,My Rating,Publisher,Number of Pages,"
+    "Year Published,Original Publication Year,Exclusive Shelf\n"
+)
+
+
+def goodreads_csv(keyword: str) -> bytes:
+    rows = [
+        f'1,Livro A {keyword},Ana Autora,"Bruno Coautor, Carla",="0306406152",="9780306406157",4,Editora,320,2001,1999,read\n',
+        f'2,Livro B {keyword},Davi Autor,,="",="",0,,,,1987,currently-reading\n',
+        f"3,Livro C {keyword},Eva Autora,,,,7,,abc,,,to-read\n",
+        "4,,Sem Título,,,,,,,,,read\n",
+    ]
+    return (GOODREADS_HEADER + "".join(rows)).encode()
+
+
+def test_goodreads_rows_are_mapped_to_shelf_entries(keyword):
+    entries = list(bulk.parse_upload(io.BytesIO(goodreads_csv(keyword))))
+    first, second, third, untitled = entries
+    assert first == {
+        "title": f"Livro A {keyword}",
+        "authors": "Ana Autora, Bruno Coautor, Carla",
+        "isbn": "9780306406157",
+        "publisher": "Editora",
+        "pageCount": 320,
+        "publishedDate": "2001",
+        "status": models.BookStatus.lido,
+        "rating": 4,
+    }
+    assert (second["isbn"], second["rating"], second["publishedDate"], second["status"]) == (
+        None, None, "1987", models.BookStatus.lendo,
+    )
+    assert (third["rating"], third["pageCount"], third["status"]) == (None, None, models.BookStatus.quero_ler)
+    assert untitled is None
+
+
+def test_jsonl_is_detected_and_invalid_lines_are_skipped():
+    raw = io.BytesIO(
+        b'{"title": "Um", "authors": ["A", "B"], "status": "lendo", "rating": 5}\n'
+        b"\n"
+        b"isto nao e json\n"
+        b'{"authors": "sem titulo"}\n'
+    )
+    entries = list(bulk.parse_upload(raw))
+    assert entries[0]["authors"] == "A, B" and entries[0]["status"] == models.BookStatus.lendo
+    assert entries[1:] == [None, None]
+
+
+def read_progress(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_import_route_streams_progress_and_export_round_trips(client, user, keyword):
+    response = client.post("/shelf/import", files={"file": ("goodreads.csv", goodreads_csv(keyword), "text/csv")})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    final = read_progress(response)[-1]
+    assert final["done"] is True
+    assert (final["processed"], final["skipped"], final["added"]) == (4, 1, 3)
+
+    exported = client.get("/shelf/export", params={"format": "csv"}).text
+    rows = list(csv.DictReader(io.StringIO(exported)))
+    assert sorted(row["title"] for row in rows) == [f"Livro {c} {keyword}" for c in "ABC"]
+    assert {row["title"]: row["status"] for row in rows}[f"Livro B {keyword}"] == "lendo"
+
+    # Reimportar a própria exportação só atualiza os itens: nenhum livro novo
+    response = client.post("/shelf/import", files={"file": ("estante.csv", exported.encode(), "text/csv")})
+    final = read_progress(response)[-1]
+    assert (final["books_created"], final["added"], final["updated"]) == (0, 0, 3)
@@ -0,0 +1,117 @@
+# tests/test_cache.py
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.cache import TTLCache
+
+
+def test_single_flight_calls_loader_once():
+    cache = TTLCache(maxsize=10, ttl=60)
+    calls = []
+    started = threading.Event()
+
+    def loader():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return "valor"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert results == ["valor"] * 8
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] + stats["hits"] == 7
+
+
+def test_loader_errors_reach_all_waiters_and_are_not_cached():
+    cache = TTLCache(maxsize=10, ttl=60)
+    release = threading.Event()
+
+    def failing():
+        release.wait(1)
+        raise RuntimeError("fora do ar")
+
+    errors = []
+
+    def call():
+        try:
+            cache.get_or_load("k", failing)
+        except RuntimeError as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(errors) == 4
+    assert cache.get_or_load("k", lambda: "ok") == "ok"
+
+
+def test_entries_expire_and_negative_results_expire_sooner():
+    cache = TTLCache(maxsize=10, ttl=0.3, negative_ttl=0.05, is_negative=lambda value: not value)
+    cache.set("cheio", [1])
+    cache.set("vazio", [])
+    time.sleep(0.1)
+    assert cache.get("cheio") == [1]
+    assert cache.get("vazio") is None
+    time.sleep(0.3)
+    assert cache.get("cheio") is None
+    assert cache.stats()["expirations"] == 2
+
+
+def test_lru_eviction_and_version_stamps():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    version_b = cache.version("b")
+    cache.get("a")  # "a" passa a ser o mais recente
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.version("b") is None
+    cache.set("a", 10)
+    assert cache.version("a") > version_b
+    assert cache.stats()["evictions"] == 1
+
+
+def test_async_single_flight():
+    cache = TTLCache(maxsize=10, ttl=60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "valor"
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load_async("k", loader) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["valor"] * 5
+    assert calls == [1]
+
+
+def test_async_loader_error_is_not_cached():
+    cache = TTLCache(maxsize=10, ttl=60)
+
+    async def failing():
+        raise ValueError("falhou")
+
+    async def ok():
+        return "ok"
+
+    with pytest.raises(ValueError):
+        asyncio.run(cache.get_or_load_async("k", failing))
+    assert asyncio.run(cache.get_or_load_async("k", ok)) == "ok"
@@ -0,0 +1,56 @@
+# tests/test_covers.py
+
+from urllib.parse import parse_qs, urlsplit
+
+from app import models
+from app.covers import PLACEHOLDER_COVER, cover_url, is_allowed_source, source_version
+
+
+def test_only_allowed_hosts_are_proxied():
+    assert is_allowed_source("http://127.0.0.1:9/img/1.png")
+    for url in ("file:///etc/passwd", "http://169.254.169.254/latest", "http://127.0.0.1.evil.com/x", "", None):
+        assert not is_allowed_source(url)
+
+
+def test_cover_urls_never_expose_the_source(google):
+    thumbnail = f"{google.base_url}/img/1.png"
+    assert cover_url({"id": "vol_1", "isbn": "9780306406157", "thumbnail": thumbnail}) == (
+        f"/covers/9780306406157?size=grid&v={source_version(thumbnail)}"
+    )
+    without_isbn = cover_url({"id": "vol_2", "isbn": None, "thumbnail": thumbnail}, "modal")
+    assert without_isbn.startswith("/covers/g:vol_2?size=modal&v=")
+    assert cover_url({"id": "", "isbn": None, "thumbnail": thumbnail}) == PLACEHOLDER_COVER
+    assert cover_url({"id": "vol_3", "thumbnail": "https://example.com/capa.png"}) == PLACEHOLDER_COVER
+    assert cover_url({"id": "vol_4", "thumbnail": ""}) == PLACEHOLDER_COVER
+
+
+def test_versioned_cover_is_immutable_and_unversioned_revalidates(client, google):
+    url = cover_url({"id": "vol_5", "isbn": None, "thumbnail": f"{google.base_url}/img/5.png"})
+    response = client.get(url)
+    assert response.status_code == 200 and response.headers["content-type"].startswith("image/")
+    assert "immutable" in response.headers["cache-control"]
+
+    path = urlsplit(url).path
+    size = parse_qs(urlsplit(url).query)["size"][0]
+    unversioned = client.get(path, params={"size": size})
+    assert "immutable" not in unversioned.headers["cache-control"]
+    assert unversioned.headers["etag"] == response.headers["etag"]
+    revalidated = client.get(path, params={"size": size}, headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_unknown_keys_do_not_reach_the_google(client, google):
+    calls = google.requests
+    for key in ("9780306406157999", "g:nao-registrado", "g:../../etc", "978030640615X"):
+        response = client.get(f"/covers/{key}", follow_redirects=False)
+        assert response.status_code in (302, 404)
+    assert google.requests == calls
+
+
+def test_catalog_covers_use_the_book_id(client, db, google, keyword):
+    book = models.Book(title=f"Capa {keyword}", authors="Autora", thumbnail=f"{google.base_url}/img/7.png")
+    db.add(book)
+    db.commit()
+    url = cover_url(book)
+    assert url.startswith(f"/covers/{book.id}?size=grid&v=")
+    assert client.get(url).headers["content-type"].startswith("image/")
@@ -0,0 +1,101 @@
+# tests/test_database.py
+
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import database, metrics
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'app.db'}"
+
+
+def pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+def test_default_profile_uses_one_engine(db_url):
+    write, read = database.make_engines(db_url, "default")
+    assert write is read
+    assert pragma(write, "journal_mode") == "delete"
+    write.dispose()
+
+
+def test_production_profile_tunes_every_connection(db_url):
+    write, read = database.make_engines(db_url, "production")
+    assert write is not read
+    assert write.pool.size() == 1  # um único escritor
+    assert read.pool.size() == database.DB_READ_POOL_SIZE
+    for engine in (write, read):
+        assert pragma(engine, "journal_mode") == "wal"
+        assert pragma(engine, "synchronous") == 1  # NORMAL
+        assert pragma(engine, "busy_timeout") == database.DB_BUSY_TIMEOUT_MS
+        assert pragma(engine, "cache_size") == -database.DB_CACHE_SIZE_KB
+        assert pragma(engine, "temp_store") == 2  # MEMORY
+        engine.dispose()
+
+
+def test_readers_are_not_blocked_by_the_writer(db_url):
+    write, read = database.make_engines(db_url, "production")
+    with write.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE t (x INTEGER)")
+        conn.exec_driver_sql("INSERT INTO t VALUES (1)")
+    with write.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO t VALUES (2)")
+        with read.connect() as reader:  # transação de escrita aberta: a leitura vê o último commit
+            assert reader.exec_driver_sql("SELECT count(*) FROM t").scalar() == 1
+    write.dispose()
+    read.dispose()
+
+
+class FakeSession:
+    def __init__(self):
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def locked():
+    return OperationalError("INSERT", {}, sqlite3.OperationalError("database is locked"))
+
+
+def test_locked_writes_are_retried(monkeypatch):
+    monkeypatch.setattr(database, "_locked_backoff", lambda attempt: 0)
+    attempts = []
+
+    @database.retry_on_locked
+    def write(db):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise locked()
+        return "gravado"
+
+    session = FakeSession()
+    before = metrics.DB_LOCKED_RETRIES._values.get(("write",), 0)
+    assert write(session) == "gravado"
+    assert len(attempts) == 3 and session.rollbacks == 2
+    assert metrics.DB_LOCKED_RETRIES._values[("write",)] == before + 2
+
+
+def test_other_errors_and_exhausted_retries_are_raised(monkeypatch):
+    monkeypatch.setattr(database, "_locked_backoff", lambda attempt: 0)
+
+    @database.retry_on_locked
+    def always_locked(db):
+        raise locked()
+
+    @database.retry_on_locked
+    def broken(db):
+        raise OperationalError("SELECT", {}, sqlite3.OperationalError("no such table: t"))
+
+    session = FakeSession()
+    with pytest.raises(OperationalError):
+        always_locked(session)
+    assert session.rollbacks == database.DB_LOCKED_RETRIES
+    with pytest.raises(OperationalError):
+        broken(FakeSession())
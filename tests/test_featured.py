@@ -0,0 +1,90 @@
+# tests/test_featured.py
+
+import threading
+import time
+
+from app.featured import FeaturedCache
+
+
+def wait_idle(cache: FeaturedCache, timeout: float = 2):
+    deadline = time.monotonic() + timeout
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_get_serves_the_last_good_list_and_refreshes_in_background():
+    lists = iter([[{"title": "Um"}], [{"title": "Dois"}]])
+    google_answered = threading.Event()
+
+    def loader():
+        google_answered.wait(1)
+        google_answered.clear()
+        return next(lists)
+
+    cache = FeaturedCache(loader, refresh_seconds=0.05)
+    assert cache.get() == [] and not cache.ready  # não espera pelo Google
+    google_answered.set()
+    wait_idle(cache)
+    assert cache.get() == [{"title": "Um"}] and cache.ready
+    version = cache.version
+
+    time.sleep(0.06)
+    assert cache.get() == [{"title": "Um"}]  # vencida: ainda a anterior, revalidando
+    google_answered.set()
+    wait_idle(cache)
+    assert cache.get() == [{"title": "Dois"}] and cache.version != version
+
+
+def test_concurrent_requests_start_one_refresh():
+    calls = []
+    release = threading.Event()
+
+    def loader():
+        calls.append(1)
+        release.wait(1)
+        return [{"title": "Um"}]
+
+    cache = FeaturedCache(loader)
+    threads = [threading.Thread(target=cache.get) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    release.set()
+    wait_idle(cache)
+    assert calls == [1]
+
+
+def test_failed_refreshes_back_off():
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise RuntimeError("Google fora do ar")
+
+    cache = FeaturedCache(failing, refresh_seconds=60, retry_seconds=0.1)
+    cache.get()
+    wait_idle(cache)
+    for _ in range(10):
+        cache.get()
+        wait_idle(cache)
+    assert len(calls) == 1  # dentro do intervalo de espera, nenhuma nova tentativa
+
+    time.sleep(0.11)
+    cache.get()
+    wait_idle(cache)
+    assert len(calls) == 2
+    time.sleep(0.11)
+    cache.get()
+    assert len(calls) == 2  # a espera dobrou depois da segunda falha
+
+
+def test_store_lets_workers_share_one_refresh():
+    from app.cache import TTLCache
+    store = TTLCache(maxsize=1, ttl=60)
+    first = FeaturedCache(lambda: [{"title": "Um"}], store=store)
+    assert first.refresh()
+    second = FeaturedCache(lambda: (_ for _ in ()).throw(AssertionError("não deveria chamar o Google")), store=store)
+    assert second.refresh()
+    assert second.get() == first.get() and second.version == first.version
+
@@ -0,0 +1,45 @@
+# tests/test_google_client.py
+
+import time
+
+import pytest
+
+from app import google_books
+from app.resilience import upstream_priority
+
+
+@pytest.fixture
+def slow_google(google):
+    google.latency_ms = 100
+    try:
+        yield google
+    finally:
+        google.latency_ms = 0
+
+
+def test_many_searches_run_in_parallel_and_keep_their_order(slow_google, keyword):
+    queries = [f'intitle:"{keyword}{i}"' for i in range(5)]
+    started = time.monotonic()
+    with upstream_priority("interactive"):  # como numa requisição (fora dela, usa o pool de fundo)
+        results = google_books.google_search_many([(query, 10, 0) for query in queries])
+    elapsed = time.monotonic() - started
+    assert elapsed < 0.3  # perto de uma chamada, não da soma das cinco
+    assert [books[0]["title"] for books, _ in results] == [f"{keyword.title()}{i} 0" for i in range(5)]
+    assert all(total == 200 for _, total in results)
+
+
+def test_sequential_calls_reuse_one_connection(google, keyword, monkeypatch):
+    session = google_books._build_session()
+    monkeypatch.setattr(google_books, "session", session)
+    for i in range(5):
+        google_books.google_search(f'intitle:"{keyword}{i}"', 10, 0)
+    [pool] = session.get_adapter(google.base_url).poolmanager.pools._container.values()
+    assert pool.num_connections == 1 and pool.num_requests == 5
+
+
+def test_volumes_are_normalized_with_a_handle(google, keyword):
+    books, _ = google_books.google_search(f'intitle:"{keyword}"', 10, 0)
+    book = books[0]
+    assert book["handle"] == f"g:{book['id']}"
+    assert book["isbn"] == book["isbn_13"] and len(book["isbn"]) == 13
+    assert book["thumbnail"].startswith(google.base_url)
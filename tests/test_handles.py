@@ -0,0 +1,60 @@
+# tests/test_handles.py
+
+import re
+
+from app import models
+
+
+def shelf_titles(client) -> list:
+    return [item["title"] for item in client.get("/shelf/items", params={"limit": 100}).json()["items"]]
+
+
+def test_search_forms_carry_only_the_handle(client, user, keyword):
+    page = client.get("/search", params={"keyword": keyword}).text
+    forms = re.findall(r'<form[^>]*action="/shelf/add".*?</form>', page, re.S)
+    assert len(forms) == 20
+    for form in forms:
+        fields = set(re.findall(r'name="([^"]+)"', form))
+        assert fields <= {"handle", "status"}
+    assert re.search(r'name="handle" value="g:[\w-]+"', forms[0])
+
+
+def test_google_handle_is_resolved_from_the_search_without_a_new_call(client, google, user, keyword):
+    page = client.get("/search", params={"keyword": keyword}).text
+    handle = re.search(r'name="handle" value="(g:[\w-]+)"', page).group(1)
+    calls = google.requests
+    response = client.post("/shelf/add", data={"handle": handle, "status": "lendo"}, follow_redirects=False)
+    assert response.status_code == 303 and response.headers["location"] == "/shelf"
+    assert google.requests == calls
+    assert [title for title in shelf_titles(client) if keyword.title() in title]
+
+
+def test_expired_google_handle_is_fetched_again(client, google, user, keyword):
+    calls = google.requests
+    response = client.post("/shelf/add", data={"handle": f"g:{keyword}", "status": "lido"}, follow_redirects=False)
+    assert response.status_code == 303
+    assert google.requests == calls + 1
+    assert f"Volume {keyword}" in shelf_titles(client)
+
+
+def test_local_handle_adds_the_catalog_book(client, db, user, keyword):
+    book = models.Book(title=f"Local {keyword}", authors="Autora")
+    db.add(book)
+    db.commit()
+    response = client.post("/shelf/add", data={"handle": f"l:{book.id}", "status": "quero ler"}, follow_redirects=False)
+    assert response.status_code == 303
+    assert f"Local {keyword}" in shelf_titles(client)
+
+
+def test_invalid_handles_are_refused(client, google, user):
+    calls = google.requests
+    for handle in ("l:999999999", "l:abc", "g:", "g:../../etc", "x:1", "qualquer coisa"):
+        response = client.post("/shelf/add", data={"handle": handle, "status": "lido"}, follow_redirects=False)
+        assert response.status_code == 404, handle
+    assert google.requests == calls
+    assert shelf_titles(client) == []
+
+
+def test_adding_requires_login(client):
+    response = client.post("/shelf/add", data={"handle": "l:1", "status": "lido"}, follow_redirects=False)
+    assert response.status_code == 303 and response.headers["location"] == "/login"
@@ -0,0 +1,48 @@
+# tests/test_home.py
+
+import time
+
+import pytest
+
+from app import main
+from test_featured import wait_idle
+
+
+@pytest.fixture
+def featured_ready(client):
+    wait_idle(main.featured_cache)  # a carga do startup pode estar em andamento
+    main.featured_cache.ready or main.featured_cache.refresh()
+    assert main.featured_cache.ready
+    return main.featured_cache
+
+
+def test_home_inlines_the_grid_when_featured_is_ready(client, featured_ready):
+    response = client.get("/")
+    assert response.status_code == 200
+    assert 'data-src="/featured"' not in response.text and "card--skeleton" not in response.text
+    assert "<!--flush-->" not in response.text
+    assert client.get("/", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+
+def test_home_streams_a_skeleton_until_featured_is_ready(client, monkeypatch):
+    wait_idle(main.featured_cache)
+    monkeypatch.setattr(main.featured_cache, "_loaded_at", None)
+    monkeypatch.setattr(main.featured_cache, "_retry_at", time.monotonic() + 60)  # sem recarga durante o teste
+    response = client.get("/")
+    assert response.status_code == 200
+    assert 'data-src="/featured"' in response.text and "card--skeleton" in response.text
+    assert "<!--flush-->" not in response.text
+
+    monkeypatch.setattr(main, "FEATURED_WAIT_SECONDS", 0)
+    fragment = client.get("/featured")
+    assert fragment.headers["cache-control"] == "no-store" and "etag" not in fragment.headers
+
+
+def test_featured_fragment_is_public_and_revalidates(client, featured_ready):
+    fragment = client.get("/featured")
+    assert fragment.status_code == 200
+    assert fragment.headers["cache-control"].startswith("public, max-age=")
+    assert "<html" not in fragment.text
+    revalidated = client.get("/featured", headers={"If-None-Match": fragment.headers["etag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["cache-control"] == fragment.headers["cache-control"]
@@ -0,0 +1,52 @@
+# tests/test_http_cache.py
+
+import re
+
+from app import crud, models
+from app.http_cache import IMMUTABLE_CACHE_CONTROL, make_etag
+
+
+def test_make_etag_is_weak_and_depends_on_every_part():
+    assert make_etag("busca", 1).startswith('W/"')
+    assert make_etag("busca", 1) == make_etag("busca", 1)
+    assert make_etag("busca", 1) != make_etag("busca", 2)
+
+
+def test_search_page_revalidates_with_304(client, keyword):
+    first = client.get("/search", params={"keyword": keyword})
+    etag = first.headers["etag"]
+    again = client.get("/search", params={"keyword": keyword}, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    other = client.get("/search", params={"keyword": keyword, "page": 2}, headers={"If-None-Match": etag})
+    assert other.status_code == 200
+
+
+def test_shelf_etag_changes_when_the_shelf_changes(client, db, user, keyword):
+    etag = client.get("/shelf/items").headers["etag"]
+    assert client.get("/shelf/items", headers={"If-None-Match": etag}).status_code == 304
+
+    crud.bulk_shelve(db, user, [{"title": f"Novo {keyword}", "authors": "Autora", "status": models.BookStatus.lido,
+                                 "rating": None}])
+    response = client.get("/shelf/items", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert [item["title"] for item in response.json()["items"]] == [f"Novo {keyword}"]
+
+
+def test_pages_are_compressed_when_accepted(client, keyword):
+    response = client.get("/search", params={"keyword": keyword}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] in ("gzip", "br")
+    assert "Accept-Encoding" in response.headers["vary"]
+    plain = client.get("/search", params={"keyword": keyword}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+
+def test_fingerprinted_static_assets_are_immutable(client):
+    html = client.get("/login").text
+    url = re.search(r'href="(/static/css/[^"]+\?v=[^"]+)"', html).group(1)
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["content-encoding"] == "gzip"
+    assert client.get(url, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
@@ -0,0 +1,78 @@
+# tests/test_metrics.py
+
+import asyncio
+import logging
+import re
+from typing import Optional
+
+from app import main, metrics
+
+
+def sample(text: str, name: str, /, **labels) -> Optional[float]:
+    """Soma das séries `name` cujos rótulos incluem `labels`; None se não houver nenhuma."""
+    values = []
+    for line in text.splitlines():
+        match = re.match(rf"{re.escape(name)}(\{{.*\}})? (\S+)$", line)
+        if match and all(f'{key}="{value}"' in (match.group(1) or "") for key, value in labels.items()):
+            values.append(float(match.group(2)))
+    return sum(values) if values else None
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("teste_seconds", "Teste.", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, "/x")
+    assert histogram.render()[2:] == [
+        'teste_seconds_bucket{route="/x",le="0.1"} 1',
+        'teste_seconds_bucket{route="/x",le="1"} 2',
+        'teste_seconds_bucket{route="/x",le="+Inf"} 3',
+        'teste_seconds_sum{route="/x"} 5.55',
+        'teste_seconds_count{route="/x"} 3',
+    ]
+
+
+def test_requests_are_measured_by_route_template(client, keyword):
+    route = "/books/{book_id}/stats"
+    before = client.get("/metrics").text
+    start_count = sample(before, "http_request_duration_seconds_count", route=route, status="200") or 0
+    start_queries = sample(before, "db_queries_per_request_count", route=route) or 0
+
+    for book_id in (1, 2, 3):
+        client.get(f"/books/{book_id}/stats")
+    client.get("/search", params={"keyword": keyword})
+
+    text = client.get("/metrics").text
+    assert sample(text, "http_request_duration_seconds_count", route=route, status="200") == start_count + 3
+    assert sample(text, "db_queries_per_request_count", route=route) == start_queries + 3
+    assert "/books/1/stats" not in text
+    assert sample(text, "db_queries_per_request_sum", route=route) > 0
+    assert sample(text, "upstream_request_duration_seconds_count", service="google_books", status="200") > 0
+    assert sample(text, "cache_misses", cache="google_search") > 0
+    assert sample(text, "circuit_breaker_state", name="google_books") is not None
+
+
+def test_metrics_token(client, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "segredo")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer outro"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer segredo"})
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+
+
+def test_slow_requests_are_logged_with_the_query_breakdown(caplog):
+    async def endpoint(scope, receive, send):
+        stats = metrics.current_stats()
+        for _ in range(12):
+            stats.add_query("SELECT * FROM books WHERE id = ?", 0.001)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def noop(message):
+        pass
+
+    app = metrics.MetricsMiddleware(endpoint, slow_request_ms=0.001)
+    scope = {"type": "http", "method": "GET", "path": "/lenta", "root_path": ""}
+    with caplog.at_level(logging.WARNING, logger="app.metrics"):
+        asyncio.run(app(scope, None, noop))
+    assert "GET /lenta -> 200" in caplog.text
+    assert "12 consultas" in caplog.text and "12x" in caplog.text
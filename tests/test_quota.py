@@ -0,0 +1,105 @@
+# tests/test_quota.py
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import google_books
+from app.resilience import QuotaExceeded, QuotaScheduler, upstream_priority
+
+
+def drain(quota, priority, client=None, attempts=50):
+    granted = 0
+    for _ in range(attempts):
+        try:
+            quota.acquire(priority, client=client, timeout=0)
+        except QuotaExceeded:
+            break
+        granted += 1
+    return granted
+
+
+def test_lower_priorities_keep_a_reserve_for_interactive_calls():
+    quota = QuotaScheduler("teste", rate=0.001, burst=10)
+    assert drain(quota, "background") == 7   # para com 30% do balde livre
+    assert drain(quota, "covers") == 2       # capas param com 10%
+    assert drain(quota, "interactive") == 1
+    with pytest.raises(QuotaExceeded) as info:
+        quota.acquire("interactive", timeout=0)
+    assert info.value.reason == "shed"
+
+
+def test_waiting_interactive_call_goes_before_covers():
+    quota = QuotaScheduler("teste", rate=20, burst=1)
+    quota.acquire("interactive")
+    order = []
+
+    def call(priority):
+        try:
+            quota.acquire(priority, timeout=1)
+            order.append(priority)
+        except QuotaExceeded:
+            order.append(f"{priority}:descartada")
+
+    threads = [threading.Thread(target=call, args=("covers",)), threading.Thread(target=call, args=("interactive",))]
+    for t in threads:
+        t.start()
+        time.sleep(0.005)
+    for t in threads:
+        t.join()
+    assert order[0] == "interactive"
+
+
+def test_each_client_has_its_own_share_and_covers_their_own_bucket():
+    quota = QuotaScheduler("teste", rate=1000, burst=1000, client_rate=0.001, client_burst=3,
+                           client_limits={"covers": (0.001, 5)})
+    assert drain(quota, "covers", "ip:a") == 5
+    assert drain(quota, "interactive", "ip:a") == 3  # as capas não gastaram a parte das buscas
+    with pytest.raises(QuotaExceeded) as info:
+        quota.acquire("interactive", client="ip:a", timeout=0)
+    assert (info.value.reason, info.value.client) == ("client_limit", "ip:a")
+    assert drain(quota, "interactive", "ip:b") == 3
+    assert quota.outcomes[("interactive", "client_limit")] == 3
+
+
+def test_daily_limit_is_reserved_for_higher_priorities():
+    quota = QuotaScheduler("teste", rate=1000, burst=1000, daily_limit=10)
+    assert drain(quota, "background") == 7
+    with pytest.raises(QuotaExceeded) as info:
+        quota.acquire("background", timeout=0)
+    assert info.value.reason == "daily_limit"
+    assert drain(quota, "interactive") == 3
+
+
+@pytest.fixture
+def client_share(monkeypatch):
+    """Parte de cada cliente na cota global do Google: 2 chamadas, sem reposição durante o teste."""
+    monkeypatch.setattr(google_books.quota, "client_rate", 0.001)
+    monkeypatch.setattr(google_books.quota, "client_burst", 2)
+    monkeypatch.setattr(google_books.quota, "_clients", OrderedDict())
+
+
+def test_throttled_client_gets_429_and_others_are_not_affected(app, client_share, keyword):
+    with TestClient(app) as a, TestClient(app, client=("10.0.0.2", 1234)) as b:
+        for i in range(2):
+            assert a.get("/search", params={"keyword": f"{keyword}{i}"}).status_code == 200
+        throttled = a.get("/search", params={"keyword": keyword})
+        assert throttled.status_code == 429
+        assert throttled.headers["retry-after"] and "etag" not in throttled.headers
+
+        # A página recusada a `a` não foi guardada: `b` recebe os resultados
+        response = b.get("/search", params={"keyword": keyword})
+        assert response.status_code == 200
+        assert len(re.findall(r'class="row__title"', response.text)) == 20
+
+
+def test_priority_context_is_seen_by_the_scheduler():
+    quota = QuotaScheduler("teste", rate=0.001, burst=10)
+    with upstream_priority("background"):
+        assert drain(quota, None) == 7
+    with upstream_priority("interactive", client="user:1"):
+        assert drain(quota, None) == 3
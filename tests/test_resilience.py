@@ -0,0 +1,74 @@
+# tests/test_resilience.py
+
+import time
+
+import pytest
+
+from app import google_books
+from app.resilience import CircuitBreaker, RetryBudget
+
+
+def test_breaker_opens_after_consecutive_failures_and_tests_one_call():
+    breaker = CircuitBreaker("teste", failure_threshold=3, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()  # sucesso zera a contagem
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()          # chamada de teste
+    assert not breaker.allow()      # só uma por vez
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.opened == 2
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_retry_budget_is_a_fraction_of_recent_requests():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, window=10)
+    assert not budget.try_spend()
+    for _ in range(4):
+        budget.record_request()
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+
+
+@pytest.fixture
+def failing_google(google):
+    """Google falso respondendo só erros; o disjuntor global volta fechado ao final."""
+    google.error_rate = 1.0
+    try:
+        yield google
+    finally:
+        google.error_rate = 0.0
+        google_books.breaker.record_success()
+
+
+def test_failures_serve_stale_results_and_open_the_breaker(failing_google, keyword):
+    query = f'intitle:"{keyword}"'
+    failing_google.error_rate = 0.0
+    fresh = google_books.google_search(query, 40, 0)
+    assert len(fresh[0]) == 40
+
+    failing_google.error_rate = 1.0
+    google_books.search_cache.delete((query, 0, 40))
+    with google_books.track_failures() as failures:
+        assert google_books.google_search(query, 40, 0) == fresh
+    assert failures.failed
+
+    for i in range(google_books.BREAKER_FAILURES):
+        with google_books.track_failures():
+            google_books.google_search(f"{query} {i}", 40, 0)
+    assert google_books.breaker.state == "open"
+
+    calls = failing_google.requests
+    with google_books.track_failures() as failures:
+        assert google_books.google_search(f"{query} depois", 40, 0) == ([], 0)
+    assert failures.failed
+    assert failing_google.requests == calls  # com o disjuntor aberto, nada sai para o Google
+
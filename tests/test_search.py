@@ -0,0 +1,53 @@
+# tests/test_search.py
+
+import re
+
+from bench.fake_google import fake_volume
+
+from app import crud, models
+from app.google_books import normalize_book
+
+
+def titles(html: str) -> list:
+    return re.findall(r'<h3 class="row__title">([^<]*)</h3>', html)
+
+
+def test_build_fts_query_quotes_terms_and_prefixes_the_last():
+    assert crud.build_fts_query("Trono de vid", "title") == '{title} : ("Trono" "de" "vid"*)'
+    assert crud.build_fts_query('a" OR title:*', "author") == '{authors} : ("a" "OR" "title"*)'
+    assert crud.build_fts_query("!!!") is None
+
+
+def test_local_search_uses_the_fts_index(db, keyword):
+    db.add_all([
+        models.Book(title=f"Crônica {keyword}", authors="Ana Souza"),
+        models.Book(title="Outro livro", authors=f"Autor {keyword}"),
+    ])
+    db.commit()
+    found = crud.search_local_books(db, keyword[:-2], "title")[0]
+    assert [book.title for book in found] == [f"Crônica {keyword}"]
+    found = crud.search_local_books(db, keyword, "author")[0]
+    assert [book.authors for book in found] == [f"Autor {keyword}"]
+
+
+def test_hybrid_paging_fills_pages_without_repeats(client, db, google, keyword):
+    query = f'intitle:"{keyword}"'
+    duplicated = [2, 7, 30]  # resultados do Google que também estão no catálogo (mesmo ISBN)
+    for i in range(25):
+        isbn = normalize_book(fake_volume(google.base_url, query, duplicated[i]))["isbn"] if i < 3 else None
+        db.add(models.Book(title=f"{keyword} local {i}", authors="Autora Local", isbn=isbn))
+    db.commit()
+
+    seen = []
+    for page in range(1, 5):
+        html = client.get("/search", params={"keyword": keyword, "page": page}).text
+        page_titles = titles(html)
+        assert len(page_titles) == 20
+        seen += page_titles
+
+    assert len(seen) == len(set(seen))
+    local = [t for t in seen if " local " in t]
+    assert len(local) == 25 and seen[:20] == local[:20]
+    # Do Google, a sequência continua de onde a página anterior parou, sem os já locais
+    expected = [f"{keyword.title()} {i}" for i in range(200) if i not in duplicated]
+    assert [t for t in seen if " local " not in t] == expected[:len(seen) - 25]
@@ -0,0 +1,93 @@
+# tests/test_shared_cache.py
+
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+
+from app.cache import SharedCache
+from app.migrations import MIGRATIONS, pending, setup_database
+
+
+def test_workers_see_each_others_entries(tmp_path):
+    path = tmp_path / "shared.db"
+    first = SharedCache("livros", path=path)
+    second = SharedCache("livros", path=path)  # outro worker: cópia em memória própria
+    other = SharedCache("capas", path=path)
+
+    first.set(("q", 0), [1, 2, 3])
+    assert first.get(("q", 0)) == [1, 2, 3]  # da cópia em memória, antes de chegar ao arquivo
+    first.flush()
+    assert second.get(("q", 0)) == [1, 2, 3]
+    assert second.version(("q", 0)) == first.version(("q", 0))
+    assert other.get(("q", 0)) is None  # namespaces não se misturam
+
+    first.delete(("q", 0))
+    first.flush()
+    assert first.get(("q", 0)) is None
+    second_fresh = SharedCache("livros", path=path)
+    assert second_fresh.get(("q", 0)) is None
+
+
+def test_local_copy_is_short_lived(tmp_path):
+    path = tmp_path / "shared.db"
+    writer = SharedCache("livros", path=path)
+    reader = SharedCache("livros", path=path, local_ttl=0.05)
+    writer.set("k", "antigo")
+    writer.flush()
+    assert reader.get("k") == "antigo"
+    writer.set("k", "novo")
+    writer.flush()
+    assert reader.get("k") == "antigo"  # ainda a cópia em memória
+    time.sleep(0.06)
+    assert reader.get("k") == "novo"
+
+
+def test_one_worker_loads_and_the_others_wait_for_it(tmp_path):
+    path = tmp_path / "shared.db"
+    workers = [SharedCache("livros", path=path) for _ in range(4)]
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.1)
+        return "valor"
+
+    with ThreadPoolExecutor(len(workers)) as pool:
+        results = list(pool.map(lambda cache: cache.get_or_load("k", loader), workers))
+    assert results == ["valor"] * 4
+    assert calls == [1]
+    assert sum(cache.stats()["coalesced"] for cache in workers) == 3
+
+
+def test_requests_do_not_wait_for_a_locked_file(tmp_path):
+    path = tmp_path / "shared.db"
+    cache = SharedCache("livros", path=path)
+    cache.set("k", "valor")
+    cache.flush()
+
+    lock = sqlite3.connect(path, isolation_level=None)
+    lock.execute("BEGIN EXCLUSIVE")  # outro worker segurando a trava de escrita
+    try:
+        started = time.monotonic()
+        assert SharedCache("livros", path=path).get("k") == "valor"
+        cache.set("k", "novo")  # vai para a fila de gravação
+        assert cache.get("k") == "novo"
+        assert time.monotonic() - started < 0.5
+    finally:
+        lock.execute("ROLLBACK")
+        lock.close()
+    cache.flush()
+    assert SharedCache("livros", path=path).get("k") == "novo"
+
+
+def test_setup_runs_once_when_workers_start_together(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}", connect_args={"timeout": 30})
+    assert pending(engine) == len(MIGRATIONS)
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda _: setup_database(engine), range(4)))
+    assert pending(engine) == 0
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == len(MIGRATIONS)
+    engine.dispose()
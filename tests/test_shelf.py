@@ -0,0 +1,65 @@
+# tests/test_shelf.py
+
+import pytest
+
+from app import crud, models
+
+
+@pytest.fixture
+def shelf(db, user, keyword):
+    """Estante do `user` com 23 livros (títulos com maiúsculas misturadas) e status alternados."""
+    statuses = [models.BookStatus.lido, models.BookStatus.lendo, models.BookStatus.quero_ler]
+    entries = [
+        {
+            "title": f"{'ABCDEFG'[i % 7]}{'a' if i % 2 else 'A'} livro {i:02d} {keyword}",
+            "authors": f"Autor {i % 5}",
+            "status": statuses[i % 3],
+            "rating": None,
+        }
+        for i in range(23)
+    ]
+    crud.bulk_shelve(db, user, entries)
+    return entries
+
+
+def walk(client, **params):
+    items, cursor, pages = [], None, 0
+    while True:
+        response = client.get("/shelf/items", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        body = response.json()
+        items += body["items"]
+        pages += 1
+        cursor = body["next_cursor"]
+        if not cursor:
+            return items, pages
+
+
+def test_keyset_pages_cover_the_shelf_once_in_order(client, shelf):
+    items, pages = walk(client, sort="title-asc", limit=5)
+    assert pages == 5
+    titles = [item["title"] for item in items]
+    assert titles == sorted((e["title"] for e in shelf), key=lambda t: (t.lower(), t))
+    assert len({item["id"] for item in items}) == 23
+
+
+def test_added_order_and_status_filter(client, shelf):
+    items, _ = walk(client, limit=4)
+    assert [item["title"] for item in items] == [e["title"] for e in shelf]
+    reading, _ = walk(client, status="lendo", limit=3)
+    assert {item["status"] for item in reading} == {"lendo"}
+    assert len(reading) == len([e for e in shelf if e["status"] == models.BookStatus.lendo])
+
+
+def test_cursor_only_works_for_the_query_it_came_from(client, shelf):
+    cursor = client.get("/shelf/items", params={"sort": "title-asc", "limit": 5}).json()["next_cursor"]
+    assert client.get("/shelf/items", params={"sort": "title-asc", "limit": 5, "cursor": cursor}).status_code == 200
+    for params in ({"sort": "added"}, {"sort": "title-desc"}, {"sort": "title-asc", "status": "lido"},
+                   {"sort": "title-asc", "q": "livro"}):
+        response = client.get("/shelf/items", params={**params, "cursor": cursor})
+        assert response.status_code == 400, params
+    assert client.get("/shelf/items", params={"cursor": "não-é-base64"}).status_code == 400
+
+
+def test_shelf_items_requires_login(client):
+    assert client.get("/shelf/items").status_code == 401
@@ -0,0 +1,66 @@
+# tests/test_stats.py
+
+import pytest
+
+from app import crud, database, models
+
+LIDO, LENDO, QUERO_LER = models.BookStatus.lido, models.BookStatus.lendo, models.BookStatus.quero_ler
+
+
+@pytest.fixture
+def readers(db, keyword):
+    """Três livros (A, B, C) e três leitores; o terceiro monta a estante pela importação em lote."""
+    books = [models.Book(title=f"{name} {keyword}", authors="Autora") for name in "ABC"]
+    db.add_all(books)
+    db.commit()
+    a, b, c = (book.id for book in books)
+    users = [crud.create_user(db, "Leitor", f"{keyword}-{i}@teste.io", "hash").id for i in range(3)]
+
+    first = crud.add_book_to_shelf(db, users[0], a, LIDO)
+    crud.update_shelf_item(db, first.id, LIDO, 4)
+    crud.add_book_to_shelf(db, users[0], b, QUERO_LER)
+    for book_id in (a, b, c):
+        crud.add_book_to_shelf(db, users[1], book_id, LENDO)
+    crud.bulk_shelve(db, users[2], [{"title": f"A {keyword}", "authors": "Autora", "status": LIDO, "rating": 2}])
+    return {"books": (a, b, c), "users": users, "first": first.id}
+
+
+def stats(client, book_id) -> dict:
+    return client.get(f"/books/{book_id}/stats").json()
+
+
+def test_stats_follow_every_shelf_change(client, readers):
+    a, b, c = readers["books"]
+    body = stats(client, a)
+    assert (body["readers"], body["rating_count"], body["average_rating"]) == (3, 2, 3.0)
+    assert body["status_counts"] == {"lido": 2, "lendo": 1, "quero ler": 0}
+    assert [(item["id"], item["readers"]) for item in body["also_shelved"]] == [(b, 2), (c, 1)]
+
+    with database.SessionLocal() as db:
+        crud.update_shelf_item(db, readers["first"], QUERO_LER, 0)
+    body = stats(client, a)
+    assert (body["rating_count"], body["average_rating"]) == (1, 2.0)
+    assert body["status_counts"] == {"lido": 1, "lendo": 1, "quero ler": 1}
+
+    with database.SessionLocal() as db:
+        crud.remove_book_from_shelf(db, readers["first"])
+    body = stats(client, a)
+    assert body["readers"] == 2
+    assert [(item["id"], item["readers"]) for item in body["also_shelved"]] == [(b, 1), (c, 1)]
+
+
+def test_book_nobody_has_shelved(client, db, keyword):
+    book = models.Book(title=f"Sozinho {keyword}", authors="Autora")
+    db.add(book)
+    db.commit()
+    assert stats(client, book.id) == {
+        "readers": 0, "rating_count": 0, "average_rating": None,
+        "status_counts": {"lido": 0, "lendo": 0, "quero ler": 0}, "also_shelved": [],
+    }
+
+
+def test_rebuild_matches_the_incremental_counts(client, db, readers):
+    before = [stats(client, book_id) for book_id in readers["books"]]
+    crud.rebuild_book_stats(db)
+    assert [stats(client, book_id) for book_id in readers["books"]] == before
+
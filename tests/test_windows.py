@@ -0,0 +1,67 @@
+# tests/test_windows.py
+
+import time
+
+import pytest
+
+from app import google_books
+from app.google_books import SEARCH_WINDOW_SIZE, google_search_page
+
+
+def titles(books) -> list:
+    return [book["title"] for book in books]
+
+
+def test_neighbouring_pages_share_one_window(google, keyword):
+    query = f'intitle:"{keyword}"'
+    calls = google.requests
+    first, total = google_search_page(query, 20, 0)
+    second, _ = google_search_page(query, 20, 20)
+    assert google.requests == calls + 1
+    assert total == 200
+    assert titles(first + second) == [f"{keyword.title()} {i}" for i in range(SEARCH_WINDOW_SIZE)]
+
+
+def test_page_across_two_windows_is_stitched_in_order(google, keyword):
+    query = f'intitle:"{keyword}"'
+    calls = google.requests
+    books, _ = google_search_page(query, 20, 30)
+    assert google.requests == calls + 2
+    assert titles(books) == [f"{keyword.title()} {i}" for i in range(30, 50)]
+
+
+def test_last_window_ends_the_results(google, keyword):
+    query = f'intitle:"{keyword}"'
+    books, total = google_search_page(query, 20, 190)
+    assert total == 200 and titles(books) == [f"{keyword.title()} {i}" for i in range(190, 200)]
+    assert google_search_page(query, 20, 200) == ([], 200)
+
+
+@pytest.fixture
+def prefetch(monkeypatch):
+    monkeypatch.setattr(google_books, "SEARCH_PREFETCH", True)
+
+
+def wait_cached(key, timeout: float = 2) -> bool:
+    deadline = time.monotonic() + timeout
+    while google_books.search_cache.get(key) is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return google_books.search_cache.get(key) is not None
+
+
+def test_next_window_is_prefetched_in_background(google, keyword, prefetch):
+    query = f'intitle:"{keyword}"'
+    google_search_page(query, 20, 20)  # última página da primeira janela
+    assert wait_cached((query, SEARCH_WINDOW_SIZE, SEARCH_WINDOW_SIZE))
+
+    calls = google.requests
+    books, _ = google_search_page(query, 20, 40)
+    assert google.requests == calls
+    assert titles(books)[0] == f"{keyword.title()} 40"
+
+
+def test_prefetch_stops_when_the_breaker_is_not_closed(google, keyword, prefetch, monkeypatch):
+    query = f'intitle:"{keyword}"'
+    monkeypatch.setattr(google_books.breaker, "state", "half_open")
+    google_books.prefetch_search_window(query, SEARCH_WINDOW_SIZE)
+    assert not wait_cached((query, SEARCH_WINDOW_SIZE, SEARCH_WINDOW_SIZE), timeout=0.2)